@@ -1,6 +1,10 @@
 import math
 from typing import List, Tuple, Optional
 
+import numpy as np
+
+EARTH_RADIUS_M = 6371000
+
 class IntCoordinate:
     SCALE = 100_000
 
@@ -22,7 +26,7 @@ class IntCoordinate:
         lat1, lng1 = self.to_double()
         lat2, lng2 = other.to_double()
         
-        R = 6371000  # Radius of Earth in meters
+        R = EARTH_RADIUS_M  # Radius of Earth in meters
         phi1 = math.radians(lat1)
         phi2 = math.radians(lat2)
         delta_phi = math.radians(lat2 - lat1)
@@ -53,84 +57,430 @@ class IntCoordinate:
         theta = math.atan2(y, x)
         return (math.degrees(theta) + 360) % 360
 
+class CoordBatch:
+    """
+    Vectorized versions of the IntCoordinate helpers.
+    Works on parallel int32 lat_i / lng_i arrays (same 1e5 scale as IntCoordinate)
+    so a whole track is measured with a handful of NumPy calls instead of a Python loop.
+    """
+    SCALE = IntCoordinate.SCALE
+
+    @staticmethod
+    def from_points(points: List[IntCoordinate]) -> Tuple[np.ndarray, np.ndarray]:
+        lat_i = np.fromiter((p.lat for p in points), dtype=np.int32, count=len(points))
+        lng_i = np.fromiter((p.lng for p in points), dtype=np.int32, count=len(points))
+        return lat_i, lng_i
+
+    @staticmethod
+    def to_points(lat_i: np.ndarray, lng_i: np.ndarray) -> List[IntCoordinate]:
+        return [IntCoordinate(lat, lng) for lat, lng in zip(lat_i.tolist(), lng_i.tolist())]
+
+    @classmethod
+    def from_double(cls, lats, lngs) -> Tuple[np.ndarray, np.ndarray]:
+        # np.rint rounds half to even, same as round() in IntCoordinate.from_double
+        lat_i = np.rint(np.asarray(lats, dtype=np.float64) * cls.SCALE).astype(np.int32)
+        lng_i = np.rint(np.asarray(lngs, dtype=np.float64) * cls.SCALE).astype(np.int32)
+        return lat_i, lng_i
+
+    @classmethod
+    def to_double(cls, lat_i, lng_i) -> Tuple[np.ndarray, np.ndarray]:
+        return np.asarray(lat_i) / cls.SCALE, np.asarray(lng_i) / cls.SCALE
+
+    @classmethod
+    def to_radians(cls, lat_i, lng_i) -> Tuple[np.ndarray, np.ndarray]:
+        lat, lng = cls.to_double(lat_i, lng_i)
+        return np.radians(lat), np.radians(lng)
+
+    @classmethod
+    def distances(cls, lat_i, lng_i, fast: bool = False) -> np.ndarray:
+        """
+        Distance in meters between consecutive points (length n-1).
+
+        Default is Haversine, matching IntCoordinate.distance_to.
+        fast=True uses the equirectangular approximation (mid-latitude projection).
+        Error bound vs Haversine: relative error < 1e-5 for segments up to 10 km
+        below 80 deg latitude (< 1e-6 below 70 deg). For 1 Hz fixes a few meters apart
+        this is well under a millimeter. Not suitable for long segments or ones crossing
+        the antimeridian.
+        """
+        phi, lam = cls.to_radians(lat_i, lng_i)
+        if len(phi) < 2:
+            return np.zeros(0, dtype=np.float64)
+
+        phi1, phi2 = phi[:-1], phi[1:]
+        delta_phi = phi2 - phi1
+        delta_lambda = np.diff(lam)
+
+        if fast:
+            x = delta_lambda * np.cos((phi1 + phi2) / 2)
+            return EARTH_RADIUS_M * np.hypot(x, delta_phi)
+
+        # cos(phi) once per point, shared by both ends of each segment
+        cos_phi = np.cos(phi)
+        a = np.sin(delta_phi / 2)**2 + \
+            cos_phi[:-1] * cos_phi[1:] * np.sin(delta_lambda / 2)**2
+        c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+        return EARTH_RADIUS_M * c
+
+    @classmethod
+    def bearings(cls, lat_i, lng_i) -> np.ndarray:
+        """
+        Bearing in degrees [0, 360) from each point to the next (length n-1).
+        Same formula as IntCoordinate.bearing_to.
+        """
+        phi, lam = cls.to_radians(lat_i, lng_i)
+        if len(phi) < 2:
+            return np.zeros(0, dtype=np.float64)
+
+        sin_phi = np.sin(phi)
+        cos_phi = np.cos(phi)
+        delta_lambda = np.diff(lam)
+
+        y = np.sin(delta_lambda) * cos_phi[1:]
+        x = cos_phi[:-1] * sin_phi[1:] - \
+            sin_phi[:-1] * cos_phi[1:] * np.cos(delta_lambda)
+
+        return (np.degrees(np.arctan2(y, x)) + 360) % 360
+
+    @classmethod
+    def path_length(cls, lat_i, lng_i, fast: bool = False) -> float:
+        """
+        Total length of the track in meters.
+        """
+        return float(cls.distances(lat_i, lng_i, fast=fast).sum())
+
+class PointCodec:
+    """
+    Packs a point sequence into bytes with delta + zigzag varint encoding.
+    Consecutive 1 Hz fixes differ by a few units, so most values fit in one byte.
+
+    Layout (version 1):
+        byte 0   version
+        byte 1   flags (FLAG_SEQ | FLAG_SPEED | FLAG_HEADING)
+        varint   point count n
+        varints  n values per column, column after column:
+                 [seq], lat_i, lng_i, time_offset, [speed_cms], [heading_deg]
+
+    Every column stores zigzag(delta from previous value), starting from 0.
+    seq is only stored when it is not simply 0..n-1.
+    Optional columns store 0 for None, otherwise zigzag(delta from previous non-None) + 1.
+    Columns are laid out one after another so encode/decode run as NumPy array ops.
+    """
+    VERSION = 1
+    FLAG_SEQ = 1
+    FLAG_SPEED = 2
+    FLAG_HEADING = 4
+
+    @staticmethod
+    def _zigzag(values: np.ndarray) -> np.ndarray:
+        values = values.astype(np.int64)
+        return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+    @staticmethod
+    def _unzigzag(values: np.ndarray) -> np.ndarray:
+        values = values.astype(np.uint64)
+        return ((values >> np.uint64(1)).astype(np.int64)) ^ -((values & np.uint64(1)).astype(np.int64))
+
+    @staticmethod
+    def _delta(values) -> np.ndarray:
+        values = np.asarray(values, dtype=np.int64)
+        return np.diff(values, prepend=np.int64(0))
+
+    @staticmethod
+    def _encode_varints(values: np.ndarray) -> bytes:
+        values = values.astype(np.uint64)
+        if len(values) == 0:
+            return b""
+
+        # Bytes per value: 1 + one more for every 7 bits above the first 7
+        lengths = np.ones(len(values), dtype=np.int64)
+        limit = np.uint64(1 << 7)
+        for _ in range(9):
+            more = values >= limit
+            if not more.any():
+                break
+            lengths += more
+            limit = limit << np.uint64(7)
+
+        offsets = np.cumsum(lengths) - lengths
+        out = np.zeros(int(lengths.sum()), dtype=np.uint8)
+        for k in range(int(lengths.max())):
+            mask = lengths > k
+            chunk = (values[mask] >> np.uint64(7 * k)) & np.uint64(0x7F)
+            continuation = np.where(lengths[mask] > k + 1, 0x80, 0).astype(np.uint64)
+            out[offsets[mask] + k] = (chunk | continuation).astype(np.uint8)
+        return out.tobytes()
+
+    @staticmethod
+    def _decode_varints(data, count: int) -> Tuple[np.ndarray, int]:
+        # Returns (values, bytes consumed)
+        buf = np.frombuffer(data, dtype=np.uint8)
+        ends = np.flatnonzero(buf < 0x80)[:count]
+        if len(ends) < count:
+            raise ValueError("Truncated point blob")
+
+        starts = np.empty(count, dtype=np.int64)
+        if count:
+            starts[0] = 0
+            starts[1:] = ends[:-1] + 1
+        lengths = ends - starts + 1
+
+        values = np.zeros(count, dtype=np.uint64)
+        for k in range(int(lengths.max()) if count else 0):
+            mask = lengths > k
+            values[mask] |= (buf[starts[mask] + k] & 0x7F).astype(np.uint64) << np.uint64(7 * k)
+        consumed = int(ends[-1]) + 1 if count else 0
+        return values, consumed
+
+    @staticmethod
+    def _encode_optional(values: List[Optional[int]]) -> np.ndarray:
+        present = np.array([v is not None for v in values], dtype=bool)
+        encoded = np.zeros(len(values), dtype=np.uint64)
+        if present.any():
+            present_values = np.array([v for v in values if v is not None], dtype=np.int64)
+            encoded[present] = PointCodec._zigzag(PointCodec._delta(present_values)) + np.uint64(1)
+        return encoded
+
+    @staticmethod
+    def _decode_optional(encoded: np.ndarray) -> List[Optional[int]]:
+        present = encoded > 0
+        values = np.cumsum(PointCodec._unzigzag(encoded[present] - np.uint64(1))).tolist()
+        it = iter(values)
+        return [next(it) if p else None for p in present.tolist()]
+
+    @staticmethod
+    def encode(lat_i, lng_i, time_offset,
+               speed_cms: Optional[List[Optional[int]]] = None,
+               heading_deg: Optional[List[Optional[int]]] = None,
+               seq=None) -> bytes:
+        n = len(lat_i)
+        flags = 0
+        columns = []
+
+        if seq is not None and not np.array_equal(np.asarray(seq), np.arange(n)):
+            flags |= PointCodec.FLAG_SEQ
+            columns.append(PointCodec._zigzag(PointCodec._delta(seq)))
+
+        columns.append(PointCodec._zigzag(PointCodec._delta(lat_i)))
+        columns.append(PointCodec._zigzag(PointCodec._delta(lng_i)))
+        columns.append(PointCodec._zigzag(PointCodec._delta(time_offset)))
+
+        if speed_cms is not None and any(v is not None for v in speed_cms):
+            flags |= PointCodec.FLAG_SPEED
+            columns.append(PointCodec._encode_optional(speed_cms))
+        if heading_deg is not None and any(v is not None for v in heading_deg):
+            flags |= PointCodec.FLAG_HEADING
+            columns.append(PointCodec._encode_optional(heading_deg))
+
+        header = bytes([PointCodec.VERSION, flags]) + PointCodec._encode_varints(np.array([n], dtype=np.uint64))
+        return header + PointCodec._encode_varints(np.concatenate(columns))
+
+    @staticmethod
+    def decode(blob: bytes) -> dict:
+        """
+        Returns {"seq", "lat_i", "lng_i", "time_offset"} as int arrays and
+        {"speed_cms", "heading_deg"} as lists of Optional[int] (None when not stored).
+        """
+        if len(blob) < 3 or blob[0] != PointCodec.VERSION:
+            raise ValueError("Unsupported point blob")
+        flags = blob[1]
+        body = memoryview(blob)[2:]
+        (n,), consumed = PointCodec._decode_varints(body, 1)
+        n = int(n)
+
+        names = []
+        if flags & PointCodec.FLAG_SEQ: names.append("seq")
+        names += ["lat_i", "lng_i", "time_offset"]
+        if flags & PointCodec.FLAG_SPEED: names.append("speed_cms")
+        if flags & PointCodec.FLAG_HEADING: names.append("heading_deg")
+
+        values, _ = PointCodec._decode_varints(body[consumed:], n * len(names))
+        columns = dict(zip(names, values.reshape(len(names), n)))
+
+        result = {"seq": np.arange(n, dtype=np.int64), "speed_cms": [None] * n, "heading_deg": [None] * n}
+        for name, column in columns.items():
+            if name in ("speed_cms", "heading_deg"):
+                result[name] = PointCodec._decode_optional(column)
+            else:
+                result[name] = np.cumsum(PointCodec._unzigzag(column))
+        return result
+
+class OnlineCompressor:
+    """
+    Streaming version of TrajectoryCompressor.online_compress for one track.
+    Feed points with push() as they arrive and call flush() when the track ends.
+    Holds only the last kept point and one pending point (O(1) memory),
+    and emits exactly the same points as the batch version.
+    """
+    __slots__ = ("min_dist_m", "angle_thresh_deg", "last_kept", "pending",
+                 "carried_bearing", "raw_count", "kept_count")
+
+    def __init__(self, min_dist_m: float = 3.0, angle_thresh_deg: float = 10.0):
+        self.min_dist_m = min_dist_m
+        self.angle_thresh_deg = angle_thresh_deg
+        self.raw_count = 0
+        self.kept_count = 0
+        self._reset()
+
+    def _reset(self):
+        self.last_kept: Optional[IntCoordinate] = None
+        # Point B waiting for its successor C before we can decide on it
+        self.pending: Optional[IntCoordinate] = None
+        # bearing(last_kept -> pending) carried over from the previous step.
+        # When B is kept, the next step's A->B is exactly this step's B->C.
+        self.carried_bearing: Optional[float] = None
+
+    def push(self, point: IntCoordinate) -> List[IntCoordinate]:
+        """
+        Adds the next point of the stream. Returns the points that became final (0 or 1).
+        """
+        self.raw_count += 1
+
+        if self.last_kept is None:
+            # Start point is always kept
+            self.last_kept = point
+            self.kept_count += 1
+            return [point]
+
+        current = self.pending
+        self.pending = point
+        if current is None:
+            return []
+
+        # A = last_kept, B = current, C = point
+        # Keep B if dist(A,B) >= min AND |bearing(A,B) - bearing(B,C)| >= angle
+        if self.last_kept.distance_to(current) >= self.min_dist_m:
+            bearing1 = self.carried_bearing if self.carried_bearing is not None else self.last_kept.bearing_to(current)
+            bearing2 = current.bearing_to(point)
+            angle_diff = abs(bearing1 - bearing2)
+            if angle_diff > 180:
+                angle_diff = 360 - angle_diff
+
+            if angle_diff >= self.angle_thresh_deg:
+                self.last_kept = current
+                self.carried_bearing = bearing2
+                self.kept_count += 1
+                return [current]
+
+        self.carried_bearing = None
+        return []
+
+    def flush(self) -> List[IntCoordinate]:
+        """
+        Ends the track. Returns the end point (always kept) and resets the point state
+        for the next track. raw_count / kept_count keep running.
+        """
+        end = self.pending
+        self._reset()
+        if end is None:
+            return []
+        self.kept_count += 1
+        return [end]
+
 class TrajectoryCompressor:
     @staticmethod
     def online_compress(points: List[IntCoordinate], min_dist_m: float = 3.0, angle_thresh_deg: float = 10.0) -> List[IntCoordinate]:
         """
         Compresses a stream of points using Angle + Distance filter.
         Preserves start and end points.
+        Runs OnlineCompressor over the full list, so both always agree.
         """
         if not points:
             return []
         if len(points) <= 2:
             return points
 
-        compressed = [points[0]]
-        last_kept = points[0]
-        
-        # In a real streaming scenario, we'd need to keep track of the 'pending' point.
-        # Here we process the full list as a simulation of the online algorithm run on a batch.
-        
-        for i in range(1, len(points) - 1):
-            current = points[i]
-            dist = last_kept.distance_to(current)
-            
-            if dist >= min_dist_m:
-                # Distance threshold met, check angle
-                # For online compression, we typically need 3 points A->B->C to check the angle at B.
-                # Here we simplify: if distance is large enough, we keep it OR we check bearing change.
-                # A stricter online implementation:
-                # A = last_kept
-                # B = current
-                # C = points[i+1]
-                # If dist(A,B) > min AND |bearing(A,B) - bearing(B,C)| > angle: keep B
-                
-                next_point = points[i+1]
-                bearing1 = last_kept.bearing_to(current)
-                bearing2 = current.bearing_to(next_point)
-                angle_diff = abs(bearing1 - bearing2)
-                if angle_diff > 180:
-                    angle_diff = 360 - angle_diff
-                
-                if angle_diff >= angle_thresh_deg:
-                   compressed.append(current)
-                   last_kept = current
-        
-        compressed.append(points[-1])
+        compressor = OnlineCompressor(min_dist_m, angle_thresh_deg)
+        compressed = []
+        for p in points:
+            compressed.extend(compressor.push(p))
+        compressed.extend(compressor.flush())
         return compressed
 
+    @staticmethod
+    def perpendicular_distances_m(phi: np.ndarray, lam: np.ndarray, first: int, last: int) -> np.ndarray:
+        """
+        Distance in meters from every point strictly between first and last
+        to the segment (first-last). phi/lam are radians (CoordBatch.to_radians).
+        Same local projection as perpendicular_distance_m in the Rust crate:
+        equirectangular around the latitude of the segment start, projection clamped to the segment.
+        """
+        cos0 = math.cos(phi[first])
+        ax, ay = EARTH_RADIUS_M * lam[first] * cos0, EARTH_RADIUS_M * phi[first]
+        bx, by = EARTH_RADIUS_M * lam[last] * cos0, EARTH_RADIUS_M * phi[last]
+        px = EARTH_RADIUS_M * lam[first + 1:last] * cos0
+        py = EARTH_RADIUS_M * phi[first + 1:last]
+
+        vx = bx - ax
+        vy = by - ay
+        v_len2 = vx * vx + vy * vy
+        if v_len2 == 0.0:
+            # a and b are the same point -> distance to a
+            return np.hypot(px - ax, py - ay)
+
+        t = np.clip(((px - ax) * vx + (py - ay) * vy) / v_len2, 0.0, 1.0)
+        return np.hypot(px - (ax + t * vx), py - (ay + t * vy))
+
+    @staticmethod
+    def rdp_indices(lat_i: np.ndarray, lng_i: np.ndarray, epsilon_m: float) -> np.ndarray:
+        """
+        Offline compression using RDP algorithm on int32 lat_i/lng_i arrays.
+        Returns the sorted indices of kept points (first and last are always kept),
+        so callers can map back to seq / time_offset.
+
+        Uses an explicit stack instead of recursion so very long tracks
+        don't hit the recursion limit. Each segment's distances are computed in one NumPy call.
+        """
+        n = len(lat_i)
+        if n < 3:
+            return np.arange(n)
+
+        phi, lam = CoordBatch.to_radians(lat_i, lng_i)
+
+        keep = np.zeros(n, dtype=bool)
+        keep[0] = True
+        keep[n - 1] = True
+
+        stack = [(0, n - 1)]
+        while stack:
+            first, last = stack.pop()
+            if last <= first + 1:
+                continue
+
+            dists = TrajectoryCompressor.perpendicular_distances_m(phi, lam, first, last)
+            offset = int(np.argmax(dists)) # first index of the max, like the Rust loop
+            dmax = dists[offset]
+
+            if dmax > 0.0 and dmax > epsilon_m:
+                index = first + 1 + offset
+                keep[index] = True
+                stack.append((first, index))
+                stack.append((index, last))
+
+        return np.flatnonzero(keep)
+
     @staticmethod
     def ramer_douglas_peucker(points: List[IntCoordinate], epsilon_m: float) -> List[IntCoordinate]:
         """
         Offline compression using RDP algorithm.
+        See rdp_indices for the index-based variant.
         """
         if len(points) < 3:
             return points
 
-        # Find the point with the maximum distance
-        dmax = 0.0
-        index = 0
-        end = len(points) - 1
-        
-        # Simple perpendicular distance logic (could be optimized)
-        # Line from points[0] to points[end]
-        
-        # Pre-convert to double for Euclidean approx or use Haversine 'cross-track distance'
-        # For small segments, Euclidean on lat/lon (scaled) is roughly ok, but cross-track is better.
-        # We'll stick to a placeholder recursive structure for now or use a library if rigorous 
-        # RDP is needed. 
-        # User requested RDP concept. 
-        
-        # Skipping full implementation for brevity unless requested, 
-        # focusing on the online filter which is the primary request for mobile.
-        # Returning original for now.
-        return points
+        lat_i, lng_i = CoordBatch.from_points(points)
+        return [points[i] for i in TrajectoryCompressor.rdp_indices(lat_i, lng_i, epsilon_m).tolist()]
 
 class GridCluster:
+    MIN_ZOOM = 1
+    MAX_ZOOM = 20
+    BASE_CELL_SIZE = 50 # 1 unit = 1e-5 deg ~= 1.1m, so 50 units ~= 55m
+    BASE_ZOOM = 15 # cells stop shrinking at this zoom
+
     @staticmethod
-    def cluster(points: List[IntCoordinate], zoom_level: int) -> dict:
+    def cell_size(zoom_level: int) -> int:
         """
-        Clusters points into grid cells based on zoom level.
+        Grid cell size in IntCoordinate units for a zoom level.
         """
         # Heuristic for cell size based on zoom.
         # Zoom 0 ~ 20. 
@@ -150,15 +500,22 @@ class GridCluster:
         # Let's define base cell size at Zoom 20 as 100 units (~10m).
         # cellSize = 100 * 2^(20 - zoom_level)
         
-        if zoom_level > 20: zoom_level = 20
-        if zoom_level < 1: zoom_level = 1
+        if zoom_level > GridCluster.MAX_ZOOM: zoom_level = GridCluster.MAX_ZOOM
+        if zoom_level < GridCluster.MIN_ZOOM: zoom_level = GridCluster.MIN_ZOOM
         
-        base_size = 50 # roughly 5 meters if 1 unit ~ 10cm? No 1 unit ~ 1m.
-        # 1 unit = 1e-5 deg ~= 1.1m.
-        # So base_size 50 = 55m.
+        base_size = GridCluster.BASE_CELL_SIZE
         
-        cell_size = int(base_size * (2 ** (15 - zoom_level))) if zoom_level < 15 else base_size
+        cell_size = int(base_size * (2 ** (GridCluster.BASE_ZOOM - zoom_level))) if zoom_level < GridCluster.BASE_ZOOM else base_size
         if cell_size < 1: cell_size = 1
+        return cell_size
+
+    @staticmethod
+    def cluster(points: List[IntCoordinate], zoom_level: int) -> dict:
+        """
+        Clusters points into grid cells based on zoom level.
+        For repeated zoom/pan queries over the same points use ClusterPyramid.
+        """
+        cell_size = GridCluster.cell_size(zoom_level)
         
         clusters = {}
         for p in points:
@@ -170,3 +527,172 @@ class GridCluster:
             clusters[key].append(p)
             
         return clusters
+
+class ClusterCell:
+    """
+    Summary of the points in one grid cell: count, centroid and bounding box.
+    """
+    __slots__ = ("key", "count", "sum_lat", "sum_lng", "min_lat", "min_lng", "max_lat", "max_lng")
+
+    def __init__(self, key: Tuple[int, int], count: int, sum_lat: int, sum_lng: int,
+                 min_lat: int, min_lng: int, max_lat: int, max_lng: int):
+        self.key = key
+        self.count = count
+        self.sum_lat = sum_lat
+        self.sum_lng = sum_lng
+        self.min_lat = min_lat
+        self.min_lng = min_lng
+        self.max_lat = max_lat
+        self.max_lng = max_lng
+
+    def merge(self, count: int, sum_lat: int, sum_lng: int,
+              min_lat: int, min_lng: int, max_lat: int, max_lng: int):
+        self.count += count
+        self.sum_lat += sum_lat
+        self.sum_lng += sum_lng
+        if min_lat < self.min_lat: self.min_lat = min_lat
+        if min_lng < self.min_lng: self.min_lng = min_lng
+        if max_lat > self.max_lat: self.max_lat = max_lat
+        if max_lng > self.max_lng: self.max_lng = max_lng
+
+    def centroid(self) -> IntCoordinate:
+        # Truncating average, same as cluster_points in the Rust crate
+        return IntCoordinate(int(self.sum_lat / self.count), int(self.sum_lng / self.count))
+
+    def to_dict(self) -> dict:
+        c = self.centroid()
+        return {
+            "lat_i": c.lat,
+            "lng_i": c.lng,
+            "count": self.count,
+            "bbox": [self.min_lat, self.min_lng, self.max_lat, self.max_lng],
+        }
+
+class ClusterPyramid:
+    """
+    Precomputed GridCluster cells for every zoom level (1-20).
+
+    Level k holds cells of size BASE_CELL_SIZE * 2^k, i.e. exactly the cells
+    GridCluster.cluster uses for zoom BASE_ZOOM - k (zoom >= BASE_ZOOM all share level 0).
+    Sizes double per level, so cell (cx, cy) at level k is the parent of
+    (2cx..2cx+1, 2cy..2cy+1) at level k-1 and a bbox query only descends into occupied cells.
+    """
+    LEVELS = GridCluster.BASE_ZOOM - GridCluster.MIN_ZOOM + 1
+
+    def __init__(self):
+        self.levels: List[dict] = [{} for _ in range(self.LEVELS)]
+
+    @staticmethod
+    def level_for_zoom(zoom_level: int) -> int:
+        zoom_level = min(max(zoom_level, GridCluster.MIN_ZOOM), GridCluster.MAX_ZOOM)
+        return max(GridCluster.BASE_ZOOM - zoom_level, 0)
+
+    @staticmethod
+    def level_cell_size(level: int) -> int:
+        return GridCluster.BASE_CELL_SIZE << level
+
+    def __len__(self) -> int:
+        return sum(cell.count for cell in self.levels[-1].values())
+
+    def insert(self, point: IntCoordinate):
+        """
+        Adds one point to every level.
+        """
+        lat, lng = point.lat, point.lng
+        for level, cells in enumerate(self.levels):
+            size = GridCluster.BASE_CELL_SIZE << level
+            key = (lat // size, lng // size)
+            cell = cells.get(key)
+            if cell is None:
+                cells[key] = ClusterCell(key, 1, lat, lng, lat, lng, lat, lng)
+            else:
+                cell.merge(1, lat, lng, lat, lng, lat, lng)
+
+    def insert_many(self, lat_i, lng_i):
+        """
+        Adds a batch of points (int32 arrays, see CoordBatch).
+        Each level is aggregated with NumPy from the level below, then merged into the cells.
+        """
+        lat = np.asarray(lat_i, dtype=np.int64)
+        lng = np.asarray(lng_i, dtype=np.int64)
+        if len(lat) == 0:
+            return
+
+        # Per-point stats, grouped at level 0 first
+        cx = lat // GridCluster.BASE_CELL_SIZE
+        cy = lng // GridCluster.BASE_CELL_SIZE
+        stats = (np.ones(len(lat), dtype=np.int64), lat, lng, lat, lng, lat, lng)
+
+        for level, cells in enumerate(self.levels):
+            if level > 0:
+                cx = cx // 2
+                cy = cy // 2
+            cx, cy, stats = self._group(cx, cy, stats)
+
+            rows = zip(cx.tolist(), cy.tolist(), *(column.tolist() for column in stats))
+            for x, y, count, sum_lat, sum_lng, min_lat, min_lng, max_lat, max_lng in rows:
+                key = (x, y)
+                cell = cells.get(key)
+                if cell is None:
+                    cells[key] = ClusterCell(key, count, sum_lat, sum_lng, min_lat, min_lng, max_lat, max_lng)
+                else:
+                    cell.merge(count, sum_lat, sum_lng, min_lat, min_lng, max_lat, max_lng)
+
+    @staticmethod
+    def _group(cx: np.ndarray, cy: np.ndarray, stats: tuple):
+        # Sort by cell key, then reduce each run of equal keys
+        order = np.lexsort((cy, cx))
+        cx, cy = cx[order], cy[order]
+        count, sum_lat, sum_lng, min_lat, min_lng, max_lat, max_lng = (column[order] for column in stats)
+
+        boundary = np.ones(len(cx), dtype=bool)
+        boundary[1:] = (cx[1:] != cx[:-1]) | (cy[1:] != cy[:-1])
+        starts = np.flatnonzero(boundary)
+
+        grouped = (
+            np.add.reduceat(count, starts),
+            np.add.reduceat(sum_lat, starts),
+            np.add.reduceat(sum_lng, starts),
+            np.minimum.reduceat(min_lat, starts),
+            np.minimum.reduceat(min_lng, starts),
+            np.maximum.reduceat(max_lat, starts),
+            np.maximum.reduceat(max_lng, starts),
+        )
+        return cx[starts], cy[starts], grouped
+
+    def cells(self, zoom_level: int, bbox: Optional[Tuple[int, int, int, int]] = None) -> List[ClusterCell]:
+        """
+        Occupied cells for a zoom level.
+        bbox = (min_lat_i, min_lng_i, max_lat_i, max_lng_i) limits the result to cells
+        overlapping the viewport; cost is proportional to the visible cells, not the point count.
+        """
+        target = self.level_for_zoom(zoom_level)
+        if bbox is None:
+            return list(self.levels[target].values())
+
+        min_lat, min_lng, max_lat, max_lng = bbox
+
+        def visible(key, level):
+            size = GridCluster.BASE_CELL_SIZE << level
+            return min_lat // size <= key[0] <= max_lat // size and \
+                min_lng // size <= key[1] <= max_lng // size
+
+        top = self.LEVELS - 1
+        frontier = [key for key in self.levels[top] if visible(key, top)]
+        for level in range(top - 1, target - 1, -1):
+            children = self.levels[level]
+            next_frontier = []
+            for x, y in frontier:
+                for key in ((2 * x, 2 * y), (2 * x, 2 * y + 1), (2 * x + 1, 2 * y), (2 * x + 1, 2 * y + 1)):
+                    if key in children and visible(key, level):
+                        next_frontier.append(key)
+            frontier = next_frontier
+
+        cells = self.levels[target]
+        return [cells[key] for key in frontier]
+
+    def summarize(self, zoom_level: int, bbox: Optional[Tuple[int, int, int, int]] = None) -> List[dict]:
+        """
+        JSON-ready cell summaries (centroid, count, bbox) instead of full point lists.
+        """
+        return [cell.to_dict() for cell in self.cells(zoom_level, bbox)]
@@ -1,8 +1,15 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import insert, update, select, literal, exists, union_all, or_
 from . import models, schemas
-from cryptography.fernet import Fernet
+from .coords import PointCodec
+from .user_info_envelope import UserInfoEnvelope
+from cryptography.fernet import Fernet, MultiFernet, InvalidToken
 import os
 import base64
+import hashlib
+import logging
+
+logger = logging.getLogger("API_LOGGER")
 
 # Encryption Helper
 # In a real app, ensure ENCRYPTION_KEY is set securely.
@@ -13,7 +20,23 @@ if not KEY:
     # Fallback for dev only - DO NOT USE IN PRODUCTION
     KEY = Fernet.generate_key().decode()
 
-cipher_suite = Fernet(KEY.encode() if isinstance(KEY, str) else KEY)
+# Key rotation: retired keys stay here (comma separated) until rotate_keys.py has re-encrypted every row.
+# New values are always encrypted with ENCRYPTION_KEY; decryption tries ENCRYPTION_KEY first, then these.
+OLD_KEYS = [key.strip() for key in os.getenv("ENCRYPTION_OLD_KEYS", "").split(",") if key.strip()]
+
+def set_encryption_keys(keys: list):
+    """
+    Installs a keyring (first key = primary). Used at import and by key rotation tests.
+    """
+    global KEY, primary_cipher, cipher_suite, info_envelope
+    KEY = keys[0]
+    primary_cipher = Fernet(KEY.encode() if isinstance(KEY, str) else KEY)
+    cipher_suite = MultiFernet([primary_cipher] + [Fernet(key.encode() if isinstance(key, str) else key) for key in keys[1:]])
+    info_envelope = UserInfoEnvelope(keys)
+
+def key_id(key) -> str:
+    # Short fingerprint for logs / checkpoints, never the key itself
+    return hashlib.sha256(key.encode() if isinstance(key, str) else key).hexdigest()[:8]
 
 def encrypt(data: str) -> str:
     if not data: return None
@@ -23,6 +46,24 @@ def decrypt(data: str) -> str:
     if not data: return None
     return cipher_suite.decrypt(data.encode()).decode()
 
+def rotate_token(token: str):
+    """
+    Re-encrypts a Fernet token under the primary key. Returns None if it already uses it.
+    """
+    try:
+        primary_cipher.decrypt(token.encode())
+        return None
+    except InvalidToken:
+        return cipher_suite.rotate(token.encode()).decode()
+
+# UserInfo storage format:
+# "columns": one Fernet token per field (default, legacy rows)
+# "sealed": all fields in one AEAD blob in user_info.sealed (one crypto call per read / write)
+# Reads understand both formats regardless of the mode.
+USER_INFO_STORAGE_MODE = os.getenv("USER_INFO_STORAGE_MODE", "columns")
+
+set_encryption_keys([KEY] + OLD_KEYS)
+
 # User Operations
 def get_user(db: Session, uuid: str):
     return db.query(models.User).filter(models.User.uuid == uuid).first()
@@ -39,20 +80,65 @@ def create_user(db: Session, user: schemas.UserCreate):
     db.refresh(db_user)
     return db_user
 
+def upsert_user_statement(dialect: str, user: schemas.UserCreate):
+    """
+    Atomic "get or create" for /check-user. Rows: (uuid, created_at, created).
+
+    PostgreSQL: one statement - INSERT ... ON CONFLICT (uuid) DO NOTHING RETURNING in a CTE,
+    UNION ALL the existing row when nothing was inserted.
+    SQLite (no data-modifying CTEs): INSERT ... ON CONFLICT DO NOTHING RETURNING only,
+    the caller falls back to a read for existing users.
+    """
+    values = {
+        "uuid": user.uuid,
+        "created_lat": user.latitude,
+        "created_long": user.longitude,
+        "nickname": user.nickname
+    }
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        raise NotImplementedError(f"ON CONFLICT not supported for {dialect}")
+
+    # Conflict target is uuid only: a taken nickname still raises IntegrityError
+    stmt = dialect_insert(models.User).values(**values).on_conflict_do_nothing(index_elements=[models.User.uuid])
+    if dialect != "postgresql":
+        return stmt.returning(models.User.uuid, models.User.created_at, literal(True).label("created"))
+
+    ins = stmt.returning(models.User.uuid, models.User.created_at).cte("ins")
+    return union_all(
+        select(ins.c.uuid, ins.c.created_at, literal(True).label("created")),
+        select(models.User.uuid, models.User.created_at, literal(False).label("created"))
+        .where(models.User.uuid == user.uuid, ~exists(select(ins.c.uuid)))
+    )
+
+def existing_user_statement(uuid: str):
+    # Fallback read: also covers a concurrent insert committed after the upsert's snapshot
+    return select(models.User.uuid, models.User.created_at, literal(False).label("created")).where(models.User.uuid == uuid)
+
+def upsert_user(db: Session, user: schemas.UserCreate):
+    """
+    Returns (uuid, created_at, created) without the SELECT / INSERT / refresh race.
+    """
+    row = db.execute(upsert_user_statement(db.get_bind().dialect.name, user)).first()
+    db.commit()
+    if row is None:
+        row = db.execute(existing_user_statement(user.uuid)).first()
+    return row
+
 def get_user_by_nickname(db: Session, nickname: str):
     return db.query(models.User).filter(models.User.nickname == nickname).first()
 
 def verify_user_password(db: Session, user_uuid: str, password: str) -> bool:
     db_info = db.query(models.UserInfo).filter(models.UserInfo.user_uuid == user_uuid).first()
-    if not db_info or not db_info.password:
-        return False
-    
-    try:
-        decrypted_password = decrypt(db_info.password)
-        return decrypted_password == password
-    except:
+    if not db_info:
         return False
 
+    stored_password = user_info_fields(db_info).get("password")
+    return stored_password is not None and stored_password == password
+
 # Usage Log Operations
 def create_usage_log(db: Session, log: schemas.LogCreate):
     db_log = models.UsageLog(
@@ -64,6 +150,46 @@ def create_usage_log(db: Session, log: schemas.LogCreate):
     db.commit()
     return db_log
 
+def insert_ignore_duplicates(dialect: str, model):
+    """
+    INSERT ... ON CONFLICT DO NOTHING for the given dialect name (PostgreSQL / SQLite).
+    """
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        raise NotImplementedError(f"ON CONFLICT not supported for {dialect}")
+    return dialect_insert(model).on_conflict_do_nothing()
+
+def usage_log_batch_statement(dialect: str, batch: schemas.LogBatchCreate):
+    rows = {}
+    for item in batch.logs:
+        rows[item.seq] = {
+            "user_uuid": batch.user_uuid,
+            "device_id": batch.device_id,
+            "client_seq": item.seq,
+            "latitude": item.latitude,
+            "longitude": item.longitude,
+            "timestamp": item.timestamp
+        }
+    if not rows:
+        return None
+    return insert_ignore_duplicates(dialect, models.UsageLog).values(list(rows.values())).returning(models.UsageLog.id)
+
+def create_usage_logs_batch(db: Session, batch: schemas.LogBatchCreate) -> int:
+    """
+    Inserts all points of an offline batch in one statement.
+    Points whose (user_uuid, device_id, seq) is already stored are skipped, so a client can safely re-send.
+    Returns the number of newly inserted rows.
+    """
+    stmt = usage_log_batch_statement(db.get_bind().dialect.name, batch)
+    if stmt is None:
+        return 0
+    inserted = len(db.execute(stmt).all())
+    db.commit()
+    return inserted
+
 # User Info Operations
 def update_user_info(db: Session, info: schemas.UserInfoUpdate):
     # Check if exists
@@ -73,6 +199,18 @@ def update_user_info(db: Session, info: schemas.UserInfoUpdate):
         db_info = models.UserInfo(user_uuid=info.user_uuid)
         db.add(db_info)
     
+    apply_user_info_update(db_info, info)
+    db.commit()
+    return db_info
+
+def apply_user_info_update(db_info: models.UserInfo, info: schemas.UserInfoUpdate):
+    if USER_INFO_STORAGE_MODE == "sealed":
+        seal_user_info(db_info, {
+            name: None if value is None else str(value)
+            for name, value in info.model_dump(include=set(UserInfoEnvelope.FIELDS)).items()
+        })
+        return
+
     # Encrypt and Update (Only update if provided)
     if info.name is not None: db_info.name = encrypt(info.name)
     if info.password is not None: db_info.password = encrypt(info.password)
@@ -84,6 +222,245 @@ def update_user_info(db: Session, info: schemas.UserInfoUpdate):
     if info.work_address is not None: db_info.work_address = encrypt(info.work_address)
     if info.work_lat is not None: db_info.work_lat = encrypt(str(info.work_lat))
     if info.work_long is not None: db_info.work_long = encrypt(str(info.work_long))
-    
+
+def safe_decrypt(val):
+    # Decrypt or return None if empty/fail
+    if not val: return None
+    try:
+        return decrypt(val)
+    except:
+        return None
+
+class UnreadableUserInfo(ValueError):
+    """
+    A stored blob or token that no key opens. Raised by the strict read that write paths use,
+    so the row is never re-sealed with the unreadable fields missing.
+    """
+
+def user_info_fields(db_info: models.UserInfo, strict: bool = False) -> dict:
+    """
+    Decrypted {field: str or None} for either storage format.
+    A sealed row costs one AEAD open. Legacy columns that are still set win over the blob
+    (written by a "columns" mode instance after the row was sealed).
+    Unreadable values read as None, or raise UnreadableUserInfo when strict (write paths).
+    """
+    fields = dict.fromkeys(UserInfoEnvelope.FIELDS)
+    if db_info.sealed:
+        try:
+            fields.update(info_envelope.open(db_info.user_uuid, db_info.sealed))
+        except ValueError as e:
+            if strict:
+                raise UnreadableUserInfo(f"Sealed user info of {db_info.user_uuid} cannot be opened: {e}") from e
+    for name in UserInfoEnvelope.FIELDS:
+        token = getattr(db_info, name)
+        if not token:
+            continue
+        if not strict:
+            fields[name] = safe_decrypt(token)
+            continue
+        try:
+            fields[name] = decrypt(token)
+        except InvalidToken as e:
+            raise UnreadableUserInfo(f"{name} of {db_info.user_uuid} cannot be decrypted") from e
+    return fields
+
+def seal_user_info(db_info: models.UserInfo, updates: dict):
+    """
+    Merges updates (None = keep) into the row, writes it as one sealed blob and clears the legacy columns.
+    Raises UnreadableUserInfo (row untouched) if a stored value cannot be decrypted.
+    """
+    fields = user_info_fields(db_info, strict=True)
+    fields.update({name: value for name, value in updates.items() if value is not None})
+    db_info.sealed = info_envelope.seal(db_info.user_uuid, fields)
+    for name in UserInfoEnvelope.FIELDS:
+        setattr(db_info, name, None)
+
+def user_info_response(db_info: models.UserInfo, nickname) -> schemas.UserInfoResponse:
+    fields = user_info_fields(db_info)
+    fields.pop("password")
+    return schemas.UserInfoResponse(user_uuid=db_info.user_uuid, nickname=nickname, **fields)
+
+USER_INFO_LEGACY_COLUMNS = [getattr(models.UserInfo, name) for name in UserInfoEnvelope.FIELDS]
+
+def user_info_unchanged(row):
+    """
+    WHERE clause matching the row only if none of its encrypted values changed since it was read.
+    Ciphertexts are randomized, so equality means nobody wrote the row in between.
+    """
+    return [
+        col.is_(None) if getattr(row, col.key) is None else col == getattr(row, col.key)
+        for col in USER_INFO_LEGACY_COLUMNS + [models.UserInfo.sealed]
+    ]
+
+def migrate_user_info_batch(db: Session, after_id: int = 0, batch_size: int = 500, stats: dict = None):
+    """
+    Seals up to batch_size legacy rows with id > after_id. Returns (last id seen, rows sealed).
+
+    Online-safe: each row is written with a conditional UPDATE (user_info_unchanged),
+    so a concurrent /update-info is never lost (that row is simply left for the next run).
+    Rows with a value no key decrypts are left untouched and counted in stats["unreadable"].
+    """
+    rows = db.execute(
+        select(models.UserInfo.id, models.UserInfo.user_uuid, models.UserInfo.sealed, *USER_INFO_LEGACY_COLUMNS)
+        .where(models.UserInfo.id > after_id, or_(*[col.isnot(None) for col in USER_INFO_LEGACY_COLUMNS]))
+        .order_by(models.UserInfo.id)
+        .limit(batch_size)
+    ).all()
+
+    sealed = 0
+    for row in rows:
+        try:
+            fields = user_info_fields(row, strict=True)
+        except UnreadableUserInfo as e:
+            logger.warning(f"Skipping user_info id {row.id}: {e}")
+            if stats is not None:
+                stats["unreadable"] = stats.get("unreadable", 0) + 1
+            continue
+        values = {name: None for name in UserInfoEnvelope.FIELDS}
+        values["sealed"] = info_envelope.seal(row.user_uuid, fields)
+        result = db.execute(
+            update(models.UserInfo)
+            .where(models.UserInfo.id == row.id, *user_info_unchanged(row))
+            .values(**values)
+        )
+        sealed += result.rowcount
     db.commit()
-    return db_info
+    return (rows[-1].id if rows else None), sealed
+
+def rotated_user_info_values(row) -> dict:
+    """
+    New encrypted values for every field of the row that is not under the primary key
+    ({} if the row is already fully rotated). Raises ValueError / InvalidToken if no key opens a value.
+    """
+    values = {}
+    for name in UserInfoEnvelope.FIELDS:
+        token = getattr(row, name)
+        if token:
+            rotated = rotate_token(token)
+            if rotated is not None:
+                values[name] = rotated
+    if row.sealed:
+        rotated = info_envelope.rotate(row.user_uuid, row.sealed)
+        if rotated is not None:
+            values["sealed"] = rotated
+    return values
+
+# Track Operations
+# Points go through Core executemany, which SQLAlchemy turns into multi-row
+# INSERT ... VALUES statements ("insertmanyvalues"). Pages are sized to stay under
+# the bind parameter limit, so a one-hour 1 Hz track (3,600 rows) is a single statement.
+BULK_INSERT_MAX_PARAMS = 32000
+
+# "rows": one track_points_raw row per point (default)
+# "packed": raw points packed into tracks.raw_points_blob (~3 bytes/point, single-row read)
+TRACK_STORAGE_MODE = os.getenv("TRACK_STORAGE_MODE", "rows")
+
+def known_user_uuids(db: Session, uuids) -> set:
+    """
+    The subset of uuids that exist in users, in one query.
+    """
+    uuids = set(uuids)
+    if not uuids:
+        return set()
+    return set(db.scalars(select(models.User.uuid).where(models.User.uuid.in_(uuids))))
+
+def bulk_insert(db: Session, table, rows: list):
+    if not rows:
+        return 0
+    page_size = max(1, BULK_INSERT_MAX_PARAMS // len(rows[0]))
+    db.execute(insert(table), rows, execution_options={"insertmanyvalues_page_size": page_size})
+    return len(rows)
+
+RAW_COLUMNS = ("seq", "time_offset", "lat_i", "lng_i", "speed_cms", "heading_deg")
+
+def raw_columns_from_points(points: list) -> dict:
+    return {name: [getattr(p, name) for p in points] for name in RAW_COLUMNS}
+
+def pack_raw_columns(raw: dict) -> bytes:
+    return PointCodec.encode(
+        raw["lat_i"], raw["lng_i"], raw["time_offset"],
+        speed_cms=raw["speed_cms"],
+        heading_deg=raw["heading_deg"],
+        seq=raw["seq"]
+    )
+
+def unpack_raw_points(blob: bytes) -> list:
+    cols = PointCodec.decode(blob)
+    return [
+        {"seq": seq, "time_offset": t, "lat_i": lat, "lng_i": lng, "speed_cms": speed, "heading_deg": heading}
+        for seq, t, lat, lng, speed, heading in zip(
+            cols["seq"].tolist(), cols["time_offset"].tolist(),
+            cols["lat_i"].tolist(), cols["lng_i"].tolist(),
+            cols["speed_cms"], cols["heading_deg"]
+        )
+    ]
+
+def create_track(db: Session, track: schemas.TrackCreate):
+    """
+    Writes the track header plus all raw and compressed points in one transaction.
+    Returns (track_id, raw_inserted, compressed_inserted).
+    """
+    compressed_rows = [
+        {
+            "seq": p.seq, "time_offset": p.time_offset,
+            "lat_i": p.lat_i, "lng_i": p.lng_i,
+            "is_corner": p.is_corner, "note": p.note
+        }
+        for p in track.compressed_points
+    ]
+    return save_track(db, track, raw_columns_from_points(track.raw_points), compressed_rows)
+
+def save_track(db: Session, header: schemas.TrackHeader, raw: dict, compressed_rows: list):
+    """
+    Shared by the JSON and binary upload paths.
+    raw: RAW_COLUMNS -> list of values (None allowed for speed_cms / heading_deg).
+    compressed_rows: dicts without track_id.
+    """
+    packed = TRACK_STORAGE_MODE == "packed"
+    raw_count = len(raw["seq"])
+    db_track = models.Track(
+        **header.model_dump(include=set(schemas.TrackHeader.model_fields)),
+        raw_points_blob=pack_raw_columns(raw) if packed else None
+    )
+    try:
+        db.add(db_track)
+        db.flush() # INSERT ... RETURNING id
+        track_id = db_track.id
+
+        raw_rows = [] if packed else [
+            {
+                "track_id": track_id, "seq": seq, "time_offset": t,
+                "lat_i": lat, "lng_i": lng,
+                "speed_cms": speed, "heading_deg": heading
+            }
+            for seq, t, lat, lng, speed, heading in zip(*(raw[name] for name in RAW_COLUMNS))
+        ]
+        for row in compressed_rows:
+            row["track_id"] = track_id
+
+        bulk_insert(db, models.TrackPointRaw.__table__, raw_rows)
+        compressed_inserted = bulk_insert(db, models.TrackPointCompressed.__table__, compressed_rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return track_id, raw_count, compressed_inserted
+
+def get_track_raw_points(db: Session, track_id: int):
+    """
+    Raw points of a track as dicts ordered by seq, from the packed blob
+    (single-row fetch) or from track_points_raw rows. None if the track doesn't exist.
+    """
+    db_track = db.query(models.Track).filter(models.Track.id == track_id).first()
+    if not db_track:
+        return None
+    if db_track.raw_points_blob is not None:
+        return unpack_raw_points(db_track.raw_points_blob)
+
+    rows = db.query(models.TrackPointRaw).filter(models.TrackPointRaw.track_id == track_id).order_by(models.TrackPointRaw.seq).all()
+    return [
+        {"seq": r.seq, "time_offset": r.time_offset, "lat_i": r.lat_i, "lng_i": r.lng_i,
+         "speed_cms": r.speed_cms, "heading_deg": r.heading_deg}
+        for r in rows
+    ]
@@ -0,0 +1,92 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, schemas
+from .crud import user_info_fields, apply_user_info_update, usage_log_batch_statement, upsert_user_statement, existing_user_statement
+
+# Async counterparts of the crud.py functions used by the hot-path endpoints.
+# Same behaviour, but they run on the event loop through the async engine
+# instead of occupying a threadpool worker per request.
+
+# User Operations
+async def get_user(db: AsyncSession, uuid: str):
+    result = await db.execute(select(models.User).where(models.User.uuid == uuid))
+    return result.scalars().first()
+
+async def create_user(db: AsyncSession, user: schemas.UserCreate):
+    db_user = models.User(
+        uuid=user.uuid,
+        created_lat=user.latitude,
+        created_long=user.longitude,
+        nickname=user.nickname
+    )
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+async def upsert_user(db: AsyncSession, user: schemas.UserCreate):
+    result = await db.execute(upsert_user_statement(db.bind.dialect.name, user))
+    row = result.first()
+    await db.commit()
+    if row is None:
+        result = await db.execute(existing_user_statement(user.uuid))
+        row = result.first()
+    return row
+
+async def get_user_by_nickname(db: AsyncSession, nickname: str):
+    result = await db.execute(select(models.User).where(models.User.nickname == nickname))
+    return result.scalars().first()
+
+async def verify_user_password(db: AsyncSession, user_uuid: str, password: str) -> bool:
+    result = await db.execute(select(models.UserInfo).where(models.UserInfo.user_uuid == user_uuid))
+    db_info = result.scalars().first()
+    if not db_info:
+        return False
+
+    stored_password = user_info_fields(db_info).get("password")
+    return stored_password is not None and stored_password == password
+
+# Usage Log Operations
+async def create_usage_log(db: AsyncSession, log: schemas.LogCreate):
+    db_log = models.UsageLog(
+        user_uuid=log.user_uuid,
+        latitude=log.latitude,
+        longitude=log.longitude
+    )
+    db.add(db_log)
+    await db.commit()
+    return db_log
+
+async def create_usage_logs_batch(db: AsyncSession, batch: schemas.LogBatchCreate) -> int:
+    stmt = usage_log_batch_statement(db.bind.dialect.name, batch)
+    if stmt is None:
+        return 0
+    result = await db.execute(stmt)
+    inserted = len(result.all())
+    await db.commit()
+    return inserted
+
+# User Info Operations
+async def update_user_info(db: AsyncSession, info: schemas.UserInfoUpdate):
+    result = await db.execute(select(models.UserInfo).where(models.UserInfo.user_uuid == info.user_uuid))
+    db_info = result.scalars().first()
+
+    if not db_info:
+        db_info = models.UserInfo(user_uuid=info.user_uuid)
+        db.add(db_info)
+
+    apply_user_info_update(db_info, info)
+    await db.commit()
+    return db_info
+
+async def get_user_info(db: AsyncSession, uuid: str):
+    """
+    Returns (UserInfo, nickname) or None.
+    Nickname comes from the same query (a lazy db_info.user load is not allowed on an AsyncSession).
+    """
+    result = await db.execute(
+        select(models.UserInfo, models.User.nickname)
+        .outerjoin(models.User, models.User.uuid == models.UserInfo.user_uuid)
+        .where(models.UserInfo.user_uuid == uuid)
+    )
+    return result.first()
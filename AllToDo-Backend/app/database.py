@@ -1,13 +1,51 @@
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 import os
 
+from .metrics import TimedQueuePool, TimedAsyncQueuePool
+
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL)
+# Pool settings (ignored for SQLite)
+POOL_OPTIONS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    "pool_pre_ping": True,
+}
+
+def engine_options(url: str, poolclass=None) -> dict:
+    if url.startswith("sqlite"):
+        return {}
+    options = dict(POOL_OPTIONS)
+    if poolclass is not None:
+        # Same QueuePool, plus checkout wait time in /metrics
+        options["poolclass"] = poolclass
+    return options
+
+def async_database_url(url: str) -> str:
+    """
+    Same database, async driver: asyncpg for PostgreSQL, aiosqlite for SQLite.
+    """
+    scheme, _, rest = url.partition("://")
+    driver = {
+        "postgresql": "postgresql+asyncpg",
+        "postgresql+psycopg2": "postgresql+asyncpg",
+        "postgres": "postgresql+asyncpg",
+        "sqlite": "sqlite+aiosqlite",
+    }.get(scheme, scheme)
+    return f"{driver}://{rest}"
+
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL, TimedQueuePool))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_database_url(DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, TimedAsyncQueuePool))
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -16,3 +54,7 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,16 +1,27 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import inspect, text
-from .database import engine, get_db
-from .crud import decrypt
+from fastapi.responses import FileResponse, PlainTextResponse, JSONResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from .database import engine
+from .user_info_cache import user_info_cache
+from .usage_buffer import usage_log_buffer
+from .sql_stats import sql_stats
+from .device_logs import device_log_sink, sanitize_device_id
+from .profiling import list_profiles, profile_path
+from .wasm import wasm_cache
+from .table_export import table_catalog, primary_key, parse_after, read_page, export_batches, ndjson_lines, csv_lines
+import io
+import pstats
 
 router = APIRouter(
     prefix="/dev",
     tags=["development"]
 )
 
+DEV_PASSWORD = "pw3355"
+EXPORT_BATCH_SIZE = 1000
+
 def verify_dev_password(password: str = ""):
-    if password != "pw3355":
+    if password != DEV_PASSWORD:
         raise HTTPException(status_code=401, detail="Unauthorized")
     return True
 
@@ -23,89 +34,156 @@ def list_tables(authorized: bool = Depends(verify_dev_password)):
     
     - **보안**: `password` 파라미터가 필요합니다.
     """
-    inspector = inspect(engine)
-    return inspector.get_table_names()
+    return table_catalog.names()
+
+@router.get("/stats")
+def runtime_stats(authorized: bool = Depends(verify_dev_password)):
+    """
+    **[개발용] 런타임 통계 조회**
+
+    프로세스 메모리에 있는 캐시/버퍼의 상태를 조회합니다.
+
+    - **user_info_cache**: `/user-info` 캐시 크기, 적중(hit)/실패(miss) 횟수, 적중률, 무효화 횟수
+    - **usage_log_buffer**: `/log-usage` 쓰기 버퍼의 대기/처리/실패 건수
+    - **device_log_sink**: `/dev/logs` 기기 로그 작성기의 대기/기록/유실 건수, 열린 파일 수
+    - **wasm_cache**: `/wasm/advanced` 메모리 캐시의 버전, 적중 횟수, 다시 읽은 횟수
+    - **보안**: `password` 파라미터가 필요합니다.
+    """
+    return {
+        "user_info_cache": user_info_cache.stats(),
+        "usage_log_buffer": usage_log_buffer.stats(),
+        "device_log_sink": device_log_sink.stats(),
+        "wasm_cache": wasm_cache.stats(),
+    }
+
+@router.get("/sql-stats")
+def get_sql_stats(sort: str = "total_ms", limit: int = 50, authorized: bool = Depends(verify_dev_password)):
+    """
+    **[개발용] SQL 실행 통계 조회**
+
+    서버가 실행한 SQL 문을 정규화(파라미터 → `?`)하여 집계한 결과를 조회합니다.
+
+    - **statements**: 문장별 실행 횟수, 총/평균/p50/p99/최대 시간(ms)
+    - **routes**: 라우트 + 문장별 같은 통계 (어느 API가 어떤 쿼리를 부르는지)
+    - **n_plus_one**: 한 요청에서 같은 문장이 반복 실행된 경우 (N+1 의심)
+    - **slow_queries**: `SQL_SLOW_QUERY_MS` 이상 걸린 최근 쿼리
+    - **정렬**: `sort` = `total_ms` / `count` / `p99_ms` / `max_ms`
+    - **보안**: `password` 파라미터가 필요합니다.
+    """
+    return sql_stats.snapshot(sort=sort, limit=limit)
+
+@router.post("/sql-stats/reset")
+def reset_sql_stats(authorized: bool = Depends(verify_dev_password)):
+    """
+    **[개발용] SQL 실행 통계 초기화**
+    """
+    sql_stats.reset()
+    return {"status": "reset"}
+
+@router.get("/profiles")
+def get_profiles(authorized: bool = Depends(verify_dev_password)):
+    """
+    **[개발용] 요청 프로파일 목록**
+
+    프로파일링된 요청의 결과 파일 목록을 최신순으로 조회합니다.
+
+    - **프로파일링 방법**: 요청에 `X-Profile: <개발용 비밀번호>` 헤더를 붙이면 그 요청 하나만 프로파일링됩니다.
+      응답의 `X-Profile-File` 헤더에 파일 이름이 담깁니다. (`PROFILE_SAMPLE_RATE`로 무작위 샘플링도 가능)
+    - **`.collapsed`**: 스택 샘플링 결과 (flamegraph.pl / speedscope에서 바로 열 수 있음)
+    - **`.pstats`**: `X-Profile-Mode: cprofile` 결과 (`python -m pstats` / snakeviz)
+    - **보안**: `password` 파라미터가 필요합니다.
+    """
+    return list_profiles()
+
+@router.get("/profiles/{name}")
+def download_profile(name: str, view: str = "file", authorized: bool = Depends(verify_dev_password)):
+    """
+    **[개발용] 요청 프로파일 다운로드**
+
+    - **view=file**: 원본 파일 다운로드
+    - **view=text**: `.pstats` 파일을 누적 시간 기준 상위 50개 함수 텍스트로 표시
+    - **보안**: `password` 파라미터가 필요합니다.
+    """
+    path = profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if view == "text" and path.suffix == ".pstats":
+        out = io.StringIO()
+        pstats.Stats(str(path), stream=out).sort_stats("cumulative").print_stats(50)
+        return PlainTextResponse(out.getvalue())
+    return FileResponse(path, filename=name, media_type="application/octet-stream")
 
 @router.get("/tables/{table_name}")
-def view_table(table_name: str, authorized: bool = Depends(verify_dev_password), db: Session = Depends(get_db)):
+def view_table(table_name: str, after: str | None = None, limit: int = 100, format: str = "json",
+               authorized: bool = Depends(verify_dev_password)):
     """
     **[개발용] 테이블 내용 조회**
 
-    특정 테이블의 데이터를 조회합니다 (최대 100건).
+    특정 테이블의 데이터를 기본 키 순서로 조회합니다.
     
-    - **자동 복호화**: 암호화된 컬럼(이름, 주소 등)은 자동으로 복호화되어 표시됩니다.
+    - **페이지 조회** (`format=json`): 최대 `limit`건(기본 100, 최대 1000). 다음 페이지가 있으면 응답 헤더 `X-Next-After`의 값을 `after`로 넘겨 이어서 조회합니다 (키셋 페이지네이션, 뒤쪽 페이지도 빠름).
+    - **전체 내보내기** (`format=ndjson` | `csv`): `after` 이후의 모든 행을 서버 측 커서로 1000건씩 읽어 스트리밍합니다 (수백만 건도 메모리 일정).
+    - **자동 복호화**: 암호화된 컬럼(이름, 주소 등)은 자동으로 복호화되어 표시됩니다. 바이너리 컬럼은 base64로 표시됩니다.
     - **보안**: `password` 파라미터가 필요합니다.
     """
-    # Validate table name to prevent SQL injection (basic check)
-    inspector = inspect(engine)
-    if table_name not in inspector.get_table_names():
+    # Only reflected table names reach SQL
+    table = table_catalog.get(table_name)
+    if table is None:
         raise HTTPException(status_code=404, detail="Table not found")
-    
+    if after is not None:
+        key = primary_key(table)
+        if key is None:
+            raise HTTPException(status_code=400, detail="Table has no single-column primary key to page on")
+        try:
+            parse_after(key, after)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid after value")
+
+    if format in ("ndjson", "csv"):
+        batches = export_batches(engine, table, after, EXPORT_BATCH_SIZE)
+        if format == "ndjson":
+            body, media_type = ndjson_lines(batches), "application/x-ndjson"
+        else:
+            body, media_type = csv_lines(table, batches), "text/csv; charset=utf-8"
+        return StreamingResponse(body, media_type=media_type, headers={
+            "Content-Disposition": f'attachment; filename="{table_name}.{format}"'
+        })
+    if format != "json":
+        raise HTTPException(status_code=400, detail="format must be json, ndjson or csv")
+
     try:
-        result = db.execute(text(f"SELECT * FROM {table_name} LIMIT 100"))
-        
-        # Define encrypted columns (based on models.py)
-        encrypted_columns = {
-            "name", "password", "phone_number", "age", 
-            "address", "address_lat", "address_long", 
-            "work_address", "work_lat", "work_long"
-        }
-
-        rows = []
-        for row in result:
-            row_dict = dict(row._mapping)
-            # Decrypt known encrypted columns if they exist in this table
-            for col in row_dict:
-                if col in encrypted_columns and row_dict[col] is not None:
-                    try:
-                        row_dict[col] = decrypt(row_dict[col])
-                    except:
-                        # Keep original if decryption fails (e.g. not encrypted or bad key)
-                        pass
-            rows.append(row_dict)
-            
-        return rows
+        rows, next_after = read_page(engine, table, after, max(1, min(limit, 1000)))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    headers = {"X-Next-After": str(next_after)} if next_after is not None else {}
+    return JSONResponse(content=jsonable_encoder(rows), headers=headers)
 
 
 from . import schemas
 
 import os
 
+# Fixed routes under /logs/; a device with one of these ids could never be read through /logs/{device_id}
+RESERVED_DEVICE_IDS = {"search", "query", "view"}
+
+def reject_reserved_device_ids(logs: list):
+    reserved = sorted({log.device for log in logs if sanitize_device_id(log.device) in RESERVED_DEVICE_IDS})
+    if reserved:
+        raise HTTPException(status_code=422, detail=f"Reserved device id: {', '.join(reserved)}")
+
 @router.post("/logs", response_model=schemas.RemoteLogResponse)
-def receive_remote_log(log: schemas.RemoteLogCreate):
+async def receive_remote_log(log: schemas.RemoteLogCreate):
     """
     **Receive Client Logs**
-    Saves logs to `logs/{device_id}.log`
+    Queues the log for `logs/{device_id}.log` and returns immediately.
+    503 means the server-side queue was full and the log was not stored (retry later).
+    422 for the reserved device ids `search`, `query` and `view`.
     """
-    # Ensure logs dir exists
-    log_dir = "logs"
-    os.makedirs(log_dir, exist_ok=True)
-    
-    # Sanitize device ID (basic)
-    device_id = "".join(c for c in log.device if c.isalnum() or c in "-_")
-    if not device_id: device_id = "unknown_device"
-    
-    file_path = os.path.join(log_dir, f"{device_id}.log")
-    
-    icon = "📱"
-    if log.level == "ERROR": icon = "🚨"
-    elif log.level == "WARN": icon = "⚠️"
-    
-    log_content = f"{icon} [{log.timestamp}] {log.level}: {log.message}\n"
-    
-    # 1. Print to detailed console
-    print(f"{icon} [{device_id}] {log.message}")
-    
-    # 2. Append to file
-    try:
-        with open(file_path, "a", encoding="utf-8") as f:
-            f.write(log_content)
-    except Exception as e:
-        print(f"Failed to write log: {e}")
-        
-    return {"status": "saved"}
+    reject_reserved_device_ids([log])
+    accepted, dropped = device_log_sink.add([(log.device, log.level, log.timestamp, log.message)])
+    if not accepted:
+        raise HTTPException(status_code=503, detail="Device log queue full, retry later")
+    return {"status": "queued", "accepted": accepted, "dropped": dropped}
 
 @router.get("/logs", response_model=list[str])
 def list_logs():
@@ -113,61 +191,31 @@ def list_logs():
     **List Available Log Files**
     Returns a list of device IDs that have sent logs.
     """
-    log_dir = "logs"
+    log_dir = device_log_sink.log_dir
     if not os.path.exists(log_dir):
         return []
     
     files = [f.replace(".log", "") for f in os.listdir(log_dir) if f.endswith(".log")]
-    return sorted(files)
+    # Devices whose active file was just rotated only have segments
+    return sorted(set(files) | set(device_log_sink.segments.devices()))
 
 @router.post("/logs/batch", response_model=schemas.RemoteLogResponse)
-def receive_remote_log_batch(logs: list[schemas.RemoteLogCreate]):
+async def receive_remote_log_batch(logs: list[schemas.RemoteLogCreate]):
     """
     **[개발용] 클라이언트 로그 일괄 전송**
 
     여러 건의 로그를 한 번에 받아 `logs/{device_id}.log` 파일에 저장합니다.
     
     - **용도**: 클라이언트(Android/iOS)에서 배터리 최적화 로그 등을 서버로 전송할 때 사용합니다.
-    - **동작**: Device ID별로 그룹화하여 파일에 내용을 추가(Append)합니다.
+    - **동작**: 로그는 메모리 큐에 넣고 즉시 응답합니다 (iOS 앱은 `200`만 성공으로 처리). 백그라운드 작성기가 Device ID별로 모아 파일에 추가(Append)하고 주기적으로 디스크에 기록(fsync)합니다.
+    - **유실 보고**: 서버 큐가 가득 차면 초과분은 저장되지 않으며 `dropped`에 건수가 표시됩니다. 한 건도 받지 못했으면 `503`이므로 클라이언트는 로그를 버리지 말고 재시도해야 합니다.
+    - **예약된 기기 ID**: `search`, `query`, `view`는 조회 경로와 겹치므로 `422`로 거부됩니다.
     """
-    # Ensure logs dir exists
-    log_dir = "logs"
-    os.makedirs(log_dir, exist_ok=True)
-    
-    saved_count = 0
-    
-    # Simple grouping by device to minimize file opens
-    logs_by_device = {}
-    for log in logs:
-        # Sanitize device ID
-        device_id = "".join(c for c in log.device if c.isalnum() or c in "-_")
-        if not device_id: device_id = "unknown_device"
-        
-        if device_id not in logs_by_device:
-            logs_by_device[device_id] = []
-        logs_by_device[device_id].append(log)
-        
-    for device_id, device_logs in logs_by_device.items():
-        file_path = os.path.join(log_dir, f"{device_id}.log")
-        try:
-            with open(file_path, "a", encoding="utf-8") as f:
-                for log in device_logs:
-                    icon = "📱"
-                    if log.level == "ERROR": icon = "🚨"
-                    elif log.level == "WARN": icon = "⚠️"
-                    elif log.level == "LOCATION_PAUSE": icon = "⏸️"
-                    elif log.level == "LOCATION_RESUME": icon = "▶️"
-                    elif log.level == "MOTION_CHANGE": icon = "🏃"
-                    elif log.level == "BATTERY_LEVEL": icon = "🔋"
-                    
-                    log_content = f"{icon} [{log.timestamp}] {log.level}: {log.message}\n"
-                    f.write(log_content)
-                    saved_count += 1
-        except Exception as e:
-            print(f"Failed to write log for {device_id}: {e}")
-
-    print(f"Batch saved {saved_count} logs from {len(logs_by_device)} devices.")
-    return {"status": f"saved {saved_count}"}
+    reject_reserved_device_ids(logs)
+    accepted, dropped = device_log_sink.add([(log.device, log.level, log.timestamp, log.message) for log in logs])
+    if dropped and not accepted:
+        raise HTTPException(status_code=503, detail="Device log queue full, retry later")
+    return {"status": f"queued {accepted}", "accepted": accepted, "dropped": dropped}
 
 from fastapi.responses import HTMLResponse
 
@@ -177,6 +225,7 @@ def view_logs_dashboard():
     **[개발용] 로그 뷰어 대시보드**
     
     서버에 저장된 기기별 로그 파일을 웹 브라우저에서 편리하게 조회할 수 있는 HTML 페이지를 반환합니다.
+    로그 조회에 개발용 비밀번호가 필요하므로 `/dev/logs/view?password=...`로 엽니다.
     """
     html_content = """
     <!DOCTYPE html>
@@ -209,19 +258,27 @@ def view_logs_dashboard():
                 });
             }
             
-            async function loadLog(deviceId, element) {
+            let liveSource = null;
+            // Open as /dev/logs/view?password=...; forwarded to the log stream
+            const password = new URLSearchParams(location.search).get('password') || '';
+
+            function loadLog(deviceId, element) {
                 // Highlight
                 document.querySelectorAll('.file-item').forEach(el => el.classList.remove('active'));
                 if(element) element.classList.add('active');
-                
-                const response = await fetch('/dev/logs/' + deviceId);
-                const text = await response.text();
+
+                // Recent lines first, then live updates (Server-Sent Events)
+                if (liveSource) liveSource.close();
                 const content = document.getElementById('log-content');
-                content.innerText = text; // Secure text content
-                
-                // Auto scroll to bottom
                 const container = document.getElementById('content');
-                container.scrollTop = container.scrollHeight;
+                content.innerText = ''; // Secure text content
+                liveSource = new EventSource('/dev/logs/' + encodeURIComponent(deviceId) + '/stream?lines=1000&password=' + encodeURIComponent(password));
+                liveSource.onmessage = (e) => {
+                    // Auto scroll to bottom only if the user is already there
+                    const atBottom = container.scrollTop + container.clientHeight >= container.scrollHeight - 20;
+                    content.appendChild(document.createTextNode(e.data + '\n'));
+                    if (atBottom) container.scrollTop = container.scrollHeight;
+                };
             }
             
             window.onload = loadList;
@@ -240,3 +297,165 @@ def view_logs_dashboard():
     </html>
     """
     return HTMLResponse(content=html_content, status_code=200)
+
+from fastapi import Header, Request
+from fastapi.responses import Response, StreamingResponse
+from .device_logs import tail_lines, follow
+from .log_segments import search_active
+from .log_index import GROUPS as LOG_GROUPS
+import asyncio
+import time
+
+TAIL_MAX_LINES = 10000
+
+@router.get("/logs/search")
+def search_device_logs(device: str | None = None, since: float | None = None, until: float | None = None,
+                       level: str | None = None, contains: str | None = None, limit: int = 1000,
+                       authorized: bool = Depends(verify_dev_password)):
+    """
+    **[개발용] 기기 로그 검색 (로테이션된 압축 세그먼트 포함)**
+
+    - `device`: 기기 ID (생략 시 전체 기기)
+    - `since` / `until`: 클라이언트 타임스탬프(epoch 초) 범위
+    - `level`: 레벨 (쉼표로 여러 개, 예: `ERROR,WARN`)
+    - `contains`: 메시지에 포함된 문자열
+    - `limit`: 최대 줄 수 (기본 1000, 최대 10000). 오래된 순으로 반환
+
+    세그먼트 인덱스의 시간 범위·레벨로 걸러서 해당하는 블록만 압축 해제합니다.
+    """
+    start = time.perf_counter()
+    levels = {item.strip() for item in level.split(",") if item.strip()} if level else None
+    limit = max(1, min(limit, TAIL_MAX_LINES))
+    segments = device_log_sink.segments
+    devices = [sanitize_device_id(device)] if device else list_logs()
+
+    lines = []
+    scan = {"blocks_read": 0, "blocks_skipped": 0}
+    for device_id in devices:
+        remaining = limit - len(lines)
+        if remaining <= 0:
+            break
+        found = segments.search(device_id, since, until, levels, contains, remaining, stats=scan)
+        if len(found) < remaining:
+            found += search_active(device_log_sink.log_path(device_id), since, until, levels, contains,
+                                   remaining - len(found))
+        lines.extend({"device": device_id, "line": text.rstrip("\n")} for text in found)
+
+    return {
+        "count": len(lines),
+        "truncated": len(lines) >= limit,
+        "elapsed_ms": (time.perf_counter() - start) * 1000,
+        **scan,
+        "lines": lines,
+    }
+
+@router.get("/logs/query")
+def query_device_logs(device: str | None = None, level: str | None = None, since: float | None = None,
+                      until: float | None = None, last_s: float | None = None, battery_lt: int | None = None,
+                      battery_gt: int | None = None, contains: str | None = None, group_by: str | None = None,
+                      limit: int = 1000, authorized: bool = Depends(verify_dev_password)):
+    """
+    **[개발용] 전체 기기 로그 구조화 조회 / 집계**
+
+    로그 수신 시 함께 기록되는 SQLite 인덱스(`logs/index.db`, level·timestamp·device 인덱스)에서 조회합니다.
+
+    - `device`, `level`(쉼표로 여러 개), `since` / `until`(epoch 초), `last_s`(최근 N초), `contains`
+    - `battery_lt` / `battery_gt`: 메시지의 `[Bat: NN%]` 값으로 필터
+    - `group_by`: `device` | `level` | `hour` | `day` — 그룹별 건수, 처음/마지막 시각, 배터리 최소/최대/평균
+    - 예) 최근 1시간 동안 배터리 20% 미만을 기록한 기기: `?level=BATTERY_LEVEL&battery_lt=20&last_s=3600&group_by=device`
+    """
+    index = device_log_sink.index
+    if index is None:
+        raise HTTPException(status_code=404, detail="Log index is disabled (DEVICE_LOG_INDEX_PATH)")
+    if group_by is not None and group_by not in LOG_GROUPS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {', '.join(LOG_GROUPS)}")
+    if last_s is not None:
+        since = max(since or 0, time.time() - last_s)
+
+    start = time.perf_counter()
+    rows = index.query(
+        device=sanitize_device_id(device) if device else None,
+        levels={item.strip() for item in level.split(",") if item.strip()} if level else None,
+        since=since, until=until, battery_lt=battery_lt, battery_gt=battery_gt, contains=contains,
+        group_by=group_by, limit=max(1, min(limit, TAIL_MAX_LINES)),
+    )
+    return {"count": len(rows), "elapsed_ms": (time.perf_counter() - start) * 1000, "rows": rows}
+
+@router.get("/logs/{device_id}")
+def read_device_log(device_id: str, lines: int = 1000,
+                    range_header: str | None = Header(default=None, alias="Range"),
+                    authorized: bool = Depends(verify_dev_password)):
+    """
+    **[개발용] 기기 로그 조회**
+
+    - 기본: 파일 끝에서부터 거꾸로 읽어 최근 `lines`줄(최대 10000)만 반환합니다 (파일 전체를 읽지 않음).
+    - `Range: bytes=시작-끝` 헤더: 해당 바이트 구간만 `206 Partial Content`로 반환합니다 (`bytes=시작-`이면 이어 받기).
+    - 응답 헤더 `X-Log-Size`(파일 크기), `X-Log-Offset`(반환 구간의 시작 위치)로 다음 요청 위치를 계산할 수 있습니다.
+    - **보안**: `password` 파라미터가 필요합니다.
+    """
+    path = device_log_sink.log_path(device_id)
+    if not os.path.isfile(path):
+        if device_log_sink.segments.index(sanitize_device_id(device_id)) and range_header is None:
+            # Just rotated: the recent lines are in the newest segment
+            data = "".join(device_log_sink.segments.tail(sanitize_device_id(device_id), max(1, min(lines, TAIL_MAX_LINES))))
+            return Response(content=data, media_type="text/plain; charset=utf-8",
+                            headers={"X-Log-Size": "0", "X-Log-Offset": "0"})
+        raise HTTPException(status_code=404, detail="Log not found")
+
+    if range_header is not None:
+        # FileResponse answers the request's Range header itself (206 / 416) and reads only that span
+        return FileResponse(path, media_type="text/plain; charset=utf-8")
+
+    data, offset, size = tail_lines(path, max(1, min(lines, TAIL_MAX_LINES)))
+    return Response(content=data, media_type="text/plain; charset=utf-8",
+                    headers={"X-Log-Size": str(size), "X-Log-Offset": str(offset)})
+
+@router.get("/logs/{device_id}/stream")
+async def stream_device_log(device_id: str, request: Request, lines: int = 100,
+                            authorized: bool = Depends(verify_dev_password)):
+    """
+    **[개발용] 기기 로그 실시간 보기 (Server-Sent Events)**
+
+    최근 `lines`줄을 먼저 보낸 뒤, 새 로그가 파일에 기록될 때마다 추가된 줄만 `data:` 이벤트로 전송합니다.
+    폴링하지 않고 로그 기록 스레드의 알림으로 깨어나며, 15초마다 keep-alive 주석을 보냅니다.
+    - **보안**: `password` 파라미터가 필요합니다.
+    """
+    path = device_log_sink.log_path(device_id)
+    segments = device_log_sink.segments
+    if not os.path.isfile(path) and not segments.index(sanitize_device_id(device_id)):
+        raise HTTPException(status_code=404, detail="Log not found")
+
+    # Subscribe before reading the tail so nothing written in between is missed
+    changed = device_log_sink.subscribe(device_id)
+    lines = max(0, min(lines, TAIL_MAX_LINES))
+    try:
+        if os.path.isfile(path):
+            data, offset, size = await asyncio.to_thread(tail_lines, path, lines)
+            # Only complete lines are sent; a partial last line is re-read by follow()
+            complete = data.rfind(b"\n") + 1
+            offset += complete
+        else:
+            # Just rotated: start from the newest segment, follow the new active file from its start
+            recent = await asyncio.to_thread(segments.tail, sanitize_device_id(device_id), lines)
+            data, offset = "".join(recent).encode("utf-8"), 0
+            complete = len(data)
+    except Exception:
+        device_log_sink.unsubscribe(device_id, changed)
+        raise
+
+    def event(line: bytes) -> str:
+        # A bare CR would end the SSE line early
+        return f"data: {line.decode('utf-8', errors='replace').replace(chr(13), '')}\n\n"
+
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            for line in data[:complete].split(b"\n")[:-1]:
+                yield event(line)
+            async for line in follow(path, offset, changed, request.is_disconnected):
+                yield ": keep-alive\n\n" if line is None else event(line)
+        finally:
+            device_log_sink.unsubscribe(device_id, changed)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -0,0 +1,400 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+
+from .log_segments import LogSegments
+from .log_index import LogIndex
+
+logger = logging.getLogger("API_LOGGER")
+
+LOG_DIR = os.getenv("DEVICE_LOG_DIR", "logs")
+
+LEVEL_ICONS = {
+    "ERROR": "🚨",
+    "WARN": "⚠️",
+    "LOCATION_PAUSE": "⏸️",
+    "LOCATION_RESUME": "▶️",
+    "MOTION_CHANGE": "🏃",
+    "BATTERY_LEVEL": "🔋",
+}
+
+def sanitize_device_id(device: str) -> str:
+    device_id = "".join(c for c in device if c.isalnum() or c in "-_")
+    return device_id or "unknown_device"
+
+def format_line(level: str, timestamp: float, message: str) -> str:
+    icon = LEVEL_ICONS.get(level, "📱")
+    return f"{icon} [{timestamp}] {level}: {message}\n"
+
+class DeviceLogSink:
+    """
+    Write-behind sink for /dev/logs and /dev/logs/batch (logs/{device_id}.log).
+
+    Requests only append (device_id, level, timestamp, message) to a bounded in-memory list
+    and get an immediate response. A background thread groups pending records by device, appends
+    them through an LRU of open file handles (no open/close per request), and flushes + fsyncs
+    the files it touched every flush_interval_ms or as soon as flush_bytes are pending.
+    When max_pending records are waiting, new records are dropped and counted, not blocked on.
+
+    A device file that reaches segment_bytes, or was started segment_age_s ago (measured from when
+    this process first opened it), is rotated into a compressed, time-indexed segment (log_segments.py).
+    Every written batch is also added to a structured SQLite index (log_index.py) unless index_path is empty.
+    """
+
+    def __init__(self, log_dir: str = LOG_DIR, flush_interval_ms: int = 1000, flush_bytes: int = 256 * 1024,
+                 max_pending: int = 100000, max_open_files: int = 256, segment_bytes: int = 8 * 1024 * 1024,
+                 segment_age_s: float = 86400, keep_segments: int = 0, index_path: str = None,
+                 index_retention_days: float = 30):
+        self.log_dir = log_dir
+        self.flush_interval_s = flush_interval_ms / 1000
+        self.flush_bytes = flush_bytes
+        self.max_pending = max_pending
+        self.max_open_files = max_open_files
+        self.segment_bytes = segment_bytes
+        self.segment_age_s = segment_age_s
+        self.segments = LogSegments(log_dir, keep_segments=keep_segments)
+        if index_path is None:
+            index_path = os.path.join(log_dir, "index.db")
+        self.index = LogIndex(index_path, retention_days=index_retention_days) if index_path else None
+        # device_id -> time the active file was (re)started, for age-based rotation
+        self._segment_started = {}
+
+        self._records = []
+        self._pending_bytes = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._flush_requested = False
+        self._files = OrderedDict()
+        # device_id -> set of (loop, asyncio.Event) for live tails (/dev/logs/{device_id}/stream)
+        self._subscribers = {}
+
+        self.accepted = 0
+        self.dropped = 0
+        self.written = 0
+        self.flushes = 0
+        self.failed = 0
+        self.opens = 0
+        self._dropped_reported = 0
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="device-log-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        with self._cond:
+            thread = self._thread
+            self._stopping = True
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+        with self._cond:
+            self._thread = None
+
+    def add(self, records: list):
+        """
+        records: [(device, level, timestamp, message)]. Returns (accepted, dropped); never blocks on I/O.
+        """
+        if self._thread is None:
+            self.start()
+
+        with self._cond:
+            room = max(0, self.max_pending - len(self._records))
+            accepted = records[:room]
+            for device, level, timestamp, message in accepted:
+                self._records.append((sanitize_device_id(device), level, timestamp, message))
+                self._pending_bytes += len(message) + 48
+            self.accepted += len(accepted)
+            dropped = len(records) - len(accepted)
+            self.dropped += dropped
+            if self._pending_bytes >= self.flush_bytes:
+                self._cond.notify_all()
+        return len(accepted), dropped
+
+    def flush(self, timeout: float = 5.0):
+        """
+        Waits until everything accepted so far is on disk (tests, /dev/logs readers).
+        """
+        with self._cond:
+            target = self.accepted
+            self._flush_requested = True
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: self.written + self.failed >= target, timeout=timeout)
+
+    def log_path(self, device_id: str) -> str:
+        return os.path.join(self.log_dir, f"{sanitize_device_id(device_id)}.log")
+
+    def subscribe(self, device_id: str) -> asyncio.Event:
+        """
+        Event set (on the caller's loop) every time the writer appends to this device's file.
+        """
+        event = asyncio.Event()
+        entry = (asyncio.get_running_loop(), event)
+        with self._cond:
+            self._subscribers.setdefault(sanitize_device_id(device_id), set()).add(entry)
+        event._sink_entry = entry
+        return event
+
+    def unsubscribe(self, device_id: str, event: asyncio.Event):
+        device_id = sanitize_device_id(device_id)
+        with self._cond:
+            subscribers = self._subscribers.get(device_id)
+            if subscribers is not None:
+                subscribers.discard(event._sink_entry)
+                if not subscribers:
+                    del self._subscribers[device_id]
+
+    def _notify(self, device_id: str):
+        with self._cond:
+            subscribers = list(self._subscribers.get(device_id, ()))
+        for loop, event in subscribers:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Loop already closed
+                pass
+
+    def stats(self) -> dict:
+        with self._cond:
+            stats = {
+                "pending": len(self._records),
+                "accepted": self.accepted,
+                "dropped": self.dropped,
+                "written": self.written,
+                "failed": self.failed,
+                "flushes": self.flushes,
+                "open_files": len(self._files),
+                "file_opens": self.opens,
+            }
+        stats.update(self.segments.stats())
+        if self.index is not None:
+            stats.update(self.index.stats())
+        return stats
+
+    def _run(self):
+        try:
+            self.segments.recover()
+        except Exception as e:
+            logger.error(f"Device log segment recovery failed: {e}")
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._stopping or self._flush_requested or self._pending_bytes >= self.flush_bytes,
+                    timeout=self.flush_interval_s
+                )
+                self._flush_requested = False
+                batch = self._records
+                self._records = []
+                self._pending_bytes = 0
+                stopping = self._stopping
+                dropped = self.dropped - self._dropped_reported
+                self._dropped_reported = self.dropped
+
+            if dropped:
+                logger.warning(f"Device log queue full: dropped {dropped} records")
+            if batch:
+                self._write(batch)
+            if stopping:
+                with self._cond:
+                    if not self._records:
+                        break
+        self._close_all()
+        if self.index is not None:
+            self.index.close()
+
+    def _write(self, batch: list):
+        by_device = {}
+        for device_id, level, timestamp, message in batch:
+            by_device.setdefault(device_id, []).append(format_line(level, timestamp, message))
+
+        written = failed = 0
+        for device_id, lines in by_device.items():
+            try:
+                f = self._handle(device_id)
+                f.write("".join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+                written += len(lines)
+                if f.tell() >= self.segment_bytes or \
+                        time.time() - self._segment_started.get(device_id, 0) >= self.segment_age_s:
+                    self._rotate(device_id)
+                self._notify(device_id)
+            except Exception as e:
+                logger.error(f"Failed to write device log for {device_id}: {e}")
+                self._close(device_id)
+                failed += len(lines)
+
+        if self.index is not None:
+            # After the files, so the index never delays the durable copy
+            self.index.add(batch)
+
+        with self._cond:
+            self.written += written
+            self.failed += failed
+            self.flushes += 1
+            self._cond.notify_all()
+
+    def _rotate(self, device_id: str):
+        self._close(device_id)
+        self._segment_started.pop(device_id, None)
+        try:
+            self.segments.rotate(device_id, self.log_path(device_id))
+        except Exception as e:
+            # The file stays (or is left as a pending segment for recover()); writes go on
+            logger.error(f"Rotating device log for {device_id} failed: {e}")
+
+    def _handle(self, device_id: str):
+        f = self._files.get(device_id)
+        if f is not None:
+            self._files.move_to_end(device_id)
+            return f
+        os.makedirs(self.log_dir, exist_ok=True)
+        f = open(self.log_path(device_id), "a", encoding="utf-8")
+        self.opens += 1
+        self._files[device_id] = f
+        self._segment_started.setdefault(device_id, time.time())
+        while len(self._files) > self.max_open_files:
+            old_id, _ = next(iter(self._files.items()))
+            self._close(old_id)
+        return f
+
+    def _close(self, device_id: str):
+        f = self._files.pop(device_id, None)
+        if f is not None:
+            try:
+                f.close()
+            except Exception:
+                pass
+
+    def _close_all(self):
+        for device_id in list(self._files):
+            self._close(device_id)
+
+def tail_lines(path: str, n: int, block_size: int = 64 * 1024, max_bytes: int = 8 * 1024 * 1024):
+    """
+    Last n lines of a file, read backwards from EOF in block_size steps
+    (memory is bounded by the lines returned, capped at max_bytes, not by the file size).
+    Always starts at a line boundary: when max_bytes cuts into a line, that line is left out.
+    Returns (bytes, offset of the first returned byte, file size).
+    """
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        position = size
+        blocks = []
+        newlines = 0
+        # A trailing newline ends the last line, it does not start a new one
+        target = n + 1 if size and _last_byte(f, size) == b"\n" else n
+        while position > 0 and newlines < target and size - position < max_bytes:
+            read = min(block_size, position)
+            position -= read
+            f.seek(position)
+            block = f.read(read)
+            blocks.append(block)
+            newlines += block.count(b"\n")
+        data = b"".join(reversed(blocks))
+        # Stopped by max_bytes before reaching n lines: data may begin inside a line
+        at_line_start = position == 0 or newlines >= target or _last_byte(f, position) == b"\n"
+
+    start = 0
+    if newlines >= target:
+        # Drop everything up to the newline that precedes the first wanted line
+        cut = len(data)
+        for _ in range(target):
+            cut = data.rindex(b"\n", 0, cut)
+        start = cut + 1
+    if len(data) - start > max_bytes:
+        start = len(data) - max_bytes
+        at_line_start = data[start - 1:start] == b"\n"
+    if not at_line_start:
+        # Skip forward past the partial line (also never splits a UTF-8 character)
+        newline = data.find(b"\n", start)
+        start = len(data) if newline < 0 else newline + 1
+    data = data[start:]
+    return data, size - len(data), size
+
+def _last_byte(f, size: int) -> bytes:
+    f.seek(size - 1)
+    return f.read(1)
+
+async def follow(path: str, offset: int, changed: asyncio.Event, is_disconnected, heartbeat_s: float = 15.0,
+                 chunk_size: int = 64 * 1024):
+    """
+    Yields complete lines (bytes, without the newline) appended to path after offset.
+    Wakes on the sink's change event (no polling); a heartbeat None is yielded every
+    heartbeat_s so the caller can send an SSE comment and notice closed connections.
+    Like tail -F, the open descriptor is drained after a rotation renames the file, then the new
+    file is followed from its start; a truncated file is re-read from its start.
+    """
+    f = None
+    partial = b""
+    try:
+        while not await is_disconnected():
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=heartbeat_s)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            changed.clear()
+
+            while True:
+                if f is None:
+                    f = await asyncio.to_thread(_open_at, path, offset)
+                    if f is None:
+                        break
+                data, rotated = await asyncio.to_thread(_read_more, f, path, chunk_size)
+                if data:
+                    lines = (partial + data).split(b"\n")
+                    partial = lines.pop()
+                    for line in lines:
+                        yield line
+                    continue
+                if not rotated:
+                    break
+                f.close()
+                f, offset, partial = None, 0, b""
+    finally:
+        if f is not None:
+            f.close()
+
+def _open_at(path: str, offset: int):
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    f.seek(offset if offset <= os.fstat(f.fileno()).st_size else 0)
+    return f
+
+def _read_more(f, path: str, length: int):
+    """
+    (next bytes or b"", whether path now names another file). A truncated file is rewound.
+    """
+    if f.tell() > os.fstat(f.fileno()).st_size:
+        f.seek(0)
+    data = f.read(length)
+    if data:
+        return data, False
+    try:
+        rotated = os.stat(path).st_ino != os.fstat(f.fileno()).st_ino
+    except FileNotFoundError:
+        rotated = True
+    return b"", rotated
+
+device_log_sink = DeviceLogSink(
+    flush_interval_ms=int(os.getenv("DEVICE_LOG_FLUSH_MS", "1000")),
+    flush_bytes=int(os.getenv("DEVICE_LOG_FLUSH_BYTES", str(256 * 1024))),
+    max_pending=int(os.getenv("DEVICE_LOG_MAX_PENDING", "100000")),
+    max_open_files=int(os.getenv("DEVICE_LOG_MAX_OPEN_FILES", "256")),
+    segment_bytes=int(os.getenv("DEVICE_LOG_SEGMENT_BYTES", str(8 * 1024 * 1024))),
+    segment_age_s=float(os.getenv("DEVICE_LOG_SEGMENT_AGE_S", "86400")),
+    keep_segments=int(os.getenv("DEVICE_LOG_KEEP_SEGMENTS", "0")),
+    index_path=os.getenv("DEVICE_LOG_INDEX_PATH"),
+    index_retention_days=float(os.getenv("DEVICE_LOG_INDEX_RETENTION_DAYS", "30")),
+)
@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import select, update, func
+
+from .database import SessionLocal
+from . import models, crud
+
+logger = logging.getLogger("API_LOGGER")
+
+class ReencryptionJob:
+    """
+    Re-encrypts user_info under the primary key (ENCRYPTION_KEY) after a rotation.
+
+    - Walks user_info by id (keyset pagination, no OFFSET), batch_size rows at a time.
+    - Decrypt / re-encrypt runs in a thread pool, the DB writes stay on the job thread.
+    - Each batch is one short transaction; rows are written with a conditional UPDATE,
+      so a concurrent /update-info wins (counted as a conflict, already on the new key).
+    - After each commit the last id is saved to checkpoint_path, so a stopped or crashed run resumes there.
+      The checkpoint is tied to the primary key fingerprint: rotating again starts from the beginning.
+    - max_rows_per_sec throttles the job so it does not starve production traffic (0 = unthrottled).
+    """
+
+    def __init__(self, session_factory=SessionLocal, batch_size: int = 500, workers: int = 4,
+                 max_rows_per_sec: float = 0, checkpoint_path: str = "key_rotation.checkpoint.json"):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.workers = workers
+        self.max_rows_per_sec = max_rows_per_sec
+        self.checkpoint_path = checkpoint_path
+        self._stop = threading.Event()
+
+        self.key_id = crud.key_id(crud.KEY)
+        self.last_id = 0
+        self.scanned = 0
+        self.run_scanned = 0
+        self.rotated = 0
+        self.conflicts = 0
+        self.failed = 0
+        self.total = 0
+        self.elapsed_s = 0.0
+
+    def load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            return
+        if checkpoint.get("key_id") != self.key_id:
+            logger.info("Key rotation checkpoint belongs to another primary key, starting over")
+            return
+        self.last_id = checkpoint["last_id"]
+        self.scanned = checkpoint["scanned"]
+        self.rotated = checkpoint["rotated"]
+        self.conflicts = checkpoint["conflicts"]
+        self.failed = checkpoint["failed"]
+
+    def save_checkpoint(self, done: bool = False):
+        checkpoint = {
+            "key_id": self.key_id,
+            "last_id": self.last_id,
+            "scanned": self.scanned,
+            "rotated": self.rotated,
+            "conflicts": self.conflicts,
+            "failed": self.failed,
+            "done": done,
+        }
+        # Write-then-rename so a crash never leaves a half-written checkpoint
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def stop(self):
+        self._stop.set()
+
+    def progress(self) -> dict:
+        return {
+            "key_id": self.key_id,
+            "last_id": self.last_id,
+            "scanned": self.scanned,
+            "total": self.total,
+            "percent": 100.0 * self.scanned / self.total if self.total else 100.0,
+            "rotated": self.rotated,
+            "conflicts": self.conflicts,
+            "failed": self.failed,
+            "rows_per_sec": self.run_scanned / self.elapsed_s if self.elapsed_s else 0.0,
+        }
+
+    def run(self, report=None) -> dict:
+        """
+        Runs until every row has been visited or stop() is called. report(progress) is called after each batch.
+        """
+        self.load_checkpoint()
+        self.run_scanned = 0
+        db = self.session_factory()
+        try:
+            self.total = self.scanned + db.execute(
+                select(func.count()).select_from(models.UserInfo).where(models.UserInfo.id > self.last_id)
+            ).scalar()
+        finally:
+            db.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="key-rotation") as pool:
+            while not self._stop.is_set():
+                if not self._run_batch(pool):
+                    self.save_checkpoint(done=True)
+                    break
+                self.save_checkpoint()
+                self.elapsed_s = time.perf_counter() - start
+                if report:
+                    report(self.progress())
+                self._throttle(start)
+        self.elapsed_s = time.perf_counter() - start
+        return self.progress()
+
+    def _run_batch(self, pool) -> bool:
+        db = self.session_factory()
+        try:
+            rows = db.execute(
+                select(models.UserInfo.id, models.UserInfo.user_uuid, models.UserInfo.sealed, *crud.USER_INFO_LEGACY_COLUMNS)
+                .where(models.UserInfo.id > self.last_id)
+                .order_by(models.UserInfo.id)
+                .limit(self.batch_size)
+            ).all()
+            if not rows:
+                return False
+
+            for row, values in zip(rows, pool.map(self._rotate_row, rows)):
+                if values is None:
+                    self.failed += 1
+                elif values:
+                    result = db.execute(
+                        update(models.UserInfo)
+                        .where(models.UserInfo.id == row.id, *crud.user_info_unchanged(row))
+                        .values(**values)
+                    )
+                    if result.rowcount:
+                        self.rotated += 1
+                    else:
+                        self.conflicts += 1
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        self.last_id = rows[-1].id
+        self.scanned += len(rows)
+        self.run_scanned += len(rows)
+        return True
+
+    @staticmethod
+    def _rotate_row(row):
+        try:
+            return crud.rotated_user_info_values(row)
+        except Exception as e:
+            # Not readable with any key in the ring: leave the row untouched
+            logger.error(f"Key rotation: user_info id={row.id} could not be decrypted: {e}")
+            return None
+
+    def _throttle(self, start: float):
+        if self.max_rows_per_sec <= 0:
+            return
+        ahead_s = self.run_scanned / self.max_rows_per_sec - (time.perf_counter() - start)
+        if ahead_s > 0:
+            self._stop.wait(ahead_s)
@@ -0,0 +1,158 @@
+import os
+import re
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger("API_LOGGER")
+
+# Structured copy of the remote client logs in a local SQLite file (logs/index.db by default),
+# next to the per-device text files. Written by DeviceLogSink's writer thread, one transaction
+# per flushed batch; read by /dev/logs/query through separate read-only connections (WAL mode,
+# so reads never block the writer). Answers cross-device questions without scanning log files.
+
+# Both apps append " [Bat: NN%]" to every message (iOS reports -100% when the level is unknown)
+BATTERY_PATTERN = re.compile(r"\[Bat: (-?\d+)%\]")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS remote_logs (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    device TEXT NOT NULL,
+    level TEXT NOT NULL,
+    battery INTEGER,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_remote_logs_level_ts ON remote_logs (level, ts);
+CREATE INDEX IF NOT EXISTS ix_remote_logs_device_ts ON remote_logs (device, ts);
+CREATE INDEX IF NOT EXISTS ix_remote_logs_ts ON remote_logs (ts);
+"""
+
+GROUPS = {
+    "device": "device",
+    "level": "level",
+    "hour": "CAST(ts / 3600 AS INTEGER) * 3600",
+    "day": "CAST(ts / 86400 AS INTEGER) * 86400",
+}
+
+def battery_of(message: str):
+    match = BATTERY_PATTERN.search(message)
+    if match is None:
+        return None
+    value = int(match.group(1))
+    return value if 0 <= value <= 100 else None
+
+class LogIndex:
+    """
+    retention_days > 0 deletes rows whose client timestamp is older than that, checked at most once an hour.
+    """
+
+    def __init__(self, path: str, retention_days: float = 30):
+        self.path = path
+        self.retention_days = retention_days
+        self._conn = None
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        self.indexed = 0
+        self.failed = 0
+        self.pruned = 0
+
+    def _writer(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # The text files are the durable copy (fsynced); the index can lose the last batch on power loss
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def add(self, records: list):
+        """
+        records: [(device_id, level, timestamp, message)], already sanitized by the sink.
+        """
+        rows = [(timestamp, device_id, level, battery_of(message), message)
+                for device_id, level, timestamp, message in records]
+        with self._lock:
+            try:
+                conn = self._writer()
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO remote_logs (ts, device, level, battery, message) VALUES (?, ?, ?, ?, ?)", rows
+                    )
+                self.indexed += len(rows)
+                self._maybe_prune(conn)
+            except Exception as e:
+                self.failed += len(rows)
+                logger.error(f"Indexing {len(rows)} device log records failed: {e}")
+
+    def _maybe_prune(self, conn):
+        now = time.time()
+        if self.retention_days <= 0 or now - self._last_prune < 3600:
+            return
+        self._last_prune = now
+        with conn:
+            deleted = conn.execute("DELETE FROM remote_logs WHERE ts < ?", (now - self.retention_days * 86400,)).rowcount
+        self.pruned += deleted
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def query(self, device=None, levels=None, since=None, until=None, battery_lt=None, battery_gt=None,
+              contains=None, group_by=None, limit: int = 1000) -> list:
+        """
+        Matching rows (newest first), or with group_by (device / level / hour / day) one row per group
+        with count, first/last timestamp and battery min/max/avg.
+        """
+        if not os.path.exists(self.path):
+            return []
+        where, params = [], []
+        if device is not None:
+            where.append("device = ?")
+            params.append(device)
+        if levels:
+            where.append(f"level IN ({', '.join('?' * len(levels))})")
+            params.extend(sorted(levels))
+        if since is not None:
+            where.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("ts <= ?")
+            params.append(until)
+        if battery_lt is not None:
+            where.append("battery < ?")
+            params.append(battery_lt)
+        if battery_gt is not None:
+            where.append("battery > ?")
+            params.append(battery_gt)
+        if contains is not None:
+            where.append("instr(message, ?) > 0")
+            params.append(contains)
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+
+        if group_by is not None:
+            key = GROUPS[group_by]
+            sql = (
+                f"SELECT {key} AS key, COUNT(*) AS count, MIN(ts) AS first_ts, MAX(ts) AS last_ts, "
+                f"MIN(battery) AS battery_min, MAX(battery) AS battery_max, AVG(battery) AS battery_avg "
+                f"FROM remote_logs {where_sql} GROUP BY key ORDER BY count DESC LIMIT ?"
+            )
+        else:
+            sql = f"SELECT ts, device, level, battery, message FROM remote_logs {where_sql} ORDER BY ts DESC LIMIT ?"
+        params.append(limit)
+
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"index_rows_written": self.indexed, "index_failed": self.failed, "index_pruned": self.pruned}
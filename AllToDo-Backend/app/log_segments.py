@@ -0,0 +1,325 @@
+import io
+import os
+import re
+import gzip
+import json
+import time
+import logging
+import threading
+
+logger = logging.getLogger("API_LOGGER")
+
+# Rotated device logs: logs/segments/{device_id}/{seq:08d}.log.gz plus index.jsonl, one entry per segment.
+# A segment is a series of independent gzip members ("blocks", ~block_bytes of text each), so the
+# file is still a plain .gz (zcat works) and a query can seek to and inflate only the blocks whose
+# time range / levels match. Timestamps are the client's (epoch seconds).
+
+SEGMENT_DIR = "segments"
+INDEX_FILE = "index.jsonl"
+
+# format_line(): "{icon} [{timestamp}] {level}: {message}"
+LINE_PATTERN = re.compile(r"^\S+ \[(-?[0-9.eE+-]+)\] (\w+): ")
+
+def parse_line(line: str):
+    """
+    (timestamp, level) of a log line, or None for continuation lines of multi-line messages.
+    """
+    match = LINE_PATTERN.match(line)
+    if match is None:
+        return None
+    try:
+        return float(match.group(1)), match.group(2)
+    except ValueError:
+        return None
+
+def iter_entries(lines):
+    """
+    Groups raw lines into (timestamp, level, text) entries; continuation lines stay with their entry.
+    """
+    current = None
+    for line in lines:
+        parsed = parse_line(line)
+        if parsed is None and current is not None:
+            current[2].append(line)
+            continue
+        if current is not None:
+            yield current[0], current[1], "".join(current[2])
+        timestamp, level = parsed if parsed is not None else (None, None)
+        current = [timestamp, level, [line]]
+    if current is not None:
+        yield current[0], current[1], "".join(current[2])
+
+def _overlaps(low, high, since, until) -> bool:
+    if low is None:
+        return True
+    return (since is None or high >= since) and (until is None or low <= until)
+
+def _matches(timestamp, level, since, until, levels) -> bool:
+    if levels is not None and level not in levels:
+        return False
+    if timestamp is None:
+        return since is None and until is None
+    return (since is None or timestamp >= since) and (until is None or timestamp <= until)
+
+class _BlockWriter:
+    """
+    Accumulates entries into gzip members and records each member's offset / length / time range / levels.
+    """
+
+    def __init__(self, f, block_bytes: int):
+        self.f = f
+        self.block_bytes = block_bytes
+        self.blocks = []
+        self.levels = {}
+        self.lines = 0
+        self.raw_bytes = 0
+        self._buffer = []
+        self._size = 0
+        self._min_ts = self._max_ts = None
+        self._block_levels = set()
+
+    def add(self, timestamp, level, text: str):
+        self._buffer.append(text)
+        self._size += len(text.encode("utf-8"))
+        self.lines += 1
+        if level is not None:
+            self.levels[level] = self.levels.get(level, 0) + 1
+            self._block_levels.add(level)
+        if timestamp is not None:
+            self._min_ts = timestamp if self._min_ts is None else min(self._min_ts, timestamp)
+            self._max_ts = timestamp if self._max_ts is None else max(self._max_ts, timestamp)
+        if self._size >= self.block_bytes:
+            self.finish_block()
+
+    def finish_block(self):
+        if not self._buffer:
+            return
+        data = gzip.compress("".join(self._buffer).encode("utf-8"), mtime=0)
+        offset = self.f.tell()
+        self.f.write(data)
+        self.blocks.append([offset, len(data), self._min_ts, self._max_ts, sorted(self._block_levels)])
+        self.raw_bytes += self._size
+        self._buffer = []
+        self._size = 0
+        self._min_ts = self._max_ts = None
+        self._block_levels = set()
+
+class LogSegments:
+    """
+    Compressed, time-indexed history of the device log files. DeviceLogSink calls rotate() from its
+    writer thread; search() / tail() are called from request threads.
+    keep_segments > 0 deletes the oldest segments of a device beyond that count.
+    """
+
+    def __init__(self, log_dir: str, block_bytes: int = 256 * 1024, keep_segments: int = 0):
+        self.log_dir = log_dir
+        self.block_bytes = block_bytes
+        self.keep_segments = keep_segments
+        self._lock = threading.Lock()
+        # device_id -> list of index entries (loaded on first use)
+        self._indexes = {}
+        self.rotations = 0
+        self.deleted = 0
+
+    def device_dir(self, device_id: str) -> str:
+        return os.path.join(self.log_dir, SEGMENT_DIR, device_id)
+
+    def devices(self) -> list:
+        root = os.path.join(self.log_dir, SEGMENT_DIR)
+        if not os.path.isdir(root):
+            return []
+        return [d for d in os.listdir(root) if os.path.isfile(os.path.join(root, d, INDEX_FILE))]
+
+    def index(self, device_id: str) -> list:
+        with self._lock:
+            entries = self._indexes.get(device_id)
+            if entries is None:
+                entries = self._indexes[device_id] = self._load_index(device_id)
+            return list(entries)
+
+    def _load_index(self, device_id: str) -> list:
+        path = os.path.join(self.device_dir(device_id), INDEX_FILE)
+        entries = []
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        # Torn last line after a crash; the segment is re-indexed by recover()
+                        pass
+        return entries
+
+    def rotate(self, device_id: str, active_path: str):
+        """
+        Moves the (closed) active file aside, compresses it into the next segment and indexes it.
+        The plain copy is only deleted once the index entry is on disk, so recover() can redo a crashed rotation.
+        """
+        if not os.path.exists(active_path) or os.path.getsize(active_path) == 0:
+            return
+        directory = self.device_dir(device_id)
+        os.makedirs(directory, exist_ok=True)
+        entries = self.index(device_id)
+        seq = entries[-1]["seq"] + 1 if entries else 1
+        pending = os.path.join(directory, f"{seq:08d}.log")
+        while os.path.exists(pending):
+            seq += 1
+            pending = os.path.join(directory, f"{seq:08d}.log")
+        os.replace(active_path, pending)
+        self._compress(device_id, seq, pending)
+
+    def recover(self):
+        """
+        Finishes rotations interrupted by a restart (plain NNNNNNNN.log files left in a segment directory).
+        """
+        for device_id in self.devices() + self._dirs_without_index():
+            directory = self.device_dir(device_id)
+            for name in sorted(os.listdir(directory)):
+                if name.endswith(".log") and name[:-4].isdigit():
+                    try:
+                        self._compress(device_id, int(name[:-4]), os.path.join(directory, name))
+                    except Exception as e:
+                        logger.error(f"Recovering log segment {device_id}/{name} failed: {e}")
+
+    def _dirs_without_index(self) -> list:
+        root = os.path.join(self.log_dir, SEGMENT_DIR)
+        if not os.path.isdir(root):
+            return []
+        return [d for d in os.listdir(root) if not os.path.exists(os.path.join(root, d, INDEX_FILE))]
+
+    def _compress(self, device_id: str, seq: int, pending: str):
+        directory = self.device_dir(device_id)
+        name = f"{seq:08d}.log.gz"
+        tmp = os.path.join(directory, name + ".tmp")
+        with open(pending, encoding="utf-8", errors="replace", newline="\n") as src, open(tmp, "wb") as dst:
+            writer = _BlockWriter(dst, self.block_bytes)
+            for timestamp, level, text in iter_entries(src):
+                writer.add(timestamp, level, text)
+            writer.finish_block()
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(tmp, os.path.join(directory, name))
+
+        timestamps = [b[2] for b in writer.blocks if b[2] is not None] + [b[3] for b in writer.blocks if b[3] is not None]
+        entry = {
+            "seq": seq,
+            "file": name,
+            "rotated_at": time.time(),
+            "min_ts": min(timestamps) if timestamps else None,
+            "max_ts": max(timestamps) if timestamps else None,
+            "lines": writer.lines,
+            "bytes": writer.raw_bytes,
+            "compressed_bytes": os.path.getsize(os.path.join(directory, name)),
+            "levels": writer.levels,
+            "blocks": writer.blocks,
+        }
+        with self._lock:
+            entries = self._indexes.get(device_id)
+            if entries is None:
+                entries = self._indexes[device_id] = self._load_index(device_id)
+            if not any(e["seq"] == seq for e in entries):
+                with open(os.path.join(directory, INDEX_FILE), "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                entries.append(entry)
+            self.rotations += 1
+        os.remove(pending)
+        logger.info(
+            f"Rotated device log {device_id} -> {name} ({entry['bytes']} -> {entry['compressed_bytes']} bytes, "
+            f"{len(writer.blocks)} blocks)"
+        )
+        if self.keep_segments > 0:
+            self._apply_retention(device_id)
+
+    def _apply_retention(self, device_id: str):
+        directory = self.device_dir(device_id)
+        with self._lock:
+            entries = self._indexes[device_id]
+            expired = entries[:max(0, len(entries) - self.keep_segments)]
+            if not expired:
+                return
+            kept = entries[len(expired):]
+            tmp = os.path.join(directory, INDEX_FILE + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                for entry in kept:
+                    f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, os.path.join(directory, INDEX_FILE))
+            self._indexes[device_id] = kept
+            self.deleted += len(expired)
+        for entry in expired:
+            try:
+                os.remove(os.path.join(directory, entry["file"]))
+            except FileNotFoundError:
+                pass
+
+    def _read_block(self, device_id: str, entry: dict, block) -> list:
+        with open(os.path.join(self.device_dir(device_id), entry["file"]), "rb") as f:
+            f.seek(block[0])
+            data = f.read(block[1])
+        return list(io.StringIO(gzip.decompress(data).decode("utf-8", errors="replace"), newline="\n"))
+
+    def search(self, device_id: str, since=None, until=None, levels=None, contains=None, limit: int = 1000,
+               stats: dict = None) -> list:
+        """
+        Matching lines from the segments, oldest first. Only blocks whose time range and level set
+        can match are read and inflated (counted in stats["blocks_read"] / ["blocks_skipped"]).
+        """
+        results = []
+        stats = stats if stats is not None else {}
+        for entry in self.index(device_id):
+            if not _overlaps(entry["min_ts"], entry["max_ts"], since, until) or \
+                    (levels is not None and not levels.intersection(entry["levels"])):
+                stats["blocks_skipped"] = stats.get("blocks_skipped", 0) + len(entry["blocks"])
+                continue
+            for block in entry["blocks"]:
+                if not _overlaps(block[2], block[3], since, until) or \
+                        (levels is not None and not levels.intersection(block[4])):
+                    stats["blocks_skipped"] = stats.get("blocks_skipped", 0) + 1
+                    continue
+                stats["blocks_read"] = stats.get("blocks_read", 0) + 1
+                for timestamp, level, text in iter_entries(self._read_block(device_id, entry, block)):
+                    if _matches(timestamp, level, since, until, levels) and (contains is None or contains in text):
+                        results.append(text)
+                        if len(results) >= limit:
+                            return results
+        return results
+
+    def tail(self, device_id: str, n: int) -> list:
+        """
+        Last n lines of the newest segments (for tails right after a rotation emptied the active file).
+        """
+        chunks = []
+        count = 0
+        for entry in reversed(self.index(device_id)):
+            for block in reversed(entry["blocks"]):
+                lines = self._read_block(device_id, entry, block)
+                chunks.append(lines)
+                count += len(lines)
+                if count >= n:
+                    break
+            if count >= n:
+                break
+        lines = [line for chunk in reversed(chunks) for line in chunk]
+        return lines[len(lines) - n:] if n > 0 else []
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"segment_rotations": self.rotations, "segments_deleted": self.deleted}
+
+def search_active(path: str, since=None, until=None, levels=None, contains=None, limit: int = 1000) -> list:
+    """
+    Same filters over the (uncompressed, at most one segment's worth) active file.
+    """
+    results = []
+    if not os.path.exists(path):
+        return results
+    with open(path, encoding="utf-8", errors="replace", newline="\n") as f:
+        for timestamp, level, text in iter_entries(f):
+            if _matches(timestamp, level, since, until, levels) and (contains is None or contains in text):
+                results.append(text)
+                if len(results) >= limit:
+                    break
+    return results
@@ -1,50 +1,76 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Body
+from fastapi.responses import PlainTextResponse
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
+from pydantic import ValidationError
 from dotenv import load_dotenv
 import os
+import time
+from typing import List
+from contextlib import asynccontextmanager
 
 load_dotenv()
 
-from .database import engine, Base, get_db
-from . import models, schemas, crud
+from .database import engine, async_engine, Base, get_db, get_async_db
+from . import models, schemas, crud, crud_async
+from .track_binary import TrackBinaryFormat
+from .usage_buffer import usage_log_buffer
+from .device_logs import device_log_sink
+from .user_info_cache import user_info_cache
+from .table_export import table_catalog
+from .wasm import wasm_cache
+from .request_logging import queue_logging, RequestLoggingMiddleware, request_logging_options
+from .sql_stats import sql_stats, SqlStatsMiddleware
+from .profiling import ProfilingMiddleware
+from .metrics import registry as metrics_registry, MetricsMiddleware, pool_collector, stats_collector
 
 # Create tables
 models.Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="AllToDo Backend")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    queue_logging.start()
+    usage_log_buffer.start()
+    device_log_sink.start()
+    try:
+        # Reflect once for /dev/tables instead of on every request
+        await run_in_threadpool(table_catalog.load)
+    except Exception as e:
+        logger.error(f"Table reflection failed (retried on first /dev/tables request): {e}")
+    yield
+    # Drain buffered writes before exiting
+    await run_in_threadpool(usage_log_buffer.stop)
+    await run_in_threadpool(device_log_sink.stop)
+    await async_engine.dispose()
+    queue_logging.stop()
+
+app = FastAPI(title="AllToDo Backend", lifespan=lifespan)
 
 import logging
-from fastapi import Request
 
 # Logging Configuration
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[logging.StreamHandler()]
-)
+# Handlers run on a QueueListener thread so logging never blocks the event loop
+queue_logging.install()
 logger = logging.getLogger("API_LOGGER")
 
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    # Log Request Details
-    logger.info(f"➡️  {request.method} {request.url}")
-    
-    # Log Body
-    try:
-        body = await request.body()
-        if body:
-            logger.info(f"📝 Body: {body.decode('utf-8')}")
-    except Exception as e:
-        logger.error(f"Failed to read body: {e}")
-
-    response = await call_next(request)
-    
-    # Log Response Status
-    logger.info(f"⬅️  Status: {response.status_code}")
-    return response
+# Request log: one line per request (method, path, status, latency, truncated body)
+app.add_middleware(RequestLoggingMiddleware, **request_logging_options())
+# Statement timing per route + N+1 detection (GET /dev/sql-stats)
+sql_stats.attach(engine)
+sql_stats.attach(async_engine.sync_engine)
+app.add_middleware(SqlStatsMiddleware, stats=sql_stats)
+# Outermost: latency histogram / in-flight gauge for GET /metrics
+app.add_middleware(MetricsMiddleware)
+metrics_registry.register_collector(pool_collector({"sync": engine.pool, "async": async_engine.pool}))
+metrics_registry.register_collector(stats_collector("usage_log_buffer", "/log-usage write buffer", usage_log_buffer.stats, gauges=("pending",)))
+metrics_registry.register_collector(stats_collector("device_log_sink", "/dev/logs device log writer", device_log_sink.stats, gauges=("pending", "open_files")))
+metrics_registry.register_collector(stats_collector("user_info_cache", "/user-info cache", user_info_cache.stats, gauges=("size", "max_entries", "ttl_s", "hit_ratio")))
+metrics_registry.register_collector(stats_collector("wasm_cache", "/wasm/advanced artifact cache", wasm_cache.stats, gauges=("size",)))
 
 @app.post("/check-user", response_model=schemas.UserResponse)
-def check_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def check_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
     """
     **사용자 확인 및 생성**
 
@@ -52,32 +78,64 @@ def check_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     
     - **존재 시**: 기존 정보를 반환합니다.
     - **미존재 시**: 새로운 사용자를 **생성**하고 반환합니다.
+    - **동시 요청**: 같은 UUID로 동시에 호출되어도 한 번만 생성되며 둘 다 정상 응답합니다.
     """
-    db_user = crud.get_user(db, uuid=user.uuid)
-    if db_user:
-        return {"uuid": db_user.uuid, "created_at": db_user.created_at, "message": "User exists"}
-    
-    # Create new user
-    new_user = crud.create_user(db, user=user)
-    return {"uuid": new_user.uuid, "created_at": new_user.created_at, "message": "User created"}
+    try:
+        row = await crud_async.upsert_user(db, user=user)
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Nickname already taken")
+
+    message = "User created" if row.created else "User exists"
+    return {"uuid": row.uuid, "created_at": row.created_at, "message": message}
 
 @app.post("/log-usage", response_model=schemas.LogResponse)
-def log_usage(log: schemas.LogCreate, db: Session = Depends(get_db)):
+async def log_usage(log: schemas.LogCreate):
     """
     **사용 로그 기록**
 
     사용자의 활동(위치, 시간)을 기록합니다.
     
     - 백그라운드에서 주기적으로 호출되어 사용자의 동선을 추적하는 데 사용됩니다.
+    - **지연 쓰기**: 요청마다 커밋하지 않고 메모리 버퍼에 쌓았다가 여러 건을 한 번에 저장합니다.
+    - **버퍼 가득 참**: 잠시 대기 후에도 공간이 없으면 `503`을 반환하므로 클라이언트는 재시도해야 합니다.
+    - **미등록 사용자**: `/check-user`로 생성되지 않은 `user_uuid`의 로그는 저장 시 버려집니다(`/dev/stats`의 `unknown_user`).
     """
-    crud.create_usage_log(db, log=log)
-    crud.create_usage_log(db, log=log)
+    # Fast path never blocks the event loop; only a full buffer waits, in the threadpool
+    accepted = usage_log_buffer.add(log.user_uuid, log.latitude, log.longitude, block=False) or \
+        await run_in_threadpool(usage_log_buffer.add, log.user_uuid, log.latitude, log.longitude)
+    if not accepted:
+        raise HTTPException(status_code=503, detail="Usage log buffer full, retry later")
     return {"status": "success"}
 
 
 
+@app.post("/log-usage/batch", response_model=schemas.LogBatchResponse)
+async def log_usage_batch(batch: schemas.LogBatchCreate, db: AsyncSession = Depends(get_async_db)):
+    """
+    **사용 로그 일괄 기록**
+
+    오프라인 동안 쌓인 위치 로그를 한 번의 요청으로 저장합니다.
+    
+    - **클라이언트 시간**: 각 항목의 `timestamp`(기록 시각)가 그대로 저장됩니다.
+    - **멱등성**: 같은 `user_uuid`의 `device_id` + `seq`가 이미 저장된 항목은 건너뛰므로, 응답을 받지 못했다면 같은 배치를 다시 보내도 됩니다.
+    - **제한**: 한 요청당 최대 5000건.
+    """
+    try:
+        inserted = await crud_async.create_usage_logs_batch(db, batch=batch)
+    except IntegrityError:
+        raise HTTPException(status_code=400, detail="Unknown user_uuid")
+
+    received = len(batch.logs)
+    return {
+        "status": "success",
+        "received": received,
+        "inserted": inserted,
+        "duplicates": received - inserted
+    }
+
 @app.post("/update-info", response_model=schemas.UserUpdateResponse)
-def update_info(info: schemas.UserInfoUpdate, db: Session = Depends(get_db)):
+async def update_info(info: schemas.UserInfoUpdate, db: AsyncSession = Depends(get_async_db)):
     """
     **사용자 정보를 업데이트합니다.**
 
@@ -91,11 +149,102 @@ def update_info(info: schemas.UserInfoUpdate, db: Session = Depends(get_db)):
     2. `user_uuid`는 필수 항목입니다.
     """
     try:
-        crud.update_user_info(db, info=info)
+        await crud_async.update_user_info(db, info=info)
         return {"status": "updated"}
+    except crud.UnreadableUserInfo as e:
+        # Re-sealing would drop the fields that cannot be read
+        logger.error(f"Refusing to update user info: {e}")
+        raise HTTPException(status_code=409, detail="Stored user info cannot be decrypted")
     except Exception as e:
         print(f"Error in update_info: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        user_info_cache.invalidate(info.user_uuid)
+
+@app.post("/tracks", response_model=schemas.TrackIngestResponse)
+def create_track(track: schemas.TrackCreate, db: Session = Depends(get_db)):
+    """
+    **트랙 일괄 업로드**
+
+    트랙 헤더와 원본/압축 포인트 전체를 **하나의 트랜잭션**으로 저장합니다.
+    
+    - **일괄 INSERT**: 포인트는 행마다 INSERT 하지 않고 다중 행(multi-row) INSERT로 저장됩니다.
+    - **응답**: 생성된 트랙 `id`와 저장 건수, 처리 시간(`elapsed_ms`), 초당 처리 포인트 수를 반환합니다.
+    """
+    start = time.perf_counter()
+    try:
+        track_id, raw_inserted, compressed_inserted = crud.create_track(db, track=track)
+    except IntegrityError:
+        raise HTTPException(status_code=400, detail="Unknown user_uuid or invalid track data")
+    except Exception as e:
+        logger.error(f"Track ingest failed: {e}")
+        raise HTTPException(status_code=500, detail="Track ingest failed")
+    elapsed = time.perf_counter() - start
+
+    total = raw_inserted + compressed_inserted
+    return {
+        "id": track_id,
+        "raw_inserted": raw_inserted,
+        "compressed_inserted": compressed_inserted,
+        "elapsed_ms": round(elapsed * 1000, 2),
+        "points_per_sec": round(total / elapsed, 1) if elapsed > 0 else 0.0
+    }
+
+@app.post("/tracks/binary", response_model=schemas.TrackIngestResponse)
+def create_track_binary(body: bytes = Body(..., media_type="application/octet-stream"), db: Session = Depends(get_db)):
+    """
+    **트랙 일괄 업로드 (바이너리)**
+
+    `POST /tracks`와 동일하지만 본문을 `application/octet-stream`으로 받습니다.
+    
+    - **형식**: 작은 헤더(JSON, 트랙 필드) + int32 포인트 배열 (`app/track_binary.py` 참고)
+    - **장점**: 포인트마다 Pydantic 모델을 만들지 않아 긴 트랙의 요청 CPU 사용량이 크게 줄어듭니다.
+    """
+    start = time.perf_counter()
+    try:
+        header, raw, compressed_rows = TrackBinaryFormat.parse(body)
+    except (ValueError, ValidationError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid track payload: {e}")
+
+    try:
+        track_id, raw_inserted, compressed_inserted = crud.save_track(db, header, raw, compressed_rows)
+    except IntegrityError:
+        raise HTTPException(status_code=400, detail="Unknown user_uuid or invalid track data")
+    except Exception as e:
+        logger.error(f"Track ingest failed: {e}")
+        raise HTTPException(status_code=500, detail="Track ingest failed")
+    elapsed = time.perf_counter() - start
+
+    total = raw_inserted + compressed_inserted
+    return {
+        "id": track_id,
+        "raw_inserted": raw_inserted,
+        "compressed_inserted": compressed_inserted,
+        "elapsed_ms": round(elapsed * 1000, 2),
+        "points_per_sec": round(total / elapsed, 1) if elapsed > 0 else 0.0
+    }
+
+@app.get("/tracks/{track_id}/raw-points", response_model=List[schemas.TrackPointRawCreate])
+def get_track_raw_points(track_id: int, db: Session = Depends(get_db)):
+    """
+    **트랙 원본 포인트 조회**
+
+    트랙의 원본 포인트 전체를 `seq` 순서로 반환합니다.
+    
+    - **packed 저장 모드**: 포인트가 트랙 행 하나의 바이너리 컬럼에 압축 저장되어 있으면 한 행만 읽어 복원합니다.
+    """
+    points = crud.get_track_raw_points(db, track_id=track_id)
+    if points is None:
+        raise HTTPException(status_code=404, detail="Track not found")
+    return points
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    """
+    Prometheus text format: request latency per route/status, in-flight requests,
+    DB pool checkout wait / utilization, WASM byte counters, buffer and cache stats.
+    """
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 def read_root():
@@ -107,7 +256,7 @@ def read_root():
     return {"message": "Welcome to AllToDo API"}
 
 @app.post("/recover-uuid")
-def recover_uuid(request: schemas.RecoverRequest, db: Session = Depends(get_db)):
+async def recover_uuid(request: schemas.RecoverRequest, db: AsyncSession = Depends(get_async_db)):
     """
     **UUID 복구**
 
@@ -116,18 +265,18 @@ def recover_uuid(request: schemas.RecoverRequest, db: Session = Depends(get_db))
     - **필수 조건**: 이전에 `nickname`과 `password`를 설정해 두었어야 합니다.
     - **검증**: 닉네임과 비밀번호가 일치하면 원래의 UUID를 반환합니다.
     """
-    user = crud.get_user_by_nickname(db, nickname=request.nickname)
+    user = await crud_async.get_user_by_nickname(db, nickname=request.nickname)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Verify password
-    if not crud.verify_user_password(db, user.uuid, request.password):
+    if not await crud_async.verify_user_password(db, user.uuid, request.password):
         raise HTTPException(status_code=401, detail="Invalid password")
     
     return {"uuid": user.uuid, "message": "Recovery successful"}
 
 @app.get("/user-info", response_model=schemas.UserInfoResponse)
-def get_user_info(uuid: str, db: Session = Depends(get_db)):
+async def get_user_info(uuid: str, db: AsyncSession = Depends(get_async_db)):
     """
     **내 정보 조회**
 
@@ -135,36 +284,26 @@ def get_user_info(uuid: str, db: Session = Depends(get_db)):
     
     - **자동 복호화**: 서버에 암호화되어 저장된 개인정보를 **복호화**하여 반환합니다.
     - **빈 값 처리**: 저장되지 않은 항목은 `null`로 반환됩니다.
+    - **캐시**: 복호화된 결과는 워커 프로세스별 메모리에 잠시 캐시됩니다. `/update-info`를 처리한 워커는 즉시 무효화하고, 다른 워커는 최대 `USER_INFO_CACHE_TTL_S`초 동안 이전 값을 반환할 수 있습니다.
     """
-    # 1. Get User Info (Encrypted)
-    db_info = db.query(models.UserInfo).filter(models.UserInfo.user_uuid == uuid).first()
+    # 0. Cache hit: no DB query, no decryption
+    cached, generation = user_info_cache.get(uuid)
+    if cached is not None:
+        return cached
+
+    # 1. Get User Info (Encrypted) + nickname in one query
+    row = await crud_async.get_user_info(db, uuid=uuid)
     
-    if not db_info:
+    if not row:
         # Return empty info with just UUID
-        return schemas.UserInfoResponse(user_uuid=uuid)
-    
-    # 2. Decrypt Fields
-    # Helper to decrypt or return None if empty/fail
-    def safe_decrypt(val):
-        if not val: return None
-        try:
-            return decrypt(val)
-        except:
-            return None
-
-    return schemas.UserInfoResponse(
-        user_uuid=db_info.user_uuid,
-        name=safe_decrypt(db_info.name),
-        phone_number=safe_decrypt(db_info.phone_number),
-        age=safe_decrypt(db_info.age),
-        address=safe_decrypt(db_info.address),
-        address_lat=safe_decrypt(db_info.address_lat),
-        address_long=safe_decrypt(db_info.address_long),
-        work_address=safe_decrypt(db_info.work_address),
-        work_lat=safe_decrypt(db_info.work_lat),
-        work_long=safe_decrypt(db_info.work_long),
-        nickname=db_info.user.nickname # Access nickname from relationship
-    )
+        response = schemas.UserInfoResponse(user_uuid=uuid)
+    else:
+        # 2. Decrypt Fields
+        db_info, nickname = row
+        response = crud.user_info_response(db_info, nickname)
+
+    user_info_cache.put(uuid, response, generation)
+    return response
 
 # Development APIs
 from . import dev
@@ -173,3 +312,6 @@ from . import wasm
 
 app.include_router(dev.router)
 app.include_router(wasm.router)
+
+# On-demand profiling of single requests (X-Profile header with the dev password, or PROFILE_SAMPLE_RATE)
+app.add_middleware(ProfilingMiddleware, password=dev.DEV_PASSWORD)
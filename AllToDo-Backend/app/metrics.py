@@ -0,0 +1,234 @@
+import time
+import bisect
+import threading
+
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+# In-process metrics in Prometheus text format (GET /metrics), no client library or push gateway.
+# Updates take one lock per metric and a dict lookup, cheap enough for every request.
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    TYPE = "counter"
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for label_values, value in items:
+            yield self.name, _format_labels(self.label_names, label_values), value
+
+class Gauge(Counter):
+    TYPE = "gauge"
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, *label_values, value):
+        with self._lock:
+            self._values[label_values] = value
+
+class Histogram:
+    TYPE = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last = +Inf), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self._series.items()]
+        for label_values, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = (("le", _format_value(bound)),)
+                yield self.name + "_bucket", _format_labels(self.label_names, label_values, le), cumulative
+            labels = _format_labels(self.label_names, label_values)
+            yield self.name + "_sum", labels, total
+            yield self.name + "_count", labels, count
+
+class MetricsRegistry:
+    """
+    Holds the metrics plus collectors: callables run at scrape time that
+    return [(name, type, help, [(labels dict, value)])] for values owned elsewhere
+    (pool size, buffer and cache stats), so nothing has to push them on the hot path.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help_text, labels=()) -> Counter:
+        return self._add(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()) -> Gauge:
+        return self._add(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.TYPE}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        for collector in self._collectors:
+            for name, metric_type, help_text, samples in collector():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template and status",
+    labels=("method", "route", "status")
+)
+REQUESTS_IN_FLIGHT = registry.gauge("http_requests_in_flight", "HTTP requests being processed", labels=("method",))
+POOL_CHECKOUT_WAIT = registry.histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled DB connection",
+    labels=("engine",), buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+)
+WASM_DOWNLOADS = registry.counter("wasm_downloads_total", "WASM module downloads", labels=("format",))
+WASM_DOWNLOAD_BYTES = registry.counter("wasm_download_bytes_total", "WASM response payload bytes sent", labels=("format",))
+WASM_UPLOAD_BYTES = registry.counter("wasm_upload_bytes_total", "WASM module bytes uploaded")
+
+class MetricsMiddleware:
+    """
+    Pure ASGI: in-flight gauge + latency histogram per (method, route template, status).
+    Unmatched paths are grouped under one label so random URLs cannot blow up cardinality.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc(method)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec(method)
+            route = getattr(scope.get("route"), "path", "<unmatched>")
+            REQUEST_DURATION.observe(time.perf_counter() - start, method, route, str(status))
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool that records how long each checkout waited (SQLAlchemy has no pre-checkout event).
+    """
+    metrics_label = "sync"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start, self.metrics_label)
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    metrics_label = "async"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start, self.metrics_label)
+
+def pool_collector(pools: dict):
+    """
+    Scrape-time pool utilization for {"sync": engine.pool, "async": async_engine.pool}.
+    """
+    def collect():
+        stats = {"size": [], "checked_out": [], "overflow": []}
+        for label, pool in pools.items():
+            if not isinstance(pool, QueuePool):
+                continue
+            stats["size"].append(({"engine": label}, pool.size()))
+            stats["checked_out"].append(({"engine": label}, pool.checkedout()))
+            stats["overflow"].append(({"engine": label}, max(pool.overflow(), 0)))
+        return [
+            ("db_pool_size", "gauge", "Configured pool size", stats["size"]),
+            ("db_pool_checked_out", "gauge", "Connections currently checked out", stats["checked_out"]),
+            ("db_pool_overflow", "gauge", "Connections open beyond pool_size", stats["overflow"]),
+        ]
+    return collect
+
+def stats_collector(prefix: str, help_text: str, stats, gauges=()):
+    """
+    Exposes a stats() dict (usage_log_buffer, user_info_cache) as prefix_<key>_total counters,
+    or prefix_<key> gauges for the keys listed in gauges.
+    """
+    def collect():
+        metrics = []
+        for key, value in stats().items():
+            if not isinstance(value, (int, float)):
+                continue
+            if key in gauges:
+                metrics.append((f"{prefix}_{key}", "gauge", f"{help_text}: {key}", [({}, value)]))
+            else:
+                metrics.append((f"{prefix}_{key}_total", "counter", f"{help_text}: {key}", [({}, value)]))
+        return metrics
+    return collect
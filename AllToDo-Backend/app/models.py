@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Float, DateTime, ForeignKey, Integer, Boolean, Text
+from sqlalchemy import Column, String, Float, DateTime, ForeignKey, Integer, Boolean, Text, LargeBinary, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -34,6 +34,9 @@ class UserInfo(Base):
     work_lat = Column(String, nullable=True) # Encrypted string
     work_long = Column(String, nullable=True) # Encrypted string
 
+    # USER_INFO_STORAGE_MODE=sealed: all fields above in one AEAD blob (app/user_info_envelope.py), columns left NULL
+    sealed = Column(LargeBinary, nullable=True)
+
     user = relationship("User", back_populates="user_info")
 
 class UsageLog(Base):
@@ -45,8 +48,17 @@ class UsageLog(Base):
     latitude = Column(Float)
     longitude = Column(Float)
 
+    # Set by /log-usage/batch: per-user, per-device sequence number makes re-sent batches idempotent
+    # (user_uuid is part of the key: a reinstall / recovered uuid may restart seq on the same device)
+    device_id = Column(String, nullable=True)
+    client_seq = Column(Integer, nullable=True)
+
     user = relationship("User", back_populates="usage_logs")
 
+    __table_args__ = (
+        UniqueConstraint("user_uuid", "device_id", "client_seq", name="uq_usage_logs_user_device_seq"),
+    )
+
 # --- New Models for IntCoordinate System ---
 
 class Track(Base):
@@ -70,6 +82,9 @@ class Track(Base):
     raw_point_count = Column(Integer, default=0)
     compressed_count = Column(Integer, default=0)
     
+    # Packed storage mode: raw points as one PointCodec blob instead of track_points_raw rows
+    raw_points_blob = Column(LargeBinary, nullable=True)
+    
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     user = relationship("User", back_populates="tracks")
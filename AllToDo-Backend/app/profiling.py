@@ -0,0 +1,190 @@
+import os
+import sys
+import hmac
+import time
+import random
+import threading
+import cProfile
+import logging
+from pathlib import Path
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger("API_LOGGER")
+
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "profiles"))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sample")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+# Leaf frames of threads that are just waiting (pool workers, log listener, aiosqlite, the selector)
+IDLE_FRAMES = {
+    ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"), ("queue.py", "get"), ("thread.py", "_worker"),
+    ("handlers.py", "dequeue"), ("core.py", "_connection_worker_thread"),
+}
+
+class StackSampler:
+    """
+    Statistical profiler: a thread that snapshots every other thread's stack each interval_s.
+    Covers the event loop and the threadpool (sync endpoints), unlike cProfile which only sees
+    the thread it was enabled on. Output is the collapsed-stack format ("a;b;c count")
+    that flamegraph.pl / speedscope read directly.
+    """
+
+    def __init__(self, interval_s: float = 0.001):
+        self.interval_s = interval_s
+        self.stacks = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval_s):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                key = ";".join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def dump(self, path: Path):
+        with path.open("w") as f:
+            for stack, count in sorted(self.stacks.items(), key=lambda item: -item[1]):
+                f.write(f"{stack} {count}\n")
+
+def _safe_name(text: str) -> str:
+    return "".join(c if c.isalnum() else "_" for c in text).strip("_")[:60] or "root"
+
+def profile_file_name(mode: str, method: str, path: str) -> str:
+    suffix = "collapsed" if mode == "sample" else "pstats"
+    millis = int(time.time() * 1000) % 1000
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{millis:03d}_{method}_{_safe_name(path)}_{os.getpid()}.{suffix}"
+
+def write_profile(profiler, name: str):
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    path = PROFILE_DIR / name
+    if isinstance(profiler, StackSampler):
+        profiler.dump(path)
+    else:
+        profiler.dump_stats(str(path))
+
+    # Keep the directory bounded
+    files = sorted(list_profiles(), key=lambda p: p["modified"])
+    for old in files[:max(0, len(files) - PROFILE_MAX_FILES)]:
+        (PROFILE_DIR / old["name"]).unlink(missing_ok=True)
+
+def list_profiles() -> list:
+    if not PROFILE_DIR.exists():
+        return []
+    profiles = []
+    for path in PROFILE_DIR.iterdir():
+        if path.suffix in (".collapsed", ".pstats"):
+            stat = path.stat()
+            profiles.append({"name": path.name, "size": stat.st_size, "modified": stat.st_mtime})
+    return sorted(profiles, key=lambda p: p["modified"], reverse=True)
+
+def profile_path(name: str):
+    """
+    Path of a profile file, or None (also for anything that is not a plain file name in PROFILE_DIR).
+    """
+    if Path(name).name != name or not name.endswith((".collapsed", ".pstats")):
+        return None
+    path = PROFILE_DIR / name
+    return path if path.is_file() else None
+
+class ProfilingMiddleware:
+    """
+    Profiles single requests on demand:
+    - header "X-Profile: <dev password>" (optional "X-Profile-Mode: sample|cprofile"), or
+    - a random PROFILE_SAMPLE_RATE fraction of requests.
+    The file name is returned in the X-Profile-File response header (the file is written right
+    after the response completes); files are listed under /dev/profiles.
+
+    "cprofile" is deterministic but only sees the event loop thread: use it for async endpoints.
+    Other requests running concurrently show up in both modes, so profile on a quiet instance when possible.
+    Requests that are not profiled cost one header lookup (plus random() when sampling is on).
+    """
+
+    def __init__(self, app, password: str, sample_rate: float = PROFILE_SAMPLE_RATE, mode: str = PROFILE_MODE):
+        self.app = app
+        self.password = password.encode()
+        self.sample_rate = sample_rate
+        self.mode = mode
+        # One cProfile at a time (it replaces the thread's profile hook); the loop is single-threaded
+        self._cprofile_active = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        mode = None
+        for name, value in scope["headers"]:
+            if name == b"x-profile" and hmac.compare_digest(value, self.password):
+                mode = self.mode
+                for name2, value2 in scope["headers"]:
+                    if name2 == b"x-profile-mode" and value2 in (b"sample", b"cprofile"):
+                        mode = value2.decode()
+                break
+        if mode is None and self.sample_rate > 0 and random.random() < self.sample_rate:
+            mode = self.mode
+        if mode == "cprofile" and self._cprofile_active:
+            mode = None
+        if mode is None:
+            return await self.app(scope, receive, send)
+
+        await self._profiled(scope, receive, send, mode)
+
+    async def _profiled(self, scope, receive, send, mode):
+        name = profile_file_name(mode, scope["method"], scope["path"])
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = dict(message, headers=list(message.get("headers", [])) + [(b"x-profile-file", name.encode())])
+            await send(message)
+
+        if mode == "sample":
+            profiler = StackSampler(PROFILE_INTERVAL_MS / 1000)
+            profiler.start()
+        else:
+            self._cprofile_active = True
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if mode == "sample":
+                # Joins the sampler thread (up to one interval plus a snapshot): not on the event loop
+                await run_in_threadpool(profiler.stop)
+            else:
+                profiler.disable()
+                self._cprofile_active = False
+            try:
+                await run_in_threadpool(write_profile, profiler, name)
+                logger.info(f"Profiled {scope['method']} {scope['path']} ({elapsed_ms:.1f} ms) -> {name}")
+            except Exception as e:
+                logger.error(f"Writing profile failed: {e}")
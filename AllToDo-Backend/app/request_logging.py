@@ -0,0 +1,156 @@
+import os
+import re
+import time
+import queue
+import random
+import logging
+import logging.handlers
+
+from .schemas import UserInfoUpdate
+
+logger = logging.getLogger("API_LOGGER")
+
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+
+class QueueLogging:
+    """
+    Root logger -> QueueHandler -> (listener thread) -> StreamHandler.
+
+    logger.info() on the event loop only puts the record on an in-memory queue;
+    formatting and the blocking write to stderr happen on the listener thread.
+    """
+
+    def __init__(self, handlers=None, level=logging.INFO):
+        self.queue = queue.SimpleQueue()
+        handlers = handlers or [logging.StreamHandler()]
+        for handler in handlers:
+            handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        self.listener = logging.handlers.QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self.level = level
+        self._started = False
+
+    def install(self):
+        root = logging.getLogger()
+        root.handlers = [logging.handlers.QueueHandler(self.queue)]
+        root.setLevel(self.level)
+        self.start()
+
+    def start(self):
+        if not self._started:
+            self.listener.start()
+            self._started = True
+
+    def stop(self):
+        # Flushes every queued record before returning
+        if self._started:
+            self.listener.stop()
+            self._started = False
+
+TEXT_CONTENT_TYPES = ("application/json", "text/", "application/x-www-form-urlencoded")
+# Every personal field of /update-info (the values the app encrypts at rest), plus the dev password:
+# /dev/* routes take it as ?password= (app/dev.py verify_dev_password), /recover-uuid in its JSON body
+DEV_PASSWORD_FIELDS = {"password"}
+SECRET_FIELDS = sorted((set(UserInfoUpdate.model_fields) - {"user_uuid"}) | DEV_PASSWORD_FIELDS)
+_SECRET_NAMES = "|".join(map(re.escape, SECRET_FIELDS))
+SECRET_PATTERNS = [
+    # JSON bodies: {"name": "..."} / {"age": 30} (closing quote optional: the preview may end inside the value)
+    (re.compile(rf'("(?:{_SECRET_NAMES})"\s*:\s*)(?:"(?:[^"\\]|\\.)*"?|[^,}}\]\s]+)', re.IGNORECASE), r'\1"***"'),
+    # Query strings and form bodies: ?password=...
+    (re.compile(rf'(?<![\w])((?:{_SECRET_NAMES})=)[^&]*', re.IGNORECASE), r'\1***'),
+]
+
+def redact(text: str) -> str:
+    for pattern, replacement in SECRET_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+def parse_sample_rates(value: str) -> dict:
+    """
+    "/log-usage=0.01,/dev/logs=0" -> {"/log-usage": 0.01, "/dev/logs": 0.0}
+    """
+    rates = {}
+    for item in value.split(","):
+        if "=" in item:
+            route, rate = item.rsplit("=", 1)
+            rates[route.strip()] = float(rate)
+    return rates
+
+class RequestLoggingMiddleware:
+    """
+    Pure ASGI request logger: one line per request with method, path, status and latency.
+
+    - The body is never awaited up front: the first body_max_bytes are copied as the
+      endpoint reads them, so large uploads are neither buffered twice nor delayed.
+    - Binary content types (octet-stream, multipart, wasm, ...) only log their size.
+    - Passwords and personal fields (SECRET_FIELDS) in JSON bodies and query strings are masked.
+    - sample_rates maps a route path ("/tracks/{track_id}/raw-points") to the fraction
+      of requests logged; 5xx responses are always logged.
+    """
+
+    def __init__(self, app, body_max_bytes: int = 1024, default_rate: float = 1.0, sample_rates: dict = None):
+        self.app = app
+        self.body_max_bytes = body_max_bytes
+        self.default_rate = default_rate
+        self.sample_rates = sample_rates or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        headers = dict(scope["headers"])
+        content_type = headers.get(b"content-type", b"").decode("latin-1")
+        capture = self.body_max_bytes > 0 and content_type.startswith(TEXT_CONTENT_TYPES)
+        preview = bytearray()
+        received = 0
+        status = 500
+
+        async def receive_wrapper():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                received += len(chunk)
+                if capture and len(preview) < self.body_max_bytes:
+                    preview.extend(chunk[:self.body_max_bytes - len(preview)])
+            return message
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            route = scope.get("route")
+            route_path = getattr(route, "path", scope["path"])
+            rate = self.sample_rates.get(route_path, self.default_rate)
+            if status >= 500 or (rate > 0 and (rate >= 1 or random.random() < rate)):
+                self._log(scope, status, elapsed_ms, content_type, capture, preview, received)
+
+    def _log(self, scope, status, elapsed_ms, content_type, capture, preview, received):
+        target = scope["path"]
+        if scope.get("query_string"):
+            target += "?" + scope["query_string"].decode("latin-1")
+        line = f"{scope['method']} {redact(target)} -> {status} ({elapsed_ms:.1f} ms)"
+        if received:
+            if capture:
+                body = redact(preview.decode("utf-8", errors="replace"))
+                suffix = f"... ({received} bytes)" if received > len(preview) else ""
+                line += f" | 📝 {body}{suffix}"
+            else:
+                line += f" | 📝 <{received} bytes {content_type or 'unknown'}>"
+        level = logging.ERROR if status >= 500 else logging.INFO
+        logger.log(level, line)
+
+queue_logging = QueueLogging()
+
+def request_logging_options() -> dict:
+    return {
+        "body_max_bytes": int(os.getenv("LOG_BODY_MAX_BYTES", "1024")),
+        "default_rate": float(os.getenv("LOG_SAMPLE_DEFAULT", "1.0")),
+        "sample_rates": parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", "")),
+    }
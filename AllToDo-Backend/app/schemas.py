@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 
@@ -30,6 +30,25 @@ class LogCreate(BaseModel):
 class LogResponse(BaseModel):
     status: str
 
+LOG_BATCH_MAX = 5000
+
+class LogBatchItem(BaseModel):
+    seq: int # Per-device sequence number (idempotency key)
+    latitude: float
+    longitude: float
+    timestamp: datetime # Client time the point was recorded
+
+class LogBatchCreate(BaseModel):
+    user_uuid: str
+    device_id: str
+    logs: List[LogBatchItem] = Field(..., max_length=LOG_BATCH_MAX)
+
+class LogBatchResponse(BaseModel):
+    status: str
+    received: int
+    inserted: int
+    duplicates: int
+
 # User Info Schemas (Input is plain text, output is plain text - encryption happens internally)
 class UserInfoUpdate(BaseModel):
     user_uuid: str
@@ -76,7 +95,7 @@ class TrackPointCompressedCreate(TrackPointBase):
     is_corner: bool = False
     note: Optional[str] = None
 
-class TrackCreate(BaseModel):
+class TrackHeader(BaseModel):
     user_uuid: str
     device_id: Optional[str] = None
     started_at: datetime
@@ -89,10 +108,18 @@ class TrackCreate(BaseModel):
     distance_m: float
     raw_point_count: int
     compressed_count: int
-    
+
+class TrackCreate(TrackHeader):
     raw_points: List[TrackPointRawCreate] = []
     compressed_points: List[TrackPointCompressedCreate] = []
 
+class TrackIngestResponse(BaseModel):
+    id: int
+    raw_inserted: int
+    compressed_inserted: int
+    elapsed_ms: float
+    points_per_sec: float
+
 class TrackResponse(BaseModel):
     id: int
     user_uuid: str
@@ -115,4 +142,6 @@ class RemoteLogCreate(BaseModel):
 
 class RemoteLogResponse(BaseModel):
     status: str
+    accepted: int = 0
+    dropped: int = 0 # Not stored: server queue full
 
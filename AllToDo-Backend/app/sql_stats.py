@@ -0,0 +1,176 @@
+import os
+import re
+import time
+import logging
+import threading
+from collections import deque
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+logger = logging.getLogger("API_LOGGER")
+
+# Statement timing through engine events (before/after_cursor_execute), aggregated per
+# normalized statement and per (route, statement). Read via GET /dev/sql-stats.
+
+SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "200"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "5"))
+SAMPLES_PER_STATEMENT = 1000
+
+_NORMALIZE = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),                           # string literals
+    (re.compile(r"%\(\w+\)s|\$\d+|\?"), "?"),                       # bind params (psycopg2, asyncpg, sqlite)
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),                         # numeric literals
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)"), "(?)"),              # (?, ?, ?) -> (?)
+    (re.compile(r"\(\?\)(?:\s*,\s*\(\?\))+"), "(?), ..."),           # multi-row VALUES
+    (re.compile(r"\s+"), " "),
+]
+
+def normalize_sql(statement: str) -> str:
+    """
+    SELECT ... WHERE uuid = %(uuid_1)s LIMIT %(param_1)s -> SELECT ... WHERE uuid = ? LIMIT ?
+    """
+    for pattern, replacement in _NORMALIZE:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()[:1000]
+
+class _Timing:
+    __slots__ = ("count", "total_s", "max_s", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+        self.samples = deque(maxlen=SAMPLES_PER_STATEMENT)
+
+    def add(self, elapsed_s: float):
+        self.count += 1
+        self.total_s += elapsed_s
+        self.max_s = max(self.max_s, elapsed_s)
+        self.samples.append(elapsed_s)
+
+    def to_dict(self) -> dict:
+        ordered = sorted(self.samples)
+        percentile = lambda q: ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000 if ordered else 0.0
+        return {
+            "count": self.count,
+            "total_ms": self.total_s * 1000,
+            "mean_ms": self.total_s / self.count * 1000 if self.count else 0.0,
+            "p50_ms": percentile(0.5),
+            "p99_ms": percentile(0.99),
+            "max_ms": self.max_s * 1000,
+        }
+
+# Per-request holder set by SqlStatsMiddleware. It is a mutable dict so statements run in the
+# threadpool (sync endpoints copy the context) still count against the request.
+_current_request = ContextVar("sql_stats_request", default=None)
+
+def _route_of(request) -> str:
+    if request is None:
+        return "<background>"
+    return getattr(request["scope"].get("route"), "path", "<unmatched>")
+
+class SqlStats:
+    """
+    p50/p99 come from the last SAMPLES_PER_STATEMENT executions of each statement.
+    N+1: a request that runs the same normalized statement N_PLUS_ONE_THRESHOLD or more times.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.statements = {}
+            self.routes = {}
+            self.n_plus_one = {}
+            self.slow_queries = deque(maxlen=100)
+            self.since = time.time()
+
+    def attach(self, sync_engine):
+        event.listen(sync_engine, "before_cursor_execute", self._before)
+        event.listen(sync_engine, "after_cursor_execute", self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._sql_stats_start = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_sql_stats_start", None)
+        if start is None:
+            return
+        elapsed_s = time.perf_counter() - start
+        normalized = normalize_sql(statement)
+        request = _current_request.get()
+        route = _route_of(request)
+
+        with self._lock:
+            timing = self.statements.get(normalized)
+            if timing is None:
+                timing = self.statements[normalized] = _Timing()
+            timing.add(elapsed_s)
+            route_timing = self.routes.get((route, normalized))
+            if route_timing is None:
+                route_timing = self.routes[(route, normalized)] = _Timing()
+            route_timing.add(elapsed_s)
+            # executemany batches (bulk inserts split into pages) are one logical statement, not N+1
+            if request is not None and not executemany:
+                repeats = request["statements"]
+                repeats[normalized] = repeats.get(normalized, 0) + 1
+
+        if elapsed_s * 1000 >= SLOW_QUERY_MS:
+            self.slow_queries.append({"at": time.time(), "route": route, "ms": elapsed_s * 1000, "statement": normalized})
+            logger.warning(f"Slow query ({elapsed_s * 1000:.0f} ms) on {route}: {normalized[:300]}")
+
+    def finish_request(self, request):
+        route = _route_of(request)
+        for normalized, repeats in request["statements"].items():
+            if repeats < N_PLUS_ONE_THRESHOLD:
+                continue
+            with self._lock:
+                entry = self.n_plus_one.setdefault((route, normalized), {"requests": 0, "max_repeats": 0})
+                entry["requests"] += 1
+                entry["max_repeats"] = max(entry["max_repeats"], repeats)
+            logger.warning(f"Possible N+1 on {route}: statement ran {repeats}x in one request: {normalized[:300]}")
+
+    def snapshot(self, sort: str = "total_ms", limit: int = 50) -> dict:
+        with self._lock:
+            statements = [dict(statement=k, **v.to_dict()) for k, v in self.statements.items()]
+            routes = [dict(route=r, statement=k, **v.to_dict()) for (r, k), v in self.routes.items()]
+            n_plus_one = [dict(route=r, statement=k, **v) for (r, k), v in self.n_plus_one.items()]
+            slow = list(self.slow_queries)
+        statements.sort(key=lambda s: s.get(sort, 0), reverse=True)
+        routes.sort(key=lambda s: s.get(sort, 0), reverse=True)
+        n_plus_one.sort(key=lambda s: s["requests"], reverse=True)
+        return {
+            "since": self.since,
+            "slow_query_ms": SLOW_QUERY_MS,
+            "n_plus_one_threshold": N_PLUS_ONE_THRESHOLD,
+            "statements": statements[:limit],
+            "routes": routes[:limit],
+            "n_plus_one": n_plus_one[:limit],
+            "slow_queries": slow[-limit:],
+        }
+
+class SqlStatsMiddleware:
+    """
+    Pure ASGI: gives each request a statement counter (for N+1 detection and route attribution).
+    """
+
+    def __init__(self, app, stats):
+        self.app = app
+        self.stats = stats
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        request = {"scope": scope, "statements": {}}
+        token = _current_request.set(request)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_request.reset(token)
+            self.stats.finish_request(request)
+
+sql_stats = SqlStats()
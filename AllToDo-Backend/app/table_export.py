@@ -0,0 +1,185 @@
+import io
+import csv
+import json
+import time
+import base64
+import datetime
+import logging
+import threading
+
+from sqlalchemy import MetaData, Table, LargeBinary, select
+
+from .database import engine
+from .crud import decrypt, user_info_fields
+from . import models
+
+logger = logging.getLogger("API_LOGGER")
+
+# Backs /dev/tables: reflected tables cached at startup, keyset pages on the primary key and
+# streamed exports (NDJSON / CSV) read through a server-side cursor in batches.
+
+# Encrypted columns (based on models.py)
+ENCRYPTED_COLUMNS = {
+    "name", "password", "phone_number", "age",
+    "address", "address_lat", "address_long",
+    "work_address", "work_lat", "work_long"
+}
+
+class TableCatalog:
+    """
+    Reflects every table once (load() at startup) instead of on each request.
+    An unknown name triggers one re-reflection at most every refresh_s, for tables created later.
+    """
+
+    def __init__(self, engine, refresh_s: float = 60):
+        self.engine = engine
+        self.refresh_s = refresh_s
+        self._tables = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def load(self):
+        metadata = MetaData()
+        metadata.reflect(bind=self.engine)
+        with self._lock:
+            self._tables = dict(metadata.tables)
+            self._loaded_at = time.monotonic()
+        logger.info(f"Reflected {len(self._tables)} tables for /dev/tables")
+
+    def names(self) -> list:
+        if not self._loaded_at:
+            self.load()
+        return sorted(self._tables)
+
+    def get(self, name: str):
+        table = self._tables.get(name)
+        if table is None and time.monotonic() - self._loaded_at >= self.refresh_s:
+            self.load()
+            table = self._tables.get(name)
+        return table
+
+def primary_key(table: Table):
+    """
+    The single primary key column used for keyset paging, or None.
+    """
+    columns = list(table.primary_key.columns)
+    return columns[0] if len(columns) == 1 else None
+
+def parse_after(column, value: str):
+    """
+    ?after= arrives as text; compare it as the key's own type (SQLite orders integers before text).
+    """
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    return python_type(value) if python_type in (int, float) else value
+
+def _decrypt_cell(value):
+    try:
+        return decrypt(value)
+    except Exception:
+        # Keep original if decryption fails (e.g. not encrypted or bad key)
+        return value
+
+def _binary_cell(value):
+    return base64.b64encode(bytes(value)).decode()
+
+def _column_decoders(table: Table) -> list:
+    """
+    (index, decoder) for the columns that need one, worked out once per batch instead of per cell.
+    """
+    decoders = []
+    for index, column in enumerate(table.columns):
+        if column.name in ENCRYPTED_COLUMNS:
+            decoders.append((index, _decrypt_cell))
+        elif isinstance(column.type, LargeBinary):
+            decoders.append((index, _binary_cell))
+    return decoders
+
+def decrypt_rows(table: Table, rows) -> list:
+    """
+    Rows -> plain dicts with encrypted columns decrypted and binary columns base64-encoded.
+    """
+    if table.name == models.UserInfo.__tablename__:
+        decoded = []
+        for row in rows:
+            row_dict = dict(row._mapping)
+            # Both storage formats (per-column tokens / sealed blob)
+            row_dict.update(user_info_fields(row))
+            row_dict.pop("sealed", None)
+            decoded.append(row_dict)
+        return decoded
+
+    keys = [column.name for column in table.columns]
+    decoders = _column_decoders(table)
+    if not decoders:
+        return [dict(zip(keys, row)) for row in rows]
+    decoded = []
+    for row in rows:
+        values = list(row)
+        for index, decoder in decoders:
+            if values[index] is not None:
+                values[index] = decoder(values[index])
+        decoded.append(dict(zip(keys, values)))
+    return decoded
+
+def _keyset_query(table: Table, after=None, limit: int = None):
+    query = select(table)
+    key = primary_key(table)
+    if key is not None:
+        if after is not None:
+            query = query.where(key > parse_after(key, after))
+        query = query.order_by(key)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+def read_page(engine, table: Table, after=None, limit: int = 100):
+    """
+    (rows, next_after): next_after is the last row's key when the page is full, else None.
+    """
+    with engine.connect() as conn:
+        rows = conn.execute(_keyset_query(table, after, limit)).fetchall()
+    key = primary_key(table)
+    next_after = None
+    if key is not None and len(rows) == limit:
+        next_after = rows[-1]._mapping[key.name]
+    return decrypt_rows(table, rows), next_after
+
+def export_batches(engine, table: Table, after=None, batch_size: int = 1000):
+    """
+    Decrypted row batches from a server-side cursor (stream_results: a named cursor on PostgreSQL),
+    so memory stays at one batch whatever the table size. Sync generator: StreamingResponse
+    iterates it in the threadpool, keeping the reads and decryption off the event loop.
+    """
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(
+            _keyset_query(table, after)
+        )
+        for rows in result.partitions(batch_size):
+            yield decrypt_rows(table, rows)
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+def ndjson_lines(batches):
+    encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=_json_default).encode
+    for rows in batches:
+        yield "\n".join(map(encode, rows)) + "\n" if rows else ""
+
+def csv_lines(table: Table, batches):
+    columns = [c.name for c in table.columns if not (table.name == models.UserInfo.__tablename__ and c.name == "sealed")]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    yield buffer.getvalue()
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+table_catalog = TableCatalog(engine)
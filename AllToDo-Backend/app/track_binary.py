@@ -0,0 +1,110 @@
+import json
+import struct
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from . import schemas
+
+class TrackBinaryFormat:
+    """
+    application/octet-stream variant of the track upload (POST /tracks/binary).
+
+    Layout (little endian):
+        4s      magic b"ATK1"
+        u32     header_len
+        bytes   header JSON (TrackHeader fields, no points)
+        u32     raw_n
+        u32     compressed_n
+        int32[raw_n][6]         seq, time_offset, lat_i, lng_i, speed_cms, heading_deg
+        int32[compressed_n][5]  seq, time_offset, lat_i, lng_i, is_corner
+
+    speed_cms / heading_deg use NULL_VALUE (INT32_MIN) for None.
+    Compressed points carry no note in this format.
+    Points are read with np.frombuffer over the request body (no copy of the body, no per-point
+    Pydantic model), then converted to Python ints column by column with tolist(): the DB drivers
+    do not accept NumPy scalars and executemany takes one dict per row, so crud.save_track still
+    builds a dict per point. The saving over POST /tracks is the validation, not the row dicts.
+    """
+    MAGIC = b"ATK1"
+    NULL_VALUE = -2**31
+    RAW_FIELDS = ("seq", "time_offset", "lat_i", "lng_i", "speed_cms", "heading_deg")
+    COMPRESSED_FIELDS = ("seq", "time_offset", "lat_i", "lng_i", "is_corner")
+    POINT_DTYPE = np.dtype("<i4")
+
+    _PREFIX = struct.Struct("<4sI")
+    _COUNTS = struct.Struct("<II")
+
+    @classmethod
+    def parse(cls, body: bytes) -> Tuple[schemas.TrackHeader, dict, list]:
+        """
+        Returns (header, raw columns as lists of Python ints, compressed row dicts)
+        in the shape crud.save_track expects. Raises ValueError on malformed payloads.
+        """
+        view = memoryview(body)
+        if len(view) < cls._PREFIX.size:
+            raise ValueError("Payload too short")
+
+        magic, header_len = cls._PREFIX.unpack_from(view, 0)
+        if magic != cls.MAGIC:
+            raise ValueError("Bad magic")
+
+        offset = cls._PREFIX.size
+        header_end = offset + header_len
+        if len(view) < header_end + cls._COUNTS.size:
+            raise ValueError("Truncated header")
+        header = schemas.TrackHeader.model_validate_json(bytes(view[offset:header_end]))
+
+        raw_n, compressed_n = cls._COUNTS.unpack_from(view, header_end)
+        offset = header_end + cls._COUNTS.size
+
+        raw_size = raw_n * len(cls.RAW_FIELDS) * cls.POINT_DTYPE.itemsize
+        compressed_size = compressed_n * len(cls.COMPRESSED_FIELDS) * cls.POINT_DTYPE.itemsize
+        if len(view) != offset + raw_size + compressed_size:
+            raise ValueError("Point payload size mismatch")
+
+        raw_block = np.frombuffer(view, dtype=cls.POINT_DTYPE, count=raw_n * len(cls.RAW_FIELDS), offset=offset)
+        raw_block = raw_block.reshape(raw_n, len(cls.RAW_FIELDS))
+        offset += raw_size
+
+        raw = {}
+        for i, name in enumerate(cls.RAW_FIELDS):
+            values = raw_block[:, i].tolist()
+            if name in ("speed_cms", "heading_deg"):
+                values = [None if v == cls.NULL_VALUE else v for v in values]
+            raw[name] = values
+
+        compressed_block = np.frombuffer(
+            view, dtype=cls.POINT_DTYPE, count=compressed_n * len(cls.COMPRESSED_FIELDS), offset=offset
+        ).reshape(compressed_n, len(cls.COMPRESSED_FIELDS))
+        compressed_rows = [
+            {"seq": seq, "time_offset": t, "lat_i": lat, "lng_i": lng, "is_corner": bool(corner), "note": None}
+            for seq, t, lat, lng, corner in compressed_block.tolist()
+        ]
+
+        return header, raw, compressed_rows
+
+    @classmethod
+    def build(cls, header: dict, raw_points: List[dict], compressed_points: Optional[List[dict]] = None) -> bytes:
+        """
+        Encodes a track in this format (reference encoder for clients and bench_track_upload.py).
+        """
+        compressed_points = compressed_points or []
+        header_bytes = json.dumps(header, default=str).encode("utf-8")
+
+        def value(p, name):
+            v = p.get(name)
+            if v is None:
+                return cls.NULL_VALUE if name in ("speed_cms", "heading_deg") else 0
+            return int(v)
+
+        raw = np.array([[value(p, f) for f in cls.RAW_FIELDS] for p in raw_points], dtype=cls.POINT_DTYPE)
+        compressed = np.array([[value(p, f) for f in cls.COMPRESSED_FIELDS] for p in compressed_points], dtype=cls.POINT_DTYPE)
+
+        return b"".join([
+            cls._PREFIX.pack(cls.MAGIC, len(header_bytes)),
+            header_bytes,
+            cls._COUNTS.pack(len(raw_points), len(compressed_points)),
+            raw.tobytes(),
+            compressed.tobytes(),
+        ])
@@ -0,0 +1,229 @@
+import os
+import threading
+import time
+import logging
+from datetime import datetime, timezone
+
+from sqlalchemy.exc import IntegrityError, DataError
+
+from .database import SessionLocal
+from . import models, crud
+
+logger = logging.getLogger("API_LOGGER")
+
+class UsageLogBuffer:
+    """
+    Write-behind buffer for /log-usage.
+
+    Requests only append a row in memory. A background thread writes the pending rows
+    as one multi-row INSERT + COMMIT every flush_interval_ms or as soon as flush_rows are waiting.
+    Memory is bounded by max_pending: when full, add() waits up to put_timeout_s
+    for the writer to catch up and then reports failure so the endpoint can answer 503.
+    stop() drains everything that is still pending.
+
+    Rows for a user_uuid that is not in users (stale client, deleted user) are dropped before the insert
+    and counted as unknown_user, so they never fail the foreign key for the whole batch.
+    A batch that is still rejected for its data (IntegrityError / DataError) is retried row by row.
+    Any other failure (database down, pool timeout) puts the batch back in front of the queue
+    and the writer backs off (retry_initial_s doubling up to retry_max_s).
+    Rows being written count toward max_pending, so a re-queued batch never grows the buffer past it.
+    """
+
+    def __init__(self, session_factory=SessionLocal, flush_interval_ms: int = 200, flush_rows: int = 500,
+                 max_pending: int = 10000, put_timeout_s: float = 1.0,
+                 retry_initial_s: float = 0.5, retry_max_s: float = 30.0):
+        self.session_factory = session_factory
+        self.flush_interval_s = flush_interval_ms / 1000
+        self.flush_rows = flush_rows
+        self.max_pending = max_pending
+        self.put_timeout_s = put_timeout_s
+        self.retry_initial_s = retry_initial_s
+        self.retry_max_s = retry_max_s
+
+        self._rows = []
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+        self.accepted = 0
+        self.rejected = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.failed = 0
+        self.unknown_user = 0
+        self.retries = 0
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="usage-log-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        with self._cond:
+            thread = self._thread
+            self._stopping = True
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+        with self._cond:
+            self._thread = None
+
+    def add(self, user_uuid: str, latitude: float, longitude: float, block: bool = True) -> bool:
+        """
+        Queues one row. Returns False if the buffer is full
+        (immediately with block=False, otherwise after put_timeout_s).
+        """
+        row = {
+            "user_uuid": user_uuid,
+            "latitude": latitude,
+            "longitude": longitude,
+            # Request time, not flush time
+            "timestamp": datetime.now(timezone.utc),
+        }
+        if self._thread is None:
+            self.start()
+
+        with self._cond:
+            if self._queued() >= self.max_pending:
+                if not block:
+                    return False
+                # Backpressure: give the writer a chance to drain before refusing
+                self._cond.wait_for(lambda: self._queued() < self.max_pending, timeout=self.put_timeout_s)
+                if self._queued() >= self.max_pending:
+                    self.rejected += 1
+                    return False
+            self._rows.append(row)
+            self.accepted += 1
+            if len(self._rows) >= self.flush_rows:
+                self._cond.notify_all()
+        return True
+
+    def _queued(self) -> int:
+        # Caller holds self._cond
+        return len(self._rows) + self._in_flight
+
+    def pending(self) -> int:
+        with self._cond:
+            return self._queued()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "pending": self._queued(),
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+                "flushed": self.flushed,
+                "flushes": self.flushes,
+                "failed": self.failed,
+                "unknown_user": self.unknown_user,
+                "retries": self.retries,
+            }
+
+    def _run(self):
+        backoff = 0.0
+        while True:
+            with self._cond:
+                if backoff:
+                    # Only stop() cuts the back-off short; a full buffer must not hammer a dead database
+                    self._cond.wait_for(lambda: self._stopping, timeout=backoff)
+                else:
+                    self._cond.wait_for(
+                        lambda: self._stopping or len(self._rows) >= self.flush_rows,
+                        timeout=self.flush_interval_s
+                    )
+                batch = self._rows
+                self._rows = []
+                self._in_flight = len(batch)
+                stopping = self._stopping
+
+            retry = self._flush(batch) if batch else []
+            with self._cond:
+                self._in_flight = 0
+                # Wake producers blocked on a full buffer
+                self._cond.notify_all()
+            if retry:
+                with self._cond:
+                    if stopping:
+                        dropped = len(retry) + len(self._rows)
+                        self._rows = []
+                        self.failed += dropped
+                        logger.error(f"Dropping {dropped} usage log rows at shutdown, database unavailable")
+                        return
+                    self._rows = retry + self._rows
+                    self.retries += 1
+                backoff = min(max(backoff * 2, self.retry_initial_s), self.retry_max_s)
+                continue
+            backoff = 0.0
+            if stopping:
+                with self._cond:
+                    if not self._rows:
+                        return
+
+    def _flush(self, batch: list) -> list:
+        """
+        Writes the batch. Returns the rows to retry later ([] when done).
+        """
+        start = time.perf_counter()
+        db = None
+        try:
+            db = self.session_factory()
+            batch = self._known_users(db, batch)
+            crud.bulk_insert(db, models.UsageLog.__table__, batch)
+            db.commit()
+            self.flushed += len(batch)
+            self.flushes += 1
+            return []
+        except (IntegrityError, DataError) as e:
+            db.rollback()
+            logger.error(f"Usage log batch rejected, retrying row by row: {e}")
+            # Unexpected bad data; one bad row must not drop the whole batch
+            return self._flush_rows(db, batch)
+        except Exception as e:
+            logger.error(f"Usage log flush failed, keeping {len(batch)} rows for retry: {e}")
+            return batch
+        finally:
+            if db is not None:
+                try:
+                    # Also rolls back; may fail itself when the connection is gone
+                    db.close()
+                except Exception:
+                    pass
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if elapsed_ms > 1000:
+                logger.warning(f"Slow usage log flush: {len(batch)} rows in {elapsed_ms:.0f} ms")
+
+    def _known_users(self, db, batch: list) -> list:
+        known = crud.known_user_uuids(db, (row["user_uuid"] for row in batch))
+        rows = [row for row in batch if row["user_uuid"] in known]
+        dropped = len(batch) - len(rows)
+        if dropped:
+            self.unknown_user += dropped
+            unknown = sorted({row["user_uuid"] for row in batch} - known)
+            logger.warning(f"Dropping {dropped} usage log rows for unknown users: {unknown[:10]}")
+        return rows
+
+    def _flush_rows(self, db, batch: list) -> list:
+        for index, row in enumerate(batch):
+            try:
+                crud.bulk_insert(db, models.UsageLog.__table__, [row])
+                db.commit()
+                self.flushed += 1
+            except (IntegrityError, DataError):
+                db.rollback()
+                self.failed += 1
+            except Exception as e:
+                logger.error(f"Usage log flush failed, keeping {len(batch) - index} rows for retry: {e}")
+                return batch[index:]
+        self.flushes += 1
+        return []
+
+usage_log_buffer = UsageLogBuffer(
+    flush_interval_ms=int(os.getenv("USAGE_LOG_FLUSH_MS", "200")),
+    flush_rows=int(os.getenv("USAGE_LOG_FLUSH_ROWS", "500")),
+    max_pending=int(os.getenv("USAGE_LOG_MAX_PENDING", "10000")),
+    put_timeout_s=float(os.getenv("USAGE_LOG_PUT_TIMEOUT_S", "1.0")),
+)
@@ -0,0 +1,90 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from . import schemas
+
+class UserInfoCache:
+    """
+    Bounded LRU + TTL cache of decrypted UserInfoResponse objects, keyed by user uuid.
+
+    Process memory only (never pickled or written to disk); responses carry no password.
+    The cache is per process: /update-info calls invalidate() after its commit, which clears
+    the entry in the worker that handled the update only. Other workers keep serving their copy
+    until it expires, so ttl_s (USER_INFO_CACHE_TTL_S) is the bound on cross-worker staleness.
+    Within one process, a fill that started before an invalidation is dropped (generation check),
+    so a slow reader cannot put back the old value.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_s: float = 5.0):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, uuid: str):
+        """
+        Returns (response or None, generation). Pass the generation back to put() on a miss.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(uuid)
+            if entry is not None:
+                expires_at, response = entry
+                if expires_at > now:
+                    self._entries.move_to_end(uuid)
+                    self.hits += 1
+                    return response, self._generation
+                del self._entries[uuid]
+            self.misses += 1
+            return None, self._generation
+
+    def put(self, uuid: str, response: schemas.UserInfoResponse, generation: int):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[uuid] = (time.monotonic() + self.ttl_s, response)
+            self._entries.move_to_end(uuid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, uuid: str):
+        with self._lock:
+            self._entries.pop(uuid, None)
+            self._generation += 1
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_s": self.ttl_s,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+user_info_cache = UserInfoCache(
+    max_entries=int(os.getenv("USER_INFO_CACHE_SIZE", "10000")),
+    ttl_s=float(os.getenv("USER_INFO_CACHE_TTL_S", "5")),
+)
@@ -0,0 +1,79 @@
+import json
+import base64
+import os
+from typing import Optional
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives import hashes
+from cryptography.exceptions import InvalidTag
+
+class UserInfoEnvelope:
+    """
+    One AEAD blob per user_info row (USER_INFO_STORAGE_MODE=sealed, column user_info.sealed).
+
+    Layout:
+        u8          VERSION
+        12 bytes    nonce (random per write)
+        bytes       AES-256-GCM(JSON array of FIELDS values, positional, trailing nulls dropped) + 16 byte tag
+
+    user_uuid is the associated data, so a blob copied onto another row does not open.
+    AES keys are derived from the Fernet keyring with HKDF (the Fernet keys themselves are not reused).
+    Like MultiFernet, seal() uses the first key and open() tries every key in order.
+    Values are stored as strings, exactly like the legacy per-column Fernet tokens.
+    """
+    VERSION = 1
+    NONCE_SIZE = 12
+    FIELDS = (
+        "name", "password", "phone_number", "age",
+        "address", "address_lat", "address_long",
+        "work_address", "work_lat", "work_long"
+    )
+
+    def __init__(self, fernet_keys: list):
+        self._aeads = [AESGCM(self._derive(key)) for key in fernet_keys]
+
+    @staticmethod
+    def _derive(fernet_key) -> bytes:
+        secret = base64.urlsafe_b64decode(fernet_key)
+        return HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b"alltodo-user-info-v1").derive(secret)
+
+    def seal(self, user_uuid: str, fields: dict) -> Optional[bytes]:
+        values = [fields.get(name) for name in self.FIELDS]
+        while values and values[-1] is None:
+            values.pop()
+        if not values:
+            return None
+        plaintext = json.dumps(values, separators=(",", ":"), ensure_ascii=False).encode()
+        nonce = os.urandom(self.NONCE_SIZE)
+        return bytes([self.VERSION]) + nonce + self._aeads[0].encrypt(nonce, plaintext, user_uuid.encode())
+
+    def open(self, user_uuid: str, blob: bytes) -> dict:
+        """
+        Returns {field: str or None}. Raises ValueError on an unknown version, an unknown key or a tampered blob.
+        """
+        return self._open(user_uuid, blob)[0]
+
+    def rotate(self, user_uuid: str, blob: bytes) -> Optional[bytes]:
+        """
+        Re-seals a blob under the first key. Returns None if it already uses it.
+        """
+        fields, key_index = self._open(user_uuid, blob)
+        if key_index == 0:
+            return None
+        return self.seal(user_uuid, fields)
+
+    def _open(self, user_uuid: str, blob: bytes):
+        if not blob or blob[0] != self.VERSION:
+            raise ValueError("Unknown envelope version")
+        nonce = blob[1:1 + self.NONCE_SIZE]
+        for key_index, aead in enumerate(self._aeads):
+            try:
+                plaintext = aead.decrypt(nonce, blob[1 + self.NONCE_SIZE:], user_uuid.encode())
+                break
+            except InvalidTag:
+                continue
+        else:
+            raise ValueError("Envelope authentication failed")
+        values = json.loads(plaintext)
+        return {name: values[i] if i < len(values) else None for i, name in enumerate(self.FIELDS)}, key_index
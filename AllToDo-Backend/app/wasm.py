@@ -1,10 +1,23 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Request
+from fastapi.responses import Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from pathlib import Path
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives import hashes
 import base64, os, shutil
+import hashlib
+import hmac
+import json
+import gzip
+import zlib
+import time
+import threading
 import logging
 
+from .metrics import WASM_DOWNLOADS, WASM_DOWNLOAD_BYTES, WASM_UPLOAD_BYTES
+
 router = APIRouter(prefix="/wasm", tags=["wasm"])
 logger = logging.getLogger("API_LOGGER")
 
@@ -33,6 +46,12 @@ if ENV_KEY:
 else:
     AES_KEY = b"0123456789abcdef0123456789abcdef" # Fallback
 
+# Built once; AESGCM objects are safe to share between threads
+AES_CIPHER = AESGCM(AES_KEY)
+# Separate subkey for content_iv, so the encryption key is not also used as an HMAC key
+IV_KEY = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b"alltodo-wasm-iv-v1").derive(AES_KEY)
+# How often another worker's upload is picked up (stat of the files, no read)
+WASM_CACHE_CHECK_S = float(os.getenv("WASM_CACHE_CHECK_S", "5"))
 
 class WasmResponse(BaseModel):
     version: str
@@ -51,10 +70,197 @@ def get_current_version():
 def set_current_version(v: str):
     VERSION_FILE.write_text(v)
 
+def _files_signature():
+    signature = []
+    for path in (ACTIVE_WASM_FILE, VERSION_FILE):
+        try:
+            stat = path.stat()
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+def content_iv(wasm_bytes: bytes) -> bytes:
+    """
+    IV derived from the content (HMAC under IV_KEY): a version always encrypts to the same bytes, so its
+    response can be cached and carry a strong ETag. An IV is only ever reused for identical plaintext,
+    which reveals nothing beyond "same module".
+    """
+    return hmac.new(IV_KEY, b"wasm-iv" + hashlib.sha256(wasm_bytes).digest(), hashlib.sha256).digest()[:12]
+
+def seal_binary(payload: bytes) -> bytes:
+    """
+    Binary transport layout: 12-byte IV || ciphertext || 16-byte GCM tag.
+    """
+    iv = content_iv(payload)
+    return iv + AES_CIPHER.encrypt(iv, payload, None)
+
+class WasmArtifact:
+    """
+    One activated version, encrypted and encoded once, in every transport variant:
+    - "json": the original WasmResponse (base64 fields), also precompressed as "json.gzip" / "json.deflate"
+      (HTTP Content-Encoding, undone transparently by the HTTP client)
+    - "binary": seal_binary(module)
+    - "binary.gzip": seal_binary(gzip(module)) - compressed before encryption, since ciphertext does not
+      compress; the client gunzips after decrypting (X-Wasm-Payload-Encoding: gzip)
+    Each variant has its own strong ETag.
+    """
+
+    def __init__(self, version: str, wasm_bytes: bytes):
+        self.version = version
+        self.size = len(wasm_bytes)
+        self.sha256 = hashlib.sha256(wasm_bytes).hexdigest()
+        # The version is free text from /wasm/upload (may contain '"' or ','): only its hash goes in the ETag
+        version_hash = hashlib.sha256(version.encode()).hexdigest()[:8]
+        self.etag = f'"{version_hash}-{self.sha256[:32]}"'
+
+        iv = content_iv(wasm_bytes)
+        encrypted = AES_CIPHER.encrypt(iv, wasm_bytes, None)
+        self.json_body = json.dumps({
+            "version": version,
+            "ciphertext_b64": base64.b64encode(encrypted[:-16]).decode(),
+            "iv_b64": base64.b64encode(iv).decode(),
+            "tag_b64": base64.b64encode(encrypted[-16:]).decode(),
+        }).encode()
+
+        self.variants = {
+            "json": self.json_body,
+            "json.gzip": gzip.compress(self.json_body, 9, mtime=0),
+            "json.deflate": zlib.compress(self.json_body, 9),
+            "binary": iv + encrypted,
+            "binary.gzip": seal_binary(gzip.compress(wasm_bytes, 9, mtime=0)),
+        }
+
+    def variant_etag(self, variant: str) -> str:
+        return self.etag if variant == "json" else f'{self.etag[:-1]}-{variant}"'
+
+class WasmCache:
+    """
+    Active WASM artifact held in memory. /wasm/upload invalidates it in this process; other workers
+    notice the new files by their mtime / size within check_interval_s.
+    """
+
+    def __init__(self, check_interval_s: float = WASM_CACHE_CHECK_S):
+        self.check_interval_s = check_interval_s
+        self._artifact = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+
+    def current(self):
+        """
+        The cached artifact, or None when it has to be (re)checked with load(). No I/O.
+        """
+        artifact = self._artifact
+        if artifact is None or time.monotonic() - self._checked_at >= self.check_interval_s:
+            return None
+        self.hits += 1
+        return artifact
+
+    def load(self):
+        """
+        Re-reads and re-encrypts only if the files changed; None if there is no active WASM.
+        """
+        with self._lock:
+            signature = _files_signature()
+            if self._artifact is None or signature != self._signature:
+                self._artifact = None
+                if ACTIVE_WASM_FILE.exists():
+                    self._artifact = WasmArtifact(get_current_version(), ACTIVE_WASM_FILE.read_bytes())
+                    self.loads += 1
+                    logger.info(f"WASM cache loaded version {self._artifact.version} ({self._artifact.size} bytes)")
+                self._signature = signature
+            self._checked_at = time.monotonic()
+            return self._artifact
+
+    def invalidate(self):
+        with self._lock:
+            self._artifact = None
+            self._signature = None
+            self._checked_at = 0.0
+
+    def stats(self) -> dict:
+        artifact = self._artifact
+        return {
+            "hits": self.hits,
+            "loads": self.loads,
+            "version": artifact.version if artifact else None,
+            "size": artifact.size if artifact else 0,
+        }
+
+wasm_cache = WasmCache()
+
+async def current_artifact():
+    artifact = wasm_cache.current()
+    if artifact is None:
+        artifact = await run_in_threadpool(wasm_cache.load)
+    return artifact
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """
+    Content codings with q > 0 from an Accept-Encoding header.
+    """
+    accepted = set()
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+def parse_range(range_header: str, size: int):
+    """
+    (start, end) inclusive for a single "bytes=" range, "unsatisfiable", or None to ignore the header
+    (not bytes, malformed or multiple ranges: the full body is sent).
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash:
+        return None
+    try:
+        if first == "":
+            length = int(last)
+            if length <= 0:
+                return "unsatisfiable"
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        return "unsatisfiable"
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    If-None-Match uses the weak comparison: W/ prefixes are ignored, "*" matches anything.
+    """
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
 @router.get("/version", response_model=VersionResponse)
-def check_version():
+async def check_version():
     """Returns the current active WASM version."""
-    return {"version": get_current_version()}
+    artifact = await current_artifact()
+    if artifact is None:
+        return {"version": await run_in_threadpool(get_current_version)}
+    return {"version": artifact.version}
 
 @router.post("/upload")
 def upload_wasm(version: str = Form(...), file: UploadFile = File(...)):
@@ -63,35 +269,77 @@ def upload_wasm(version: str = Form(...), file: UploadFile = File(...)):
         file_path = WASM_DIR / f"advanced_{version}.wasm"
         with file_path.open("wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
+        WASM_UPLOAD_BYTES.inc(amount=file_path.stat().st_size)
         
-        # Update active link (copy to active)
-        shutil.copy(file_path, ACTIVE_WASM_FILE)
+        # Update active link (copy to active). Copy + rename so a concurrent download never reads a partial file
+        tmp_path = WASM_DIR / f".{ACTIVE_WASM_FILE.name}.tmp"
+        shutil.copyfile(file_path, tmp_path)
+        os.replace(tmp_path, ACTIVE_WASM_FILE)
         set_current_version(version)
+        wasm_cache.invalidate()
         
         return {"status": "success", "version": version, "message": "WASM uploaded and activated"}
     except Exception as e:
         logger.error(f"Upload failed: {e}")
         raise HTTPException(500, f"Upload failed: {str(e)}")
 
-@router.get("/advanced", response_model=WasmResponse)
-def get_wasm():
-    if not ACTIVE_WASM_FILE.exists():
+@router.get("/advanced", response_model=WasmResponse, responses={200: {"content": {"application/octet-stream": {}}}})
+async def get_wasm(request: Request, format: str | None = None, payload: str | None = None):
+    """
+    Encrypted active WASM, served from memory with a strong ETag per variant
+    (If-None-Match -> 304 without any disk or crypto work).
+
+    - JSON (default): WasmResponse. Sent gzip/deflate-compressed when Accept-Encoding allows.
+    - Binary (`Accept: application/octet-stream` or `?format=binary`): 12-byte IV || ciphertext || 16-byte tag,
+      no base64. `?payload=gzip` encrypts the gzip-compressed module instead (X-Wasm-Payload-Encoding: gzip).
+    - `Range: bytes=<start>-` resumes an interrupted download (206); send If-Range with the ETag so a
+      new version restarts from the beginning instead of mixing bytes.
+    """
+    artifact = await current_artifact()
+    if artifact is None:
          raise HTTPException(500, "WASM file not found")
 
-    wasm_bytes = ACTIVE_WASM_FILE.read_bytes()
-    version = get_current_version()
-    
-    iv = os.urandom(12)
-    aes = AESGCM(AES_KEY)
-    
-    encrypted = aes.encrypt(iv, wasm_bytes, None)
-    
-    tag = encrypted[-16:]
-    ciphertext = encrypted[:-16]
-    
-    return WasmResponse(
-        version=version,
-        ciphertext_b64=base64.b64encode(ciphertext).decode(),
-        iv_b64=base64.b64encode(iv).decode(),
-        tag_b64=base64.b64encode(tag).decode(),
-    )
+    headers = {"Cache-Control": "no-cache", "Accept-Ranges": "bytes", "Vary": "Accept, Accept-Encoding",
+               "X-Wasm-Version": artifact.version}
+    binary = format == "binary" or (format is None and "application/octet-stream" in request.headers.get("accept", ""))
+    if binary:
+        media_type = "application/octet-stream"
+        variant = "binary"
+        if payload == "gzip":
+            variant = "binary.gzip"
+            headers["X-Wasm-Payload-Encoding"] = "gzip"
+    else:
+        media_type = "application/json"
+        variant = "json"
+        encodings = accepted_encodings(request.headers.get("accept-encoding", ""))
+        for coding in ("gzip", "deflate"):
+            if coding in encodings:
+                variant = f"json.{coding}"
+                headers["Content-Encoding"] = coding
+                break
+
+    body = artifact.variants[variant]
+    etag = artifact.variant_etag(variant)
+    headers["ETag"] = etag
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        WASM_DOWNLOADS.inc("not_modified")
+        headers.pop("Content-Encoding", None)
+        return Response(status_code=304, headers=headers)
+
+    status_code = 200
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == etag):
+        byte_range = parse_range(range_header, len(body))
+        if byte_range == "unsatisfiable":
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{len(body)}", "ETag": etag})
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+            body = body[start:end + 1]
+            status_code = 206
+
+    WASM_DOWNLOADS.inc(variant)
+    WASM_DOWNLOAD_BYTES.inc(variant, amount=len(body))
+    return Response(content=body, status_code=status_code, media_type=media_type, headers=headers)
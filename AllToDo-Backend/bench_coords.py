@@ -0,0 +1,63 @@
+import sys
+import os
+import time
+import random
+
+# Add the current directory to sys.path
+sys.path.append(os.getcwd())
+
+from app.coords import IntCoordinate, CoordBatch
+from simulate_efficiency import generate_synthetic_track
+
+def timed(fn, repeat=5):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def run_benchmark():
+    print("=== Scalar vs Batch Geodesy Benchmark ===\n")
+
+    random.seed(42)
+    duration = 86400 # 1 day at 1 Hz
+    points_double = generate_synthetic_track(duration)
+    lats = [p[0] for p in points_double]
+    lngs = [p[1] for p in points_double]
+    print(f"Points: {len(points_double):,} (1 day, 1 Hz)\n")
+
+    # 1. Conversion
+    t_scalar, points = timed(lambda: [IntCoordinate.from_double(lat, lng) for lat, lng in points_double])
+    t_batch, (lat_i, lng_i) = timed(lambda: CoordBatch.from_double(lats, lngs))
+    print(f"[1] from_double")
+    print(f"    - Scalar: {t_scalar * 1000:8.1f} ms")
+    print(f"    - Batch:  {t_batch * 1000:8.1f} ms  ({t_scalar / t_batch:.0f}x)")
+
+    # 2. Consecutive distances
+    def scalar_distances():
+        return [points[i].distance_to(points[i + 1]) for i in range(len(points) - 1)]
+
+    t_scalar, d_scalar = timed(scalar_distances)
+    t_batch, d_batch = timed(lambda: CoordBatch.distances(lat_i, lng_i))
+    t_fast, d_fast = timed(lambda: CoordBatch.distances(lat_i, lng_i, fast=True))
+    print(f"\n[2] distances (consecutive)")
+    print(f"    - Scalar:          {t_scalar * 1000:8.1f} ms")
+    print(f"    - Batch haversine: {t_batch * 1000:8.1f} ms  ({t_scalar / t_batch:.0f}x)")
+    print(f"    - Batch equirect:  {t_fast * 1000:8.1f} ms  ({t_scalar / t_fast:.0f}x)")
+    print(f"    - Max |batch - scalar|: {max(abs(a - b) for a, b in zip(d_batch, d_scalar)):.2e} m")
+    print(f"    - Max |equirect - haversine|: {abs(d_fast - d_batch).max():.2e} m")
+
+    # 3. Consecutive bearings
+    def scalar_bearings():
+        return [points[i].bearing_to(points[i + 1]) for i in range(len(points) - 1)]
+
+    t_scalar, _ = timed(scalar_bearings)
+    t_batch, _ = timed(lambda: CoordBatch.bearings(lat_i, lng_i))
+    print(f"\n[3] bearings (consecutive)")
+    print(f"    - Scalar: {t_scalar * 1000:8.1f} ms")
+    print(f"    - Batch:  {t_batch * 1000:8.1f} ms  ({t_scalar / t_batch:.0f}x)")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,99 @@
+import sys
+import os
+import time
+import asyncio
+import logging
+import tempfile
+
+# Add the current directory to sys.path
+sys.path.append(os.getcwd())
+
+# Per-request overhead of the request logging middleware:
+# none vs the old log_requests (BaseHTTPMiddleware, awaits the whole body, logs synchronously)
+# vs RequestLoggingMiddleware + QueueHandler/QueueListener.
+# Log output goes to a temp file in every case so the numbers compare the pipelines, not the terminal.
+
+import httpx
+from fastapi import FastAPI, Request
+
+from app.request_logging import QueueLogging, RequestLoggingMiddleware
+
+N = int(os.getenv("BENCH_REQUESTS", "2000"))
+logger = logging.getLogger("API_LOGGER")
+
+def build_app(mode: str):
+    bench_app = FastAPI()
+
+    @bench_app.post("/echo")
+    async def echo(request: Request):
+        await request.body()
+        return {"status": "ok"}
+
+    if mode == "old":
+        @bench_app.middleware("http")
+        async def log_requests(request: Request, call_next):
+            logger.info(f"➡️  {request.method} {request.url}")
+            body = await request.body()
+            if body:
+                logger.info(f"📝 Body: {body.decode('utf-8', errors='replace')}")
+            response = await call_next(request)
+            logger.info(f"⬅️  Status: {response.status_code}")
+            return response
+    elif mode == "new":
+        bench_app.add_middleware(RequestLoggingMiddleware)
+    return bench_app
+
+def configure_logging(mode: str, path: str):
+    root = logging.getLogger()
+    handler = logging.FileHandler(path)
+    if mode == "new":
+        pipeline = QueueLogging(handlers=[handler])
+        pipeline.install()
+        return pipeline
+    handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+    root.handlers = [handler]
+    root.setLevel(logging.INFO)
+    return None
+
+async def measure(app, body: bytes, content_type: str) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(50):
+            await client.post("/echo", content=body, headers={"content-type": content_type})
+        start = time.perf_counter()
+        for _ in range(N):
+            await client.post("/echo", content=body, headers={"content-type": content_type})
+        return (time.perf_counter() - start) / N * 1e6
+
+def run_benchmark():
+    print("=== Request Logging Middleware Overhead ===")
+    print(f"    - {N} requests per case, in-process ASGI client\n")
+    payloads = {
+        "JSON 200 B": (b'{"user_uuid":"bench","latitude":37.5,"longitude":127.0,"password":"pw"}' * 3, "application/json"),
+        "JSON 200 KB": (b'{"pad":"' + b"x" * 200_000 + b'"}', "application/json"),
+        "Binary 1 MB": (os.urandom(1_000_000), "application/octet-stream"),
+    }
+    log_dir = tempfile.mkdtemp()
+    results = {}
+    for mode in ("none", "old", "new"):
+        pipeline = configure_logging(mode, os.path.join(log_dir, f"{mode}.log"))
+        app = build_app(mode)
+        for label, (body, content_type) in payloads.items():
+            results[(mode, label)] = asyncio.run(measure(app, body, content_type))
+        if pipeline:
+            pipeline.stop()
+
+    for label in payloads:
+        base = results[("none", label)]
+        old = results[("old", label)]
+        new = results[("new", label)]
+        print(f"[{label}]")
+        print(f"    - No middleware: {base:8.1f} us/request")
+        print(f"    - Old:           {old:8.1f} us/request (+{old - base:.1f})")
+        print(f"    - New:           {new:8.1f} us/request (+{new - base:.1f})")
+    for mode in ("old", "new"):
+        size = os.path.getsize(os.path.join(log_dir, f"{mode}.log"))
+        print(f"    - Log volume ({mode}): {size / 1024 / 1024:.1f} MB")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,71 @@
+import sys
+import os
+import json
+import time
+import tempfile
+
+# Add the current directory to sys.path
+sys.path.append(os.getcwd())
+
+# Standalone run: throwaway SQLite DB, packed storage so the DB write stays small
+# and the numbers show request parsing cost.
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ.setdefault("TRACK_STORAGE_MODE", "packed")
+
+from fastapi.testclient import TestClient
+from app.main import app
+from app import schemas
+from app.track_binary import TrackBinaryFormat
+
+HEADER = {
+    "user_uuid": "bench-user",
+    "device_id": "bench",
+    "started_at": "2025-01-01T00:00:00+00:00",
+    "ended_at": "2025-01-01T01:00:00+00:00",
+    "start_lat_i": 3756650, "start_lng_i": 12697800,
+    "end_lat_i": 3756650, "end_lng_i": 12697800,
+    "duration_sec": 0, "distance_m": 0.0,
+    "raw_point_count": 0, "compressed_count": 0,
+}
+
+def make_points(n):
+    return [
+        {"seq": i, "time_offset": i, "lat_i": 3756650 + i, "lng_i": 12697800 + (i % 7),
+         "speed_cms": 140, "heading_deg": i % 360}
+        for i in range(n)
+    ]
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def run_benchmark():
+    print("=== Track Upload: JSON vs Binary ===\n")
+    client = TestClient(app)
+    client.post("/check-user", json={"uuid": HEADER["user_uuid"], "latitude": 37.5, "longitude": 127.0})
+
+    for n in (1_000, 10_000, 100_000):
+        points = make_points(n)
+        header = dict(HEADER, raw_point_count=n, duration_sec=n)
+        json_body = json.dumps(dict(header, raw_points=points, compressed_points=[])).encode()
+        binary_body = TrackBinaryFormat.build(header, points)
+
+        # Parsing only: Pydantic model per point vs frombuffer
+        t_json_parse = timed(lambda: schemas.TrackCreate.model_validate_json(json_body))
+        t_bin_parse = timed(lambda: TrackBinaryFormat.parse(binary_body))
+
+        # Full request through the app
+        t_json_req = timed(lambda: client.post("/tracks", content=json_body, headers={"content-type": "application/json"}))
+        t_bin_req = timed(lambda: client.post("/tracks/binary", content=binary_body, headers={"content-type": "application/octet-stream"}))
+
+        print(f"[{n:,} points]")
+        print(f"    - Body size:     JSON {len(json_body) / 1024:9.1f} KB | Binary {len(binary_body) / 1024:9.1f} KB")
+        print(f"    - Parse:         JSON {t_json_parse * 1000:9.1f} ms | Binary {t_bin_parse * 1000:9.1f} ms ({t_json_parse / t_bin_parse:.1f}x)")
+        print(f"    - Full request:  JSON {t_json_req * 1000:9.1f} ms | Binary {t_bin_req * 1000:9.1f} ms ({t_json_req / t_bin_req:.1f}x)")
+
+if __name__ == "__main__":
+    run_benchmark()
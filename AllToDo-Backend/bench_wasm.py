@@ -0,0 +1,94 @@
+import sys
+import os
+import time
+import gzip
+import json
+import base64
+import asyncio
+import tempfile
+
+# Add the current directory to sys.path
+sys.path.append(os.getcwd())
+
+# /wasm/advanced transports on the real wasm/advanced_v1.wasm: bytes on the wire, server time per
+# request (in-process ASGI client) and the client's decode + decrypt work for each variant.
+# The "per-request encrypt" case is the old handler body (read, new AESGCM, encrypt, base64, pydantic).
+#
+#   python bench_wasm.py
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ.setdefault("LOG_SAMPLE_DEFAULT", "0")
+
+import httpx
+
+from app.main import app
+from app import wasm
+
+N = int(os.getenv("BENCH_REQUESTS", "2000"))
+
+CASES = {
+    "JSON": ("/wasm/advanced", {"Accept-Encoding": "identity"}),
+    "JSON + gzip": ("/wasm/advanced", {"Accept-Encoding": "gzip"}),
+    "Binary": ("/wasm/advanced?format=binary", {"Accept-Encoding": "identity"}),
+    "Binary, gzip payload": ("/wasm/advanced?format=binary&payload=gzip", {"Accept-Encoding": "identity"}),
+    "304 Not Modified": ("/wasm/advanced?format=binary", {"Accept-Encoding": "identity"}),
+}
+
+def old_handler():
+    wasm_bytes = wasm.ACTIVE_WASM_FILE.read_bytes()
+    iv = os.urandom(12)
+    encrypted = wasm.AESGCM(wasm.AES_KEY).encrypt(iv, wasm_bytes, None)
+    return wasm.WasmResponse(
+        version=wasm.get_current_version(),
+        ciphertext_b64=base64.b64encode(encrypted[:-16]).decode(),
+        iv_b64=base64.b64encode(iv).decode(),
+        tag_b64=base64.b64encode(encrypted[-16:]).decode(),
+    ).model_dump_json()
+
+def client_decode(label: str, body: bytes) -> bytes:
+    if label.startswith("JSON"):
+        if label.endswith("gzip"):
+            body = gzip.decompress(body)
+        data = json.loads(body)
+        iv = base64.b64decode(data["iv_b64"])
+        sealed = base64.b64decode(data["ciphertext_b64"]) + base64.b64decode(data["tag_b64"])
+        return wasm.AES_CIPHER.decrypt(iv, sealed, None)
+    module = wasm.AES_CIPHER.decrypt(body[:12], body[12:], None)
+    return gzip.decompress(module) if "gzip payload" in label else module
+
+def per_call_us(fn, n=N) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e6
+
+async def wire_body(client, path, headers) -> bytes:
+    # Undecoded body, as it crosses the network (client.get() would gunzip inside the timing)
+    async with client.stream("GET", path, headers=headers) as response:
+        return b"".join([chunk async for chunk in response.aiter_raw()])
+
+async def server_us(client, path, headers) -> float:
+    start = time.perf_counter()
+    for _ in range(N):
+        await wire_body(client, path, headers)
+    return (time.perf_counter() - start) / N * 1e6
+
+async def run_benchmark():
+    module = wasm.ACTIVE_WASM_FILE.read_bytes()
+    print(f"[/wasm/advanced] {wasm.ACTIVE_WASM_FILE.name}: {len(module):,} bytes, {N} requests per case\n")
+    print(f"    - Old per-request encrypt (handler only): {per_call_us(old_handler):7.1f} us")
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for label, (path, headers) in CASES.items():
+            if label.startswith("304"):
+                etag = (await client.get(path, headers=headers)).headers["etag"]
+                headers = dict(headers, **{"If-None-Match": etag})
+            served_us = await server_us(client, path, headers)
+            body = await wire_body(client, path, headers)
+            line = f"    - {label:22s} {len(body):7,} bytes   server {served_us:6.1f} us"
+            if not label.startswith("304"):
+                assert client_decode(label, body) == module
+                line += f"   client decode {per_call_us(lambda: client_decode(label, body), 500):6.1f} us"
+            print(line)
+
+if __name__ == "__main__":
+    asyncio.run(run_benchmark())
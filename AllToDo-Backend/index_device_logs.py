@@ -0,0 +1,65 @@
+import sys
+import os
+import time
+import argparse
+
+# Add the current directory to sys.path
+sys.path.append(os.getcwd())
+
+from app.device_logs import device_log_sink
+from app.log_segments import iter_entries, LINE_PATTERN
+
+# Backfills the structured device log index (logs/index.db, /dev/logs/query) from the log files and
+# rotated segments written before the index existed. Run once with the API stopped (or before
+# enabling the index): logs already in the index would be counted twice.
+#
+#   python index_device_logs.py --batch-size 5000
+
+def device_lines(device_id: str):
+    segments = device_log_sink.segments
+    for entry in segments.index(device_id):
+        for block in entry["blocks"]:
+            yield from segments._read_block(device_id, entry, block)
+    path = device_log_sink.log_path(device_id)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8", errors="replace", newline="\n") as f:
+            yield from f
+
+def run_backfill(batch_size: int):
+    index = device_log_sink.index
+    if index is None:
+        print("Log index is disabled (DEVICE_LOG_INDEX_PATH is empty)")
+        return
+    log_dir = device_log_sink.log_dir
+    devices = {f[:-4] for f in os.listdir(log_dir) if f.endswith(".log")} if os.path.isdir(log_dir) else set()
+    devices |= set(device_log_sink.segments.devices())
+
+    total = 0
+    start = time.perf_counter()
+    for device_id in sorted(devices):
+        batch = []
+        for timestamp, level, text in iter_entries(device_lines(device_id)):
+            if timestamp is None:
+                continue
+            message = text[LINE_PATTERN.match(text).end():].rstrip("\n")
+            batch.append((device_id, level, timestamp, message))
+            if len(batch) >= batch_size:
+                index.add(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            index.add(batch)
+            total += len(batch)
+        print(f"    - {device_id}: {total:,} records indexed so far")
+    index.close()
+    stats = index.stats()
+    print(
+        f"Done: {total:,} records from {len(devices)} devices in {time.perf_counter() - start:.1f}s "
+        f"(failed: {stats['index_failed']:,}, pruned as older than the retention: {stats['index_pruned']:,})"
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill the device log index from existing log files")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    run_backfill(args.batch_size)
@@ -0,0 +1,49 @@
+import sys
+import os
+import time
+import argparse
+
+# Add the current directory to sys.path
+sys.path.append(os.getcwd())
+
+from app.database import SessionLocal
+from app import crud
+
+# Online migration of user_info rows from per-column Fernet tokens to the sealed format.
+# Safe to run while the API is serving traffic and safe to re-run: already sealed rows are skipped,
+# rows updated during the run are left as they are and picked up by the next run.
+#
+#   python migrate_user_info.py --batch-size 500 --sleep-ms 50
+#
+# Set USER_INFO_STORAGE_MODE=sealed on the API first, otherwise new writes keep using columns.
+
+def run_migration(batch_size: int, sleep_ms: int):
+    after_id = 0
+    total = 0
+    stats = {"unreadable": 0}
+    start = time.perf_counter()
+    while True:
+        db = SessionLocal()
+        try:
+            last_id, sealed = crud.migrate_user_info_batch(db, after_id=after_id, batch_size=batch_size, stats=stats)
+        finally:
+            db.close()
+        if last_id is None:
+            break
+        after_id = last_id
+        total += sealed
+        elapsed = time.perf_counter() - start
+        print(f"    - up to id {after_id}: {total:,} rows sealed ({total / elapsed:,.0f} rows/s)")
+        # Keep the primary responsive for the API
+        time.sleep(sleep_ms / 1000)
+    print(f"Done: {total:,} rows sealed in {time.perf_counter() - start:.1f}s")
+    if stats["unreadable"]:
+        # Left as they are; fix ENCRYPTION_KEY / ENCRYPTION_OLD_KEYS and re-run
+        print(f"Skipped {stats['unreadable']:,} rows with values no key decrypts (ids in the API log)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seal legacy user_info rows")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--sleep-ms", type=int, default=50)
+    args = parser.parse_args()
+    run_migration(args.batch_size, args.sleep_ms)
@@ -56,3 +56,16 @@ CREATE TABLE track_points_compressed (
 
 CREATE INDEX ix_track_points_compressed_track_id ON track_points_compressed (track_id);
 CREATE INDEX ix_track_points_compressed_id ON track_points_compressed (id);
+
+-- Packed storage mode (TRACK_STORAGE_MODE=packed):
+-- raw points of a track stored as one delta/zigzag varint blob (app/coords.py PointCodec)
+ALTER TABLE tracks ADD COLUMN raw_points_blob BYTEA;
+
+-- Batch location upload (/log-usage/batch): idempotency key per user and device
+ALTER TABLE usage_logs ADD COLUMN device_id VARCHAR;
+ALTER TABLE usage_logs ADD COLUMN client_seq INTEGER;
+ALTER TABLE usage_logs ADD CONSTRAINT uq_usage_logs_user_device_seq UNIQUE (user_uuid, device_id, client_seq);
+
+-- Sealed user info (USER_INFO_STORAGE_MODE=sealed): all encrypted fields in one AEAD blob.
+-- Existing rows are converted online with migrate_user_info.py
+ALTER TABLE user_info ADD COLUMN sealed BYTEA;
@@ -0,0 +1,43 @@
+import sys
+import os
+import argparse
+
+# Add the current directory to sys.path
+sys.path.append(os.getcwd())
+
+from app.key_rotation import ReencryptionJob
+
+# Re-encrypts user_info after an encryption key rotation:
+#
+#   1. Deploy with the new key first and the old one retired:
+#        ENCRYPTION_KEY=<new>  ENCRYPTION_OLD_KEYS=<old>
+#   2. Run this job (same env). Resumable: stop it any time and run it again.
+#        python rotate_keys.py --batch-size 500 --workers 4 --max-rows-per-sec 2000
+#   3. When it reports failed=0 / conflicts=0, remove ENCRYPTION_OLD_KEYS.
+
+def print_progress(p):
+    print(f"    - id <= {p['last_id']}: {p['scanned']:,}/{p['total']:,} ({p['percent']:.1f}%) | "
+          f"rotated {p['rotated']:,} | conflicts {p['conflicts']} | failed {p['failed']} | "
+          f"{p['rows_per_sec']:,.0f} rows/s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-encrypt user_info under the current ENCRYPTION_KEY")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-rows-per-sec", type=float, default=0, help="0 = unthrottled")
+    parser.add_argument("--checkpoint", default="key_rotation.checkpoint.json")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start from the first row")
+    args = parser.parse_args()
+
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    job = ReencryptionJob(batch_size=args.batch_size, workers=args.workers,
+                          max_rows_per_sec=args.max_rows_per_sec, checkpoint_path=args.checkpoint)
+    print(f"=== Key Rotation (primary key {job.key_id}) ===")
+    try:
+        result = job.run(report=print_progress)
+    except KeyboardInterrupt:
+        print(f"Stopped at id {job.last_id}, run again to resume")
+        sys.exit(1)
+    print(f"Done: {result['rotated']:,} rows re-encrypted, {result['conflicts']} conflicts, {result['failed']} failed")
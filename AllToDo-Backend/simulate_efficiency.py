@@ -7,7 +7,7 @@ import random
 # Add the current directory to sys.path
 sys.path.append(os.getcwd())
 
-from app.coords import IntCoordinate, TrajectoryCompressor
+from app.coords import IntCoordinate, TrajectoryCompressor, PointCodec
 
 def generate_synthetic_track(duration_sec=3600, speed_mps=1.4):
     """
@@ -107,5 +107,17 @@ def run_simulation():
     print(f"    - Optimized DB Size: ~{total_opt_gb:.2f} GB")
     print(f"    - Conclusion: Saves ~{total_raw_gb - total_opt_gb:.2f} GB of storage")
 
+    # 6. Packed Storage (delta + zigzag varint)
+    packed = PointCodec.encode(
+        [p.lat for p in points_int],
+        [p.lng for p in points_int],
+        list(range(len(points_int)))
+    )
+    
+    print(f"\n[6] Packed Storage (TRACK_STORAGE_MODE=packed)")
+    print(f"    - Encoding: Delta + Zigzag Varint (lat, lng, time_offset)")
+    print(f"    - Packed Raw Track: {len(packed):,} bytes ({len(packed) / len(points_int):.2f} bytes/point)")
+    print(f"    - vs Integer Rows: {(1 - len(packed) / int_size_bytes) * 100:.1f}% smaller (before row/index overhead)")
+
 if __name__ == "__main__":
     run_simulation()
@@ -0,0 +1,79 @@
+import sys
+import os
+import tempfile
+
+# Add the current directory to sys.path so we can import app modules
+sys.path.append(os.getcwd())
+
+# Throwaway SQLite DB unless DATABASE_URL points somewhere else (e.g. a test PostgreSQL)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test_async_api.db")
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.database import SessionLocal, async_engine
+from app import crud, models
+
+# These endpoints run on the async engine (aiosqlite here, asyncpg on PostgreSQL)
+
+def make_user(client, uuid, nickname=None):
+    body = {"uuid": uuid, "latitude": 37.5, "longitude": 127.0, "nickname": nickname}
+    assert client.post("/check-user", json=body).status_code == 200
+
+def test_async_driver():
+    assert async_engine.dialect.is_async
+    if async_engine.dialect.name == "sqlite":
+        assert async_engine.dialect.driver == "aiosqlite"
+    print(f"Async driver: {async_engine.dialect.name}+{async_engine.dialect.driver}")
+
+def test_log_usage():
+    with TestClient(app) as client:
+        make_user(client, "async-log")
+        for i in range(3):
+            response = client.post("/log-usage", json={"user_uuid": "async-log", "latitude": 37.5 + i, "longitude": 127.0})
+            assert response.json() == {"status": "success"}
+    # Leaving the client stops the buffer, which drains it
+    db = SessionLocal()
+    try:
+        rows = db.query(models.UsageLog).filter(models.UsageLog.user_uuid == "async-log").order_by(models.UsageLog.id).all()
+    finally:
+        db.close()
+    assert [row.latitude for row in rows] == [37.5, 38.5, 39.5]
+    print("Async Log Usage Test Passed")
+
+def test_user_info_is_decrypted():
+    with TestClient(app) as client:
+        make_user(client, "async-info", nickname="async-nick")
+        assert client.get("/user-info", params={"uuid": "async-info"}).json()["name"] is None
+        client.post("/update-info", json={
+            "user_uuid": "async-info", "name": "홍길동", "password": "pw", "age": 30, "address_lat": 37.5
+        })
+        info = client.get("/user-info", params={"uuid": "async-info"}).json()
+
+    assert (info["name"], info["age"], info["address_lat"], info["nickname"]) == ("홍길동", "30", "37.5", "async-nick")
+    assert "password" not in info
+    # Stored encrypted, returned in plaintext
+    db = SessionLocal()
+    try:
+        stored = db.query(models.UserInfo).filter(models.UserInfo.user_uuid == "async-info").first()
+        assert stored.name != "홍길동" and crud.decrypt(stored.name) == "홍길동"
+    finally:
+        db.close()
+    print("Async User Info Test Passed")
+
+def test_recover_uuid():
+    with TestClient(app) as client:
+        make_user(client, "async-recover", nickname="recover-nick")
+        client.post("/update-info", json={"user_uuid": "async-recover", "password": "secret"})
+
+        ok = client.post("/recover-uuid", json={"nickname": "recover-nick", "password": "secret"})
+        assert ok.status_code == 200 and ok.json()["uuid"] == "async-recover"
+        assert client.post("/recover-uuid", json={"nickname": "recover-nick", "password": "wrong"}).status_code == 401
+        assert client.post("/recover-uuid", json={"nickname": "nobody", "password": "secret"}).status_code == 404
+    print("Async Recover UUID Test Passed")
+
+if __name__ == "__main__":
+    test_async_driver()
+    test_log_usage()
+    test_user_info_is_decrypted()
+    test_recover_uuid()
@@ -0,0 +1,63 @@
+import sys
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the current directory to sys.path so we can import app modules
+sys.path.append(os.getcwd())
+
+# Throwaway SQLite DB unless DATABASE_URL points somewhere else (e.g. a test PostgreSQL)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test_check_user.db")
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.database import SessionLocal
+from app import crud, schemas
+
+def test_upsert_user():
+    db = SessionLocal()
+    try:
+        user = schemas.UserCreate(uuid="upsert-1", latitude=37.5, longitude=127.0)
+        first = crud.upsert_user(db, user)
+        second = crud.upsert_user(db, user)
+        print(f"First: {first}")
+        print(f"Second: {second}")
+        assert first.created is True
+        assert second.created is False
+        assert first.uuid == second.uuid == "upsert-1"
+        assert first.created_at == second.created_at
+    finally:
+        db.close()
+    print("Upsert User Test Passed")
+
+def test_check_user_concurrent():
+    # Same UUID from many clients at once: exactly one create, everyone gets 200 and the same row
+    workers = 16
+    body = {"uuid": "concurrent-1", "latitude": 37.5, "longitude": 127.0}
+
+    with TestClient(app) as client:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            responses = list(pool.map(lambda _: client.post("/check-user", json=body), range(workers)))
+
+    assert all(r.status_code == 200 for r in responses), [r.text for r in responses if r.status_code != 200]
+    results = [r.json() for r in responses]
+    messages = [r["message"] for r in results]
+    print(f"Messages: {messages.count('User created')} created, {messages.count('User exists')} exists")
+    assert messages.count("User created") == 1
+    assert messages.count("User exists") == workers - 1
+    assert len({r["created_at"] for r in results}) == 1
+    print("Concurrent Check User Test Passed")
+
+def test_check_user_nickname_taken():
+    with TestClient(app) as client:
+        r1 = client.post("/check-user", json={"uuid": "nick-1", "latitude": 0, "longitude": 0, "nickname": "same"})
+        r2 = client.post("/check-user", json={"uuid": "nick-2", "latitude": 0, "longitude": 0, "nickname": "same"})
+    assert r1.status_code == 200
+    assert r2.status_code == 409
+    print("Nickname Taken Test Passed")
+
+if __name__ == "__main__":
+    test_upsert_user()
+    test_check_user_concurrent()
+    test_check_user_nickname_taken()
@@ -5,7 +5,9 @@ import os
 # Add the current directory to sys.path so we can import app modules
 sys.path.append(os.getcwd())
 
-from app.coords import IntCoordinate, TrajectoryCompressor, GridCluster
+import numpy as np
+
+from app.coords import IntCoordinate, TrajectoryCompressor, GridCluster, CoordBatch, OnlineCompressor, ClusterPyramid, PointCodec
 
 def test_conversion():
     lat = 37.566512
@@ -95,8 +97,253 @@ def test_clustering():
     assert len(clusters[(200, 200)]) == 2
     print("Clustering Test Passed")
 
+def _zigzag_track(n=500):
+    # Deterministic track around Seoul with turns every 20 points
+    pts = []
+    lat, lng = 3756650, 12697800
+    for i in range(n):
+        if (i // 20) % 2 == 0:
+            lat += 3
+        else:
+            lng += 4
+        pts.append(IntCoordinate(lat, lng + (i % 3)))
+    return pts
+
+def test_batch_matches_scalar():
+    points = _zigzag_track()
+    lat_i, lng_i = CoordBatch.from_points(points)
+    assert lat_i.dtype == np.int32
+
+    dists = CoordBatch.distances(lat_i, lng_i)
+    bearings = CoordBatch.bearings(lat_i, lng_i)
+    assert len(dists) == len(points) - 1
+    for i in range(len(points) - 1):
+        assert abs(dists[i] - points[i].distance_to(points[i + 1])) < 1e-6
+        assert abs(bearings[i] - points[i].bearing_to(points[i + 1])) < 1e-6
+
+    fast = CoordBatch.distances(lat_i, lng_i, fast=True)
+    assert np.all(np.abs(fast - dists) <= dists * 1e-5 + 1e-9)
+
+    back = CoordBatch.to_points(lat_i, lng_i)
+    assert [(p.lat, p.lng) for p in back] == [(p.lat, p.lng) for p in points]
+    print("Batch Test Passed")
+
+def test_batch_conversion():
+    lats = [37.566512, -33.8688, 0.000005]
+    lngs = [126.978123, 151.2093, -0.000015]
+    lat_i, lng_i = CoordBatch.from_double(lats, lngs)
+    for lat, lng, li, gi in zip(lats, lngs, lat_i, lng_i):
+        c = IntCoordinate.from_double(lat, lng)
+        assert (c.lat, c.lng) == (li, gi)
+
+    lat_d, lng_d = CoordBatch.to_double(lat_i, lng_i)
+    assert np.allclose(lat_d, lats, atol=1e-5)
+    assert np.allclose(lng_d, lngs, atol=1e-5)
+    assert len(CoordBatch.distances(lat_i[:1], lng_i[:1])) == 0
+    print("Batch Conversion Test Passed")
+
+def _rdp_reference(points, eps_m):
+    # Straight port of rdp_recursive / perpendicular_distance_m from the Rust crate
+    import math
+    R = 6371000.0
+
+    def xy(p, lat0):
+        return R * math.radians(p.lng / 1e5) * math.cos(lat0), R * math.radians(p.lat / 1e5)
+
+    def perp(p, a, b):
+        lat0 = math.radians(a.lat / 1e5)
+        (ax, ay), (bx, by), (px, py) = xy(a, lat0), xy(b, lat0), xy(p, lat0)
+        vx, vy = bx - ax, by - ay
+        v_len2 = vx * vx + vy * vy
+        if v_len2 == 0.0:
+            return math.hypot(px - ax, py - ay)
+        t = min(max(((px - ax) * vx + (py - ay) * vy) / v_len2, 0.0), 1.0)
+        return math.hypot(px - (ax + t * vx), py - (ay + t * vy))
+
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+
+    def rec(first, last):
+        if last <= first + 1:
+            return
+        max_dist, index = 0.0, None
+        for i in range(first + 1, last):
+            d = perp(points[i], points[first], points[last])
+            if d > max_dist:
+                max_dist, index = d, i
+        if index is not None and max_dist > eps_m:
+            keep[index] = True
+            rec(first, index)
+            rec(index, last)
+
+    rec(0, len(points) - 1)
+    return [i for i, k in enumerate(keep) if k]
+
+def test_rdp():
+    import random
+    rng = random.Random(7)
+
+    # Straight line collapses to its endpoints
+    line = [IntCoordinate(3700000 + i * 10, 12700000 + i * 10) for i in range(50)]
+    assert len(TrajectoryCompressor.ramer_douglas_peucker(line, 1.0)) == 2
+
+    # Matches the Rust reference on noisy tracks
+    for eps in (0.5, 2.0, 10.0):
+        points = [IntCoordinate(p.lat + rng.randint(-3, 3), p.lng + rng.randint(-3, 3)) for p in _zigzag_track(400)]
+        lat_i, lng_i = CoordBatch.from_points(points)
+        indices = TrajectoryCompressor.rdp_indices(lat_i, lng_i, eps)
+        assert indices.tolist() == _rdp_reference(points, eps)
+
+        compressed = TrajectoryCompressor.ramer_douglas_peucker(points, eps)
+        assert compressed == [points[i] for i in indices]
+
+    # Long tracks must not hit the recursion limit
+    n = 100_000
+    walk = np.random.default_rng(0)
+    lat_i = (3700000 + np.cumsum(walk.integers(-1, 3, n))).astype(np.int32)
+    lng_i = (12700000 + np.cumsum(walk.integers(-1, 3, n))).astype(np.int32)
+    indices = TrajectoryCompressor.rdp_indices(lat_i, lng_i, 3.0)
+    assert indices[0] == 0 and indices[-1] == n - 1
+    assert 2 < len(indices) < n
+    print("RDP Test Passed")
+
+def _online_compress_reference(points, min_dist_m, angle_thresh_deg):
+    # The original batch loop (before OnlineCompressor), kept here as the reference
+    if len(points) <= 2:
+        return list(points)
+    compressed = [points[0]]
+    last_kept = points[0]
+    for i in range(1, len(points) - 1):
+        current = points[i]
+        if last_kept.distance_to(current) >= min_dist_m:
+            angle_diff = abs(last_kept.bearing_to(current) - current.bearing_to(points[i + 1]))
+            if angle_diff > 180:
+                angle_diff = 360 - angle_diff
+            if angle_diff >= angle_thresh_deg:
+                compressed.append(current)
+                last_kept = current
+    compressed.append(points[-1])
+    return compressed
+
+def test_online_compressor_matches_batch():
+    import random
+    rng = random.Random(11)
+    tracks = [_zigzag_track(300)]
+    for _ in range(50):
+        lat, lng = 3750000, 12700000
+        track = []
+        for _ in range(rng.randint(3, 200)):
+            lat += rng.randint(-40, 40)
+            lng += rng.randint(-40, 40)
+            track.append(IntCoordinate(lat, lng))
+        tracks.append(track)
+
+    for points in tracks:
+        for min_dist, angle in [(3.0, 10.0), (2.0, 5.0), (0.0, 1.0)]:
+            expected = _online_compress_reference(points, min_dist, angle)
+            assert TrajectoryCompressor.online_compress(points, min_dist_m=min_dist, angle_thresh_deg=angle) == expected
+
+            compressor = OnlineCompressor(min_dist_m=min_dist, angle_thresh_deg=angle)
+            streamed = []
+            for p in points:
+                emitted = compressor.push(p)
+                assert len(emitted) <= 1
+                streamed.extend(emitted)
+            streamed.extend(compressor.flush())
+
+            assert streamed == expected
+            assert compressor.raw_count == len(points)
+            assert compressor.kept_count == len(expected)
+
+    points = tracks[0]
+
+    # Short tracks and reuse after flush
+    compressor = OnlineCompressor()
+    assert compressor.push(points[0]) == [points[0]]
+    assert compressor.flush() == []
+    assert compressor.push(points[1]) == [points[1]]
+    assert compressor.push(points[2]) == []
+    assert compressor.flush() == [points[2]]
+    assert compressor.flush() == []
+    print("Online Compressor Test Passed")
+
+def test_cluster_pyramid():
+    rng = np.random.default_rng(3)
+    lat_i = rng.integers(3740000, 3760000, 2000).astype(np.int32)
+    lng_i = rng.integers(12690000, 12710000, 2000).astype(np.int32)
+    points = CoordBatch.to_points(lat_i, lng_i)
+
+    bulk = ClusterPyramid()
+    bulk.insert_many(lat_i[:1500], lng_i[:1500])
+    bulk.insert_many(lat_i[1500:], lng_i[1500:])
+    incremental = ClusterPyramid()
+    for p in points:
+        incremental.insert(p)
+    assert len(bulk) == len(incremental) == len(points)
+
+    # Same cells as GridCluster.cluster at every zoom
+    for zoom in range(1, 21):
+        expected = GridCluster.cluster(points, zoom)
+        for pyramid in (bulk, incremental):
+            cells = {cell.key: cell for cell in pyramid.cells(zoom)}
+            assert set(cells) == set(expected)
+            for key, members in expected.items():
+                cell = cells[key]
+                assert cell.count == len(members)
+                assert cell.min_lat == min(p.lat for p in members)
+                assert cell.max_lng == max(p.lng for p in members)
+                assert cell.centroid().lat == int(sum(p.lat for p in members) / len(members))
+
+    # Viewport query returns exactly the overlapping cells
+    bbox = (3745000, 12695000, 3748000, 12699000)
+    for zoom in (8, 13, 15, 18):
+        size = GridCluster.cell_size(zoom)
+        expected = {
+            key for key in GridCluster.cluster(points, zoom)
+            if bbox[0] // size <= key[0] <= bbox[2] // size and bbox[1] // size <= key[1] <= bbox[3] // size
+        }
+        assert {cell.key for cell in bulk.cells(zoom, bbox)} == expected
+
+    summary = bulk.summarize(15, bbox)
+    assert summary and set(summary[0]) == {"lat_i", "lng_i", "count", "bbox"}
+    print("Cluster Pyramid Test Passed")
+
+def test_point_codec():
+    points = _zigzag_track(1000)
+    lat_i, lng_i = CoordBatch.from_points(points)
+    time_offset = np.arange(len(points))
+
+    blob = PointCodec.encode(lat_i, lng_i, time_offset)
+    print(f"Packed: {len(blob) / len(points):.2f} bytes/point")
+    assert len(blob) < len(points) * 4
+
+    decoded = PointCodec.decode(blob)
+    assert decoded["lat_i"].tolist() == lat_i.tolist()
+    assert decoded["lng_i"].tolist() == lng_i.tolist()
+    assert decoded["time_offset"].tolist() == time_offset.tolist()
+    assert decoded["seq"].tolist() == list(range(len(points)))
+    assert decoded["speed_cms"] == [None] * len(points)
+
+    # Optional columns with gaps, non-contiguous seq and extreme values
+    extremes = [-2**31, 2**31 - 1, 0, -1, 7]
+    speed = [150, None, 149, None, 0]
+    heading = [None, 359, 0, 1, None]
+    seq = [0, 2, 3, 10, 11]
+    decoded = PointCodec.decode(PointCodec.encode(extremes, extremes, extremes, speed, heading, seq))
+    assert decoded["lat_i"].tolist() == extremes
+    assert decoded["speed_cms"] == speed
+    assert decoded["heading_deg"] == heading
+    assert decoded["seq"].tolist() == seq
+    print("Point Codec Test Passed")
+
 if __name__ == "__main__":
     test_conversion()
     test_distance()
     test_compression()
     test_clustering()
+    test_batch_matches_scalar()
+    test_batch_conversion()
+    test_rdp()
+    test_online_compressor_matches_batch()
+    test_cluster_pyramid()
+    test_point_codec()
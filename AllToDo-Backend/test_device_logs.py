@@ -0,0 +1,238 @@
+import sys
+import os
+import gzip
+import time
+import socket
+import tempfile
+import threading
+
+# Add the current directory to sys.path so we can import app modules
+sys.path.append(os.getcwd())
+
+# Throwaway SQLite DB unless DATABASE_URL points somewhere else (e.g. a test PostgreSQL)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test_device_logs.db")
+
+import httpx
+import uvicorn
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.dev import DEV_PASSWORD
+from app.device_logs import DeviceLogSink, tail_lines, format_line, device_log_sink
+from app.log_segments import LogSegments, search_active
+from app.log_index import battery_of
+
+def test_tail_lines():
+    path = os.path.join(tempfile.mkdtemp(), "d.log")
+    with open(path, "wb") as f:
+        f.write(b"".join(b"line %d\n" % i for i in range(10000)))
+    data, offset, size = tail_lines(path, 3, block_size=7)
+    assert data == b"line 9997\nline 9998\nline 9999\n"
+    assert offset == size - len(data)
+
+    with open(path, "wb") as f:
+        f.write(b"a\nb\nc")
+    assert tail_lines(path, 2)[0] == b"b\nc"
+    assert tail_lines(path, 10)[0] == b"a\nb\nc"
+
+    # max_bytes cuts inside a line (and inside a UTF-8 character): the partial line is left out
+    with open(path, "wb") as f:
+        f.write("".join(f"{i:03d} 로그 메시지\n" for i in range(100)).encode("utf-8"))
+    for max_bytes in range(20, 80):
+        data, offset, size = tail_lines(path, 1000, block_size=7, max_bytes=max_bytes)
+        assert len(data) <= max_bytes and offset == size - len(data)
+        assert data == b"" or data.decode("utf-8").startswith(tuple(f"{i:03d} " for i in range(100)))
+    print("Tail Lines Test Passed")
+
+def use_temp_log_dir():
+    # Endpoints use the shared sink; keep its files away from the real logs/ directory
+    device_log_sink.log_dir = tempfile.mkdtemp()
+    device_log_sink.segments = LogSegments(device_log_sink.log_dir)
+    device_log_sink.index = None
+
+def test_read_device_log_endpoint():
+    use_temp_log_dir()
+    device_log_sink.add([("dev-read", "INFO", 1.0 + i, f"line {i}") for i in range(50)])
+    device_log_sink.flush()
+    auth = {"password": DEV_PASSWORD}
+    with TestClient(app) as client:
+        assert client.get("/dev/logs/dev-read").status_code == 401
+        tail = client.get("/dev/logs/dev-read", params={"lines": 3, **auth})
+        assert tail.text.splitlines() == [format_line("INFO", 1.0 + i, f"line {i}").rstrip("\n") for i in (47, 48, 49)]
+        size, offset = int(tail.headers["x-log-size"]), int(tail.headers["x-log-offset"])
+        assert offset + len(tail.content) == size
+
+        resumed = client.get("/dev/logs/dev-read", params=auth, headers={"Range": f"bytes={offset}-"})
+        assert resumed.status_code == 206 and resumed.content == tail.content
+        span = client.get("/dev/logs/dev-read", params=auth, headers={"Range": "bytes=0-9"})
+        assert span.status_code == 206 and len(span.content) == 10
+        assert client.get("/dev/logs/dev-read", params=auth, headers={"Range": f"bytes={size}-"}).status_code == 416
+        assert client.get("/dev/logs/no-such-device", params=auth).status_code == 404
+    print("Read Device Log Endpoint Test Passed")
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def test_stream_device_log():
+    # TestClient buffers streaming responses, so SSE runs against a real server
+    use_temp_log_dir()
+    device_log_sink.add([("dev-sse", "INFO", 1.0 + i, f"old {i}") for i in range(5)])
+    device_log_sink.flush()
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    try:
+        deadline = time.monotonic() + 5
+        while not server.started:
+            assert time.monotonic() < deadline, "server did not start"
+            time.sleep(0.01)
+
+        url = f"http://127.0.0.1:{port}/dev/logs/dev-sse/stream"
+        assert httpx.get(url, params={"lines": 2}, timeout=5).status_code == 401
+        received = []
+        with httpx.stream("GET", url, params={"lines": 2, "password": DEV_PASSWORD}, timeout=5) as response:
+            assert response.headers["content-type"].startswith("text/event-stream")
+            for line in response.iter_lines():
+                if line.startswith("data: "):
+                    received.append(line[len("data: "):])
+                if len(received) == 2:
+                    # Written after the stream started: delivered through the sink's notification
+                    device_log_sink.add([("dev-sse", "WARN", 10.0, "new line")])
+                    device_log_sink.flush()
+                if len(received) == 3:
+                    break
+    finally:
+        server.should_exit = True
+        thread.join(5)
+    assert received == [format_line(level, t, message).rstrip("\n")
+                        for level, t, message in (("INFO", 4.0, "old 3"), ("INFO", 5.0, "old 4"), ("WARN", 10.0, "new line"))]
+    print("Stream Device Log Test Passed")
+
+def test_sink_drops_lru_and_drain():
+    log_dir = tempfile.mkdtemp()
+    # Nothing flushes on its own: only stop() writes
+    sink = DeviceLogSink(log_dir=log_dir, flush_interval_ms=60000, flush_bytes=1 << 30,
+                         max_pending=30, max_open_files=2, index_path="")
+    try:
+        assert sink.add([(f"dev-{i % 5}", "INFO", 1.0 + i, f"m{i}") for i in range(25)]) == (25, 0)
+        assert sink.add([("dev-0", "INFO", 100.0 + i, "late") for i in range(10)]) == (5, 5)
+        assert sink.add([("dev-0", "INFO", 200.0, "full")]) == (0, 1)
+        assert sink.stats()["pending"] == 30
+    finally:
+        sink.stop()
+
+    stats = sink.stats()
+    assert (stats["accepted"], stats["dropped"], stats["written"], stats["pending"]) == (30, 6, 30, 0)
+    # Five devices through two handles: LRU closes the oldest instead of keeping all open
+    assert stats["open_files"] == 0 and stats["file_opens"] >= 5
+    lines = {i: open(sink.log_path(f"dev-{i}")).read().count("\n") for i in range(5)}
+    assert lines == {0: 10, 1: 5, 2: 5, 3: 5, 4: 5}
+    print(f"Sink: {stats}")
+    print("Sink Drops / LRU / Drain Test Passed")
+
+def test_full_queue_returns_503():
+    body = {"device": "dev-503", "level": "INFO", "timestamp": 1.0, "message": "m"}
+    saved = device_log_sink.max_pending
+    device_log_sink.max_pending = 0
+    try:
+        with TestClient(app) as client:
+            assert client.post("/dev/logs", json=body).status_code == 503
+            assert client.post("/dev/logs/batch", json=[body, body]).status_code == 503
+            # An empty batch dropped nothing
+            assert client.post("/dev/logs/batch", json=[]).status_code == 200
+    finally:
+        device_log_sink.max_pending = saved
+    print("Full Queue 503 Test Passed")
+
+def test_reserved_device_ids_rejected():
+    use_temp_log_dir()
+    with TestClient(app) as client:
+        for device in ("search", "query", "view", "se.arch"):
+            body = {"device": device, "level": "INFO", "timestamp": 1.0, "message": "m"}
+            assert client.post("/dev/logs", json=body).status_code == 422, device
+            ok = dict(body, device="phone-1")
+            assert client.post("/dev/logs/batch", json=[ok, body]).status_code == 422, device
+        assert client.post("/dev/logs", json={"device": "searcher", "level": "INFO", "timestamp": 1.0, "message": "m"}).status_code == 200
+    # Leaving the client stops the sink, which drains it; nothing of the rejected requests was queued
+    assert os.listdir(device_log_sink.log_dir) == ["searcher.log"]
+    print("Reserved Device IDs Test Passed")
+
+def test_rotation_and_search():
+    log_dir = tempfile.mkdtemp()
+    sink = DeviceLogSink(log_dir=log_dir, segment_bytes=6000, keep_segments=0)
+    sink.segments.block_bytes = 2000
+    try:
+        for k in range(10):
+            sink.add([("dev-1", "ERROR" if i == 0 else "INFO", 1000.0 + k * 100 + i, f"msg {k}-{i}") for i in range(100)])
+            sink.flush()
+    finally:
+        sink.stop()
+
+    index = sink.segments.index("dev-1")
+    assert len(index) >= 2
+    assert sum(entry["lines"] for entry in index) + len(search_active(sink.log_path("dev-1"), limit=10000)) == 1000
+    # A segment is a regular gzip file
+    with gzip.open(os.path.join(sink.segments.device_dir("dev-1"), index[0]["file"]), "rt") as f:
+        assert f.readline() == format_line("ERROR", 1000.0, "msg 0-0")
+
+    stats = {}
+    found = sink.segments.search("dev-1", since=1150, until=1155, stats=stats)
+    assert [line.split("] ")[1].strip() for line in found] == [f"INFO: msg 1-{i}" for i in range(50, 56)]
+    assert stats["blocks_read"] == 1 and stats["blocks_skipped"] > 0
+
+    errors = sink.segments.search("dev-1", levels={"ERROR"})
+    assert all("ERROR" in line for line in errors) and len(errors) >= 2
+    print(f"Rotation: {len(index)} segments, {index[0]['bytes']} -> {index[0]['compressed_bytes']} bytes")
+    print("Rotation And Search Test Passed")
+
+def test_recover_interrupted_rotation():
+    log_dir = tempfile.mkdtemp()
+    segments = LogSegments(log_dir)
+    directory = segments.device_dir("dev-2")
+    os.makedirs(directory)
+    # Crash after the rename, before compression
+    with open(os.path.join(directory, "00000001.log"), "w") as f:
+        f.write(format_line("WARN", 5.0, "left behind"))
+
+    segments.recover()
+    assert sorted(os.listdir(directory)) == ["00000001.log.gz", "index.jsonl"]
+    assert LogSegments(log_dir).search("dev-2") == [format_line("WARN", 5.0, "left behind")]
+    print("Recover Interrupted Rotation Test Passed")
+
+def test_structured_index():
+    assert battery_of("User Stationary [Bat: 18%]") == 18
+    assert battery_of("unknown [Bat: -100%]") is None
+
+    now = time.time()
+    sink = DeviceLogSink(log_dir=tempfile.mkdtemp())
+    try:
+        for d in range(5):
+            sink.add([(f"phone-{d}", "BATTERY_LEVEL", now - 600 * i, f"level [Bat: {d * 15 + i}%]") for i in range(10)])
+        sink.add([("phone-0", "ERROR", now, "crash"), ("phone-1", "BATTERY_LEVEL", now - 86400, "old [Bat: 1%]")])
+        sink.flush()
+    finally:
+        sink.stop()
+
+    # Which devices logged battery below 20 in the last hour
+    rows = sink.index.query(levels={"BATTERY_LEVEL"}, battery_lt=20, since=now - 3000, group_by="device")
+    assert {row["key"]: row["count"] for row in rows} == {"phone-0": 6, "phone-1": 5}
+    assert rows[0]["battery_min"] == 0
+
+    latest = sink.index.query(device="phone-0", limit=2)
+    assert [row["level"] for row in latest] == ["ERROR", "BATTERY_LEVEL"] and latest[0]["battery"] is None
+    assert sink.stats()["index_rows_written"] == 52
+    print("Structured Index Test Passed")
+
+if __name__ == "__main__":
+    test_tail_lines()
+    test_read_device_log_endpoint()
+    test_stream_device_log()
+    test_sink_drops_lru_and_drain()
+    test_full_queue_returns_503()
+    test_reserved_device_ids_rejected()
+    test_rotation_and_search()
+    test_recover_interrupted_rotation()
+    test_structured_index()
@@ -0,0 +1,59 @@
+import sys
+import os
+import tempfile
+
+# Add the current directory to sys.path so we can import app modules
+sys.path.append(os.getcwd())
+
+# Throwaway SQLite DB unless DATABASE_URL points somewhere else (e.g. a test PostgreSQL)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test_metrics.db")
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.metrics import MetricsRegistry, registry
+
+def sample(text: str, series: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(series + " "):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{series} not in output")
+
+def test_histogram_output():
+    metrics = MetricsRegistry()
+    latency = metrics.histogram("op_seconds", "Operation latency", labels=("op",), buckets=(0.01, 0.1, 1.0))
+    for value in (0.003, 0.1, 0.02, 3.0):
+        latency.observe(value, "read")
+    text = metrics.render()
+
+    assert "# TYPE op_seconds histogram" in text
+    # Cumulative counts; a value equal to a bound falls in that bucket (le = less or equal)
+    assert sample(text, 'op_seconds_bucket{op="read",le="0.01"}') == 1
+    assert sample(text, 'op_seconds_bucket{op="read",le="0.1"}') == 3
+    assert sample(text, 'op_seconds_bucket{op="read",le="1.0"}') == 3
+    assert sample(text, 'op_seconds_bucket{op="read",le="+Inf"}') == 4
+    assert abs(sample(text, 'op_seconds_sum{op="read"}') - 3.123) < 1e-9
+    assert sample(text, 'op_seconds_count{op="read"}') == 4
+    print("Histogram Output Test Passed")
+
+def test_route_labels_and_in_flight():
+    with TestClient(app) as client:
+        for track_id in (101, 102, 103):
+            assert client.get(f"/tracks/{track_id}/raw-points").status_code == 404
+        assert client.get("/no/such/path/123").status_code == 404
+        scraped = client.get("/metrics").text
+    text = registry.render()
+
+    # One series per route template, not per URL
+    series = 'http_request_duration_seconds_count{method="GET",route="/tracks/{track_id}/raw-points",status="404"}'
+    assert sample(text, series) >= 3
+    assert "/tracks/101/" not in text
+    assert sample(text, 'http_request_duration_seconds_count{method="GET",route="<unmatched>",status="404"}') >= 1
+    # The scrape counts itself while it runs; afterwards nothing is in flight
+    assert sample(scraped, 'http_requests_in_flight{method="GET"}') == 1
+    assert sample(text, 'http_requests_in_flight{method="GET"}') == 0
+    print("Route Labels And In-Flight Test Passed")
+
+if __name__ == "__main__":
+    test_histogram_output()
+    test_route_labels_and_in_flight()
@@ -0,0 +1,104 @@
+import sys
+import os
+import time
+import asyncio
+import tempfile
+from pathlib import Path
+
+# Add the current directory to sys.path so we can import app modules
+sys.path.append(os.getcwd())
+
+# Throwaway SQLite DB unless DATABASE_URL points somewhere else (e.g. a test PostgreSQL)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test_profiling.db")
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.dev import DEV_PASSWORD
+from app import profiling
+
+def use_temp_profile_dir(max_files: int = 200) -> Path:
+    # Keep profiles away from the real profiles/ directory
+    root = Path(tempfile.mkdtemp())
+    profiling.PROFILE_DIR = root / "profiles"
+    profiling.PROFILE_MAX_FILES = max_files
+    return root
+
+def test_profile_header():
+    use_temp_profile_dir()
+    with TestClient(app) as client:
+        sampled = client.get("/", headers={"X-Profile": DEV_PASSWORD})
+        traced = client.get("/", headers={"X-Profile": DEV_PASSWORD, "X-Profile-Mode": "cprofile"})
+        wrong = client.get("/", headers={"X-Profile": "not-the-password"})
+        plain = client.get("/")
+
+        assert sampled.headers["x-profile-file"].endswith(".collapsed")
+        assert traced.headers["x-profile-file"].endswith(".pstats")
+        assert "x-profile-file" not in wrong.headers and "x-profile-file" not in plain.headers
+        assert wrong.json() == plain.json() == sampled.json()
+        names = {p["name"] for p in profiling.list_profiles()}
+        assert names == {sampled.headers["x-profile-file"], traced.headers["x-profile-file"]}
+
+        text = client.get(f"/dev/profiles/{traced.headers['x-profile-file']}",
+                          params={"password": DEV_PASSWORD, "view": "text"})
+        assert text.status_code == 200 and "cumulative" in text.text
+    print("Profile Header Test Passed")
+
+def test_sampler_stops_off_the_event_loop():
+    use_temp_profile_dir()
+    stop = profiling.StackSampler.stop
+    loops = []
+
+    def recording_stop(self):
+        try:
+            loops.append(asyncio.get_running_loop())
+        except RuntimeError:
+            loops.append(None)
+        stop(self)
+
+    profiling.StackSampler.stop = recording_stop
+    try:
+        with TestClient(app) as client:
+            assert client.get("/", headers={"X-Profile": DEV_PASSWORD, "X-Profile-Mode": "sample"}).status_code == 200
+    finally:
+        profiling.StackSampler.stop = stop
+    # The thread join ran in the threadpool, not on the event loop
+    assert loops == [None]
+    print("Sampler Stop Off Loop Test Passed")
+
+def test_profile_max_files():
+    use_temp_profile_dir(max_files=3)
+    with TestClient(app) as client:
+        names = []
+        for _ in range(5):
+            names.append(client.get("/", headers={"X-Profile": DEV_PASSWORD, "X-Profile-Mode": "cprofile"}).headers["x-profile-file"])
+            # Distinct file names (millisecond timestamps) and modification times
+            time.sleep(0.01)
+    kept = [p["name"] for p in profiling.list_profiles()]
+    assert kept == names[::-1][:3]
+    print("Profile Max Files Test Passed")
+
+def test_profile_path_traversal():
+    root = use_temp_profile_dir()
+    profiling.PROFILE_DIR.mkdir()
+    (root / "secret.pstats").write_text("outside PROFILE_DIR")
+    (profiling.PROFILE_DIR / "ok.pstats").write_text("inside")
+
+    assert profiling.profile_path("ok.pstats") == profiling.PROFILE_DIR / "ok.pstats"
+    for name in ("../secret.pstats", "..\\secret.pstats", "/etc/passwd", "ok.txt", "missing.pstats"):
+        assert profiling.profile_path(name) is None, name
+
+    with TestClient(app) as client:
+        params = {"password": DEV_PASSWORD}
+        assert client.get("/dev/profiles/ok.pstats", params=params).content == b"inside"
+        for name in ("..%2Fsecret.pstats", "%2E%2E%2Fsecret.pstats", "..%5Csecret.pstats"):
+            response = client.get(f"/dev/profiles/{name}", params=params)
+            assert response.status_code == 404 and b"outside" not in response.content, name
+        assert client.get("/dev/profiles/ok.pstats").status_code == 401
+    print("Profile Path Traversal Test Passed")
+
+if __name__ == "__main__":
+    test_profile_header()
+    test_sampler_stops_off_the_event_loop()
+    test_profile_max_files()
+    test_profile_path_traversal()
@@ -0,0 +1,107 @@
+import sys
+import os
+import logging
+
+# Add the current directory to sys.path so we can import app modules
+sys.path.append(os.getcwd())
+
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.testclient import TestClient
+
+from app.request_logging import RequestLoggingMiddleware, redact, parse_sample_rates, logger
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(record.getMessage())
+
+def make_client(**options):
+    app = FastAPI()
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        return {"bytes": len(await request.body())}
+
+    @app.get("/items/{item_id}")
+    def item(item_id: int):
+        return {"id": item_id}
+
+    @app.get("/broken/{item_id}")
+    def broken(item_id: int):
+        raise HTTPException(status_code=503, detail="down")
+
+    app.add_middleware(RequestLoggingMiddleware, **options)
+    return TestClient(app)
+
+def capture():
+    handler = ListHandler()
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    return handler
+
+def test_redact_user_info_fields():
+    body = ('{"user_uuid":"u1","name":"Kim","phone_number":"010-1234-5678","Password":"pw",'
+            '"address":"Seoul","age":30,"address_lat":37.5,"work_address":"Pangyo"}')
+    redacted = redact(body)
+    for secret in ("Kim", "010-1234-5678", "pw", "Seoul", "30", "37.5", "Pangyo"):
+        assert secret not in redacted, secret
+    assert '"user_uuid":"u1"' in redacted
+    # Preview cut inside a value
+    assert redact('{"name":"Ki') == '{"name":"***"'
+    assert redact("/user-info?uuid=u1&PASSWORD=abc&nickname=n") == "/user-info?uuid=u1&PASSWORD=***&nickname=n"
+    print(f"Redacted: {redacted}")
+    print("Redact Test Passed")
+
+def test_dev_password_is_masked():
+    handler = capture()
+    try:
+        client = make_client()
+        client.get("/items/1", params={"password": "pw3355"})
+        client.post("/echo", content='{"nickname":"n","password":"pw3355"}', headers={"Content-Type": "application/json"})
+        client.post("/echo", content="password=pw3355", headers={"Content-Type": "application/x-www-form-urlencoded"})
+    finally:
+        logger.removeHandler(handler)
+    assert len(handler.lines) == 3
+    assert not any("pw3355" in line for line in handler.lines), handler.lines
+    assert "/items/1?password=***" in handler.lines[0]
+    print("Dev Password Redact Test Passed")
+
+def test_body_preview_and_binary():
+    handler = capture()
+    try:
+        client = make_client(body_max_bytes=16)
+        body = '{"password":"secret","note":"' + "x" * 100 + '"}'
+        client.post("/echo", content=body, headers={"Content-Type": "application/json"})
+        client.post("/echo", content=b"\0" * 5000, headers={"Content-Type": "application/octet-stream"})
+    finally:
+        logger.removeHandler(handler)
+    text, binary = handler.lines
+    assert "secret" not in text and text.endswith(f'{{"password":"***"... ({len(body)} bytes)'), text
+    assert "<5000 bytes application/octet-stream>" in binary and "\\x00" not in binary
+    print("Body Preview And Binary Test Passed")
+
+def test_sampling_and_errors():
+    assert parse_sample_rates("/items/{item_id}=0, /echo=0.5") == {"/items/{item_id}": 0.0, "/echo": 0.5}
+    handler = capture()
+    try:
+        client = make_client(sample_rates={"/items/{item_id}": 0.0, "/broken/{item_id}": 0.0})
+        for i in range(5):
+            client.get(f"/items/{i}")
+            client.get(f"/broken/{i}")
+        client.post("/echo", json={})
+    finally:
+        logger.removeHandler(handler)
+    # Rate is looked up by route template; 5xx is logged regardless of the rate
+    assert not any(line.startswith("GET /items/") for line in handler.lines)
+    assert sum(line.startswith("GET /broken/") and "-> 503" in line for line in handler.lines) == 5
+    assert sum(line.startswith("POST /echo") for line in handler.lines) == 1
+    print("Sampling And Errors Test Passed")
+
+if __name__ == "__main__":
+    test_redact_user_info_fields()
+    test_dev_password_is_masked()
+    test_body_preview_and_binary()
+    test_sampling_and_errors()
@@ -0,0 +1,83 @@
+import sys
+import os
+import tempfile
+
+# Add the current directory to sys.path so we can import app modules
+sys.path.append(os.getcwd())
+
+# Throwaway SQLite DB unless DATABASE_URL points somewhere else (e.g. a test PostgreSQL)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test_sql_stats.db")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from app.main import app
+from app.dev import DEV_PASSWORD
+from app import sql_stats as sql_stats_module
+from app.sql_stats import SqlStats, SqlStatsMiddleware, normalize_sql, sql_stats
+
+def test_normalize_sql():
+    assert normalize_sql("SELECT * FROM users WHERE uuid = %(uuid_1)s LIMIT %(param_1)s") == \
+        "SELECT * FROM users WHERE uuid = ? LIMIT ?"
+    assert normalize_sql("SELECT * FROM t WHERE a = $1 AND b = ?") == "SELECT * FROM t WHERE a = ? AND b = ?"
+    assert normalize_sql("SELECT * FROM t WHERE name = 'it''s' AND n = 42 AND x = 1.5") == \
+        "SELECT * FROM t WHERE name = ? AND n = ? AND x = ?"
+    # IN lists of any length and multi-row VALUES fold to one shape
+    assert normalize_sql("SELECT * FROM t WHERE id IN (1, 2, 3)") == normalize_sql("SELECT * FROM t WHERE id IN (?)")
+    assert normalize_sql("INSERT INTO t (a, b) VALUES (?, ?), (?, ?), (?, ?)") == "INSERT INTO t (a, b) VALUES (?), ..."
+    assert normalize_sql("SELECT  a\n   FROM t") == "SELECT a FROM t"
+    # Identifiers with digits are kept
+    assert normalize_sql("SELECT col1 FROM t2") == "SELECT col1 FROM t2"
+    print("Normalize SQL Test Passed")
+
+def make_app(stats):
+    engine = create_engine("sqlite://")
+    stats.attach(engine)
+    test_app = FastAPI()
+
+    @test_app.get("/repeat/{n}")
+    def repeat(n: int):
+        with engine.connect() as conn:
+            for i in range(n):
+                conn.execute(text("SELECT :value"), {"value": i})
+        return {"ran": n}
+
+    test_app.add_middleware(SqlStatsMiddleware, stats=stats)
+    return TestClient(test_app)
+
+def test_route_aggregation_and_n_plus_one():
+    stats = SqlStats()
+    client = make_app(stats)
+    threshold = sql_stats_module.N_PLUS_ONE_THRESHOLD
+    client.get(f"/repeat/{threshold - 1}")
+    assert stats.snapshot()["n_plus_one"] == []
+
+    client.get(f"/repeat/{threshold}")
+    client.get(f"/repeat/{threshold + 3}")
+    snapshot = stats.snapshot()
+    # Statements run in the threadpool still count against the route template
+    [route] = [r for r in snapshot["routes"] if r["statement"] == "SELECT ?"]
+    assert route["route"] == "/repeat/{n}" and route["count"] == 3 * threshold + 2
+    [flagged] = snapshot["n_plus_one"]
+    assert (flagged["route"], flagged["requests"], flagged["max_repeats"]) == ("/repeat/{n}", 2, threshold + 3)
+    print(f"N+1: {flagged}")
+    print("Route Aggregation / N+1 Test Passed")
+
+def test_dev_endpoints_and_reset():
+    with TestClient(app) as client:
+        client.get("/user-info", params={"uuid": "sql-stats-1"})
+        snapshot = client.get("/dev/sql-stats", params={"password": DEV_PASSWORD}).json()
+        assert any(r["route"] == "/user-info" for r in snapshot["routes"])
+        assert client.get("/dev/sql-stats").status_code == 401
+
+        assert client.post("/dev/sql-stats/reset", params={"password": DEV_PASSWORD}).json() == {"status": "reset"}
+        snapshot = client.get("/dev/sql-stats", params={"password": DEV_PASSWORD}).json()
+        assert snapshot["statements"] == [] and snapshot["routes"] == []
+    assert sql_stats.snapshot()["statements"] == []
+    print("Dev SQL Stats Reset Test Passed")
+
+if __name__ == "__main__":
+    test_normalize_sql()
+    test_route_aggregation_and_n_plus_one()
+    test_dev_endpoints_and_reset()
@@ -0,0 +1,139 @@
+import sys
+import os
+import struct
+import tempfile
+
+# Add the current directory to sys.path so we can import app modules
+sys.path.append(os.getcwd())
+
+# Throwaway SQLite DB unless DATABASE_URL points somewhere else (e.g. a test PostgreSQL)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test_tracks.db")
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.database import SessionLocal
+from app.track_binary import TrackBinaryFormat
+from app import crud, models
+
+HEADER = {
+    "user_uuid": "track-user",
+    "device_id": "phone",
+    "started_at": "2025-01-01T00:00:00+00:00",
+    "ended_at": "2025-01-01T00:10:00+00:00",
+    "start_lat_i": 3756650, "start_lng_i": 12697800,
+    "end_lat_i": 3756700, "end_lng_i": 12697900,
+    "duration_sec": 600, "distance_m": 120.5,
+    "raw_point_count": 4, "compressed_count": 2,
+}
+
+RAW_POINTS = [
+    {"seq": 0, "time_offset": 0, "lat_i": 3756650, "lng_i": 12697800, "speed_cms": 140, "heading_deg": 90},
+    {"seq": 1, "time_offset": 1, "lat_i": 3756660, "lng_i": 12697810, "speed_cms": None, "heading_deg": None},
+    {"seq": 2, "time_offset": 2, "lat_i": 3756670, "lng_i": -12697820, "speed_cms": 0, "heading_deg": None},
+    {"seq": 3, "time_offset": 5, "lat_i": 3756700, "lng_i": 12697900, "speed_cms": 300, "heading_deg": 359},
+]
+
+COMPRESSED_POINTS = [
+    {"seq": 0, "time_offset": 0, "lat_i": 3756650, "lng_i": 12697800, "is_corner": False},
+    {"seq": 3, "time_offset": 5, "lat_i": 3756700, "lng_i": 12697900, "is_corner": True},
+]
+
+def test_binary_roundtrip():
+    body = TrackBinaryFormat.build(HEADER, RAW_POINTS, COMPRESSED_POINTS)
+    header, raw, compressed = TrackBinaryFormat.parse(body)
+    assert header.user_uuid == "track-user" and header.distance_m == 120.5
+    assert [dict(zip(raw, values)) for values in zip(*raw.values())] == RAW_POINTS
+    assert all(type(v) is int for v in raw["lat_i"])
+    assert compressed == [dict(p, note=None) for p in COMPRESSED_POINTS]
+
+    empty = TrackBinaryFormat.parse(TrackBinaryFormat.build(HEADER, []))
+    assert empty[1]["seq"] == [] and empty[2] == []
+    print(f"Binary: {len(body)} bytes for {len(RAW_POINTS)} + {len(COMPRESSED_POINTS)} points")
+    print("Binary Roundtrip Test Passed")
+
+def test_binary_malformed():
+    body = TrackBinaryFormat.build(HEADER, RAW_POINTS, COMPRESSED_POINTS)
+    header_len = struct.unpack_from("<I", body, 4)[0]
+    cases = {
+        "Payload too short": b"ATK",
+        "Bad magic": b"XXXX" + body[4:],
+        "Truncated header": body[:8 + header_len - 1],
+        # Counts claim one more raw point than the body holds
+        "size mismatch": body[:8 + header_len] + struct.pack("<II", 5, 2) + body[16 + header_len:],
+        "size mismatch (trailing)": body + b"\0",
+    }
+    for expected, payload in cases.items():
+        try:
+            TrackBinaryFormat.parse(payload)
+            assert False, f"parsed: {expected}"
+        except ValueError as e:
+            assert expected.split(" (")[0] in str(e), (expected, e)
+    print("Binary Malformed Test Passed")
+
+def test_binary_endpoint():
+    body = TrackBinaryFormat.build(HEADER, RAW_POINTS, COMPRESSED_POINTS)
+    with TestClient(app) as client:
+        client.post("/check-user", json={"uuid": "track-user", "latitude": 37.5, "longitude": 127.0})
+        response = client.post("/tracks/binary", content=body, headers={"Content-Type": "application/octet-stream"})
+        assert response.status_code == 200, response.text
+        result = response.json()
+        assert (result["raw_inserted"], result["compressed_inserted"]) == (4, 2)
+        assert client.get(f"/tracks/{result['id']}/raw-points").json() == RAW_POINTS
+
+        bad = client.post("/tracks/binary", content=b"XXXX" + body[4:], headers={"Content-Type": "application/octet-stream"})
+        assert bad.status_code == 400
+    print("Binary Endpoint Test Passed")
+
+def count(model, **filters):
+    db = SessionLocal()
+    try:
+        return db.query(model).filter_by(**filters).count()
+    finally:
+        db.close()
+
+def test_create_track():
+    body = dict(HEADER, raw_points=RAW_POINTS, compressed_points=[dict(p, note="corner") for p in COMPRESSED_POINTS])
+    with TestClient(app) as client:
+        client.post("/check-user", json={"uuid": "track-user", "latitude": 37.5, "longitude": 127.0})
+        for mode in ("rows", "packed"):
+            crud.TRACK_STORAGE_MODE = mode
+            try:
+                response = client.post("/tracks", json=body)
+            finally:
+                crud.TRACK_STORAGE_MODE = "rows"
+            assert response.status_code == 200, response.text
+            track_id = response.json()["id"]
+            assert (response.json()["raw_inserted"], response.json()["compressed_inserted"]) == (4, 2)
+            assert count(models.TrackPointRaw, track_id=track_id) == (4 if mode == "rows" else 0)
+            assert count(models.TrackPointCompressed, track_id=track_id) == 2
+            assert client.get(f"/tracks/{track_id}/raw-points").json() == RAW_POINTS
+    print("Create Track Test Passed")
+
+def test_create_track_is_one_transaction():
+    body = dict(HEADER, raw_points=RAW_POINTS, compressed_points=COMPRESSED_POINTS)
+    bulk_insert = crud.bulk_insert
+
+    def failing_bulk_insert(db, table, rows):
+        # Header and raw points are already flushed when the compressed insert fails
+        if table is models.TrackPointCompressed.__table__:
+            raise RuntimeError("disk full")
+        return bulk_insert(db, table, rows)
+
+    with TestClient(app) as client:
+        client.post("/check-user", json={"uuid": "track-user", "latitude": 37.5, "longitude": 127.0})
+        tracks, raw_rows = count(models.Track), count(models.TrackPointRaw)
+        crud.bulk_insert = failing_bulk_insert
+        try:
+            assert client.post("/tracks", json=body).status_code == 500
+        finally:
+            crud.bulk_insert = bulk_insert
+    assert (count(models.Track), count(models.TrackPointRaw)) == (tracks, raw_rows)
+    print("Create Track Rollback Test Passed")
+
+if __name__ == "__main__":
+    test_binary_roundtrip()
+    test_binary_malformed()
+    test_binary_endpoint()
+    test_create_track()
+    test_create_track_is_one_transaction()
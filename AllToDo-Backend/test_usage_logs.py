@@ -0,0 +1,240 @@
+import sys
+import os
+import time
+import threading
+import tempfile
+
+# Add the current directory to sys.path so we can import app modules
+sys.path.append(os.getcwd())
+
+# Throwaway SQLite DB unless DATABASE_URL points somewhere else (e.g. a test PostgreSQL)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test_usage_logs.db")
+
+from fastapi.testclient import TestClient
+
+from sqlalchemy.exc import OperationalError
+
+from app.main import app
+from app.database import SessionLocal, engine
+from app import crud, models, schemas
+from app.usage_buffer import UsageLogBuffer, usage_log_buffer
+
+models.Base.metadata.create_all(bind=engine)
+
+def make_users(client, *uuids):
+    for uuid in uuids:
+        assert client.post("/check-user", json={"uuid": uuid, "latitude": 37.5, "longitude": 127.0}).status_code == 200
+
+def batch(user_uuid, device_id, seqs):
+    return {
+        "user_uuid": user_uuid,
+        "device_id": device_id,
+        "logs": [
+            {"seq": seq, "latitude": 37.5 + seq * 1e-4, "longitude": 127.0, "timestamp": f"2026-01-01T00:00:{seq % 60:02d}Z"}
+            for seq in seqs
+        ],
+    }
+
+def create_users(*uuids):
+    # For buffer tests that run without a TestClient
+    db = SessionLocal()
+    try:
+        for uuid in uuids:
+            if not crud.get_user(db, uuid):
+                crud.create_user(db, schemas.UserCreate(uuid=uuid, latitude=37.5, longitude=127.0))
+    finally:
+        db.close()
+
+def stored(user_uuid):
+    db = SessionLocal()
+    try:
+        return db.query(models.UsageLog).filter(models.UsageLog.user_uuid == user_uuid).count()
+    finally:
+        db.close()
+
+def test_batch_resend_is_idempotent():
+    with TestClient(app) as client:
+        make_users(client, "batch-1")
+        first = client.post("/log-usage/batch", json=batch("batch-1", "phone-a", [1, 2, 3, 4]))
+        assert first.json() == {"status": "success", "received": 4, "inserted": 4, "duplicates": 0}
+
+        # Response lost, client sends the same batch again
+        again = client.post("/log-usage/batch", json=batch("batch-1", "phone-a", [1, 2, 3, 4]))
+        assert again.json() == {"status": "success", "received": 4, "inserted": 0, "duplicates": 4}
+
+        # Overlapping re-send only stores the new points
+        overlap = client.post("/log-usage/batch", json=batch("batch-1", "phone-a", [3, 4, 5]))
+        assert (overlap.json()["inserted"], overlap.json()["duplicates"]) == (1, 2)
+    assert stored("batch-1") == 5
+    print("Batch Re-send Test Passed")
+
+def test_batch_same_device_other_user():
+    # Reinstall / recovered uuid restarting seq on the same device is not a duplicate
+    with TestClient(app) as client:
+        make_users(client, "batch-2a", "batch-2b")
+        client.post("/log-usage/batch", json=batch("batch-2a", "phone-b", [1, 2, 3, 4]))
+        other = client.post("/log-usage/batch", json=batch("batch-2b", "phone-b", [1, 2, 3, 4]))
+        assert (other.json()["inserted"], other.json()["duplicates"]) == (4, 0)
+    assert stored("batch-2a") == stored("batch-2b") == 4
+    print("Same Device Other User Test Passed")
+
+def test_batch_repeated_seq_in_one_batch():
+    with TestClient(app) as client:
+        make_users(client, "batch-3")
+        response = client.post("/log-usage/batch", json=batch("batch-3", "phone-c", [7, 7, 8, 8, 8]))
+        assert response.status_code == 200
+        assert response.json() == {"status": "success", "received": 5, "inserted": 2, "duplicates": 3}
+    assert stored("batch-3") == 2
+    print("Repeated Seq In One Batch Test Passed")
+
+def test_batch_size_limit():
+    with TestClient(app) as client:
+        make_users(client, "batch-4")
+        full = client.post("/log-usage/batch", json=batch("batch-4", "phone-d", range(schemas.LOG_BATCH_MAX)))
+        assert full.status_code == 200 and full.json()["inserted"] == schemas.LOG_BATCH_MAX
+        too_big = client.post("/log-usage/batch", json=batch("batch-4", "phone-e", range(schemas.LOG_BATCH_MAX + 1)))
+        assert too_big.status_code == 422
+    assert stored("batch-4") == schemas.LOG_BATCH_MAX
+    print("Batch Size Limit Test Passed")
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_buffer_flushes_on_time_and_rows():
+    by_time = UsageLogBuffer(flush_interval_ms=50, flush_rows=1000)
+    by_rows = UsageLogBuffer(flush_interval_ms=60000, flush_rows=10)
+    create_users("buffer-1", "buffer-2")
+    try:
+        by_time.add("buffer-1", 37.5, 127.0)
+        wait_until(lambda: by_time.stats()["flushed"] == 1)
+
+        for _ in range(9):
+            by_rows.add("buffer-2", 37.5, 127.0)
+        time.sleep(0.1)
+        assert by_rows.stats()["flushed"] == 0 and by_rows.pending() == 9
+        by_rows.add("buffer-2", 37.5, 127.0)
+        wait_until(lambda: by_rows.stats()["flushed"] == 10)
+        assert by_rows.stats()["flushes"] == 1
+    finally:
+        by_time.stop()
+        by_rows.stop()
+    assert stored("buffer-1") == 1 and stored("buffer-2") == 10
+    print("Buffer Flush On Time / Rows Test Passed")
+
+def test_buffer_drains_on_stop():
+    buffer = UsageLogBuffer(flush_interval_ms=60000, flush_rows=1000)
+    create_users("buffer-3")
+    for _ in range(25):
+        buffer.add("buffer-3", 37.5, 127.0)
+    assert buffer.pending() == 25
+    buffer.stop()
+    assert buffer.stats()["flushed"] == 25 and stored("buffer-3") == 25
+    print("Buffer Drain On Stop Test Passed")
+
+def test_buffer_full_returns_503():
+    saved = (usage_log_buffer.max_pending, usage_log_buffer.put_timeout_s)
+    usage_log_buffer.max_pending, usage_log_buffer.put_timeout_s = 0, 0.05
+    try:
+        with TestClient(app) as client:
+            response = client.post("/log-usage", json={"user_uuid": "buffer-4", "latitude": 37.5, "longitude": 127.0})
+            assert response.status_code == 503
+            assert usage_log_buffer.stats()["rejected"] >= 1
+    finally:
+        usage_log_buffer.max_pending, usage_log_buffer.put_timeout_s = saved
+    print("Buffer Full 503 Test Passed")
+
+def test_buffer_keeps_rows_while_database_down():
+    outages = {"left": 3}
+
+    def flaky_session():
+        # Session creation / connect failing like a database restart
+        if outages["left"]:
+            outages["left"] -= 1
+            raise OperationalError("connect", {}, Exception("connection refused"))
+        return SessionLocal()
+
+    buffer = UsageLogBuffer(session_factory=flaky_session, flush_interval_ms=60000, flush_rows=20,
+                            retry_initial_s=0.01, retry_max_s=0.05)
+    create_users("buffer-5")
+    try:
+        for _ in range(20):
+            buffer.add("buffer-5", 37.5, 127.0)
+        wait_until(lambda: buffer.stats()["flushed"] == 20)
+        stats = buffer.stats()
+        assert stats["retries"] == 3 and stats["failed"] == 0 and stats["flushes"] == 1
+        # The writer survived the outage: stop() still drains
+        buffer.add("buffer-5", 37.5, 127.0)
+    finally:
+        buffer.stop()
+    assert stored("buffer-5") == 21
+    print(f"Outage: {stats}")
+    print("Buffer Database Outage Test Passed")
+
+def test_buffer_drops_unknown_users_in_one_flush():
+    inserts = []
+    bulk_insert = crud.bulk_insert
+
+    def counting_bulk_insert(db, table, rows):
+        inserts.append(len(rows))
+        return bulk_insert(db, table, rows)
+
+    buffer = UsageLogBuffer(flush_interval_ms=60000, flush_rows=1000)
+    create_users("buffer-6")
+    crud.bulk_insert = counting_bulk_insert
+    try:
+        for i in range(30):
+            buffer.add("buffer-6" if i % 10 else "buffer-stale", 37.5, 127.0)
+        buffer.stop()
+    finally:
+        crud.bulk_insert = bulk_insert
+    stats = buffer.stats()
+    # One multi-row INSERT for the known rows, no row-by-row fallback
+    assert inserts == [27] and stats["flushes"] == 1
+    assert (stats["flushed"], stats["unknown_user"], stats["failed"]) == (27, 3, 0)
+    assert stored("buffer-6") == 27 and stored("buffer-stale") == 0
+    print("Buffer Unknown User Test Passed")
+
+def test_buffer_requeue_stays_within_max_pending():
+    connecting, release = threading.Event(), threading.Event()
+
+    def hanging_session():
+        # First connect hangs, then fails; the batch is in flight meanwhile
+        if not release.is_set():
+            connecting.set()
+            release.wait(5)
+            raise OperationalError("connect", {}, Exception("connection refused"))
+        return SessionLocal()
+
+    buffer = UsageLogBuffer(session_factory=hanging_session, flush_interval_ms=60000, flush_rows=5,
+                            max_pending=8, put_timeout_s=0.01, retry_initial_s=0.01, retry_max_s=0.05)
+    create_users("buffer-7")
+    try:
+        for _ in range(5):
+            assert buffer.add("buffer-7", 37.5, 127.0)
+        assert connecting.wait(5)
+        # The 5 rows being written still count, so only 3 more fit
+        results = [buffer.add("buffer-7", 37.5, 127.0) for _ in range(6)]
+        assert results.count(True) == 3 and buffer.pending() == 8
+        release.set()
+        wait_until(lambda: buffer.stats()["flushed"] == 8)
+        assert buffer.stats()["retries"] == 1
+    finally:
+        release.set()
+        buffer.stop()
+    assert stored("buffer-7") == 8
+    print("Buffer Re-queue Limit Test Passed")
+
+if __name__ == "__main__":
+    test_batch_resend_is_idempotent()
+    test_batch_same_device_other_user()
+    test_batch_repeated_seq_in_one_batch()
+    test_batch_size_limit()
+    test_buffer_flushes_on_time_and_rows()
+    test_buffer_drains_on_stop()
+    test_buffer_full_returns_503()
+    test_buffer_keeps_rows_while_database_down()
+    test_buffer_drops_unknown_users_in_one_flush()
+    test_buffer_requeue_stays_within_max_pending()
@@ -0,0 +1,250 @@
+import sys
+import os
+import json
+import tempfile
+
+# Add the current directory to sys.path so we can import app modules
+sys.path.append(os.getcwd())
+
+# Throwaway SQLite DB unless DATABASE_URL points somewhere else (e.g. a test PostgreSQL)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test_user_info.db")
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.database import SessionLocal, engine
+from app import crud, models, schemas
+from app.user_info_cache import user_info_cache, UserInfoCache
+from app.key_rotation import ReencryptionJob
+from cryptography.fernet import Fernet
+
+models.Base.metadata.create_all(bind=engine)
+
+def make_user(db, uuid):
+    crud.upsert_user(db, schemas.UserCreate(uuid=uuid, latitude=37.5, longitude=127.0))
+
+def test_envelope_roundtrip():
+    fields = {"name": "홍길동", "password": "pw", "age": "30", "work_long": "127.1"}
+    blob = crud.info_envelope.seal("u-1", fields)
+    opened = crud.info_envelope.open("u-1", blob)
+    assert opened["name"] == "홍길동"
+    assert opened["work_long"] == "127.1"
+    assert opened["address"] is None
+
+    # Bound to the row: the same blob does not open for another user
+    try:
+        crud.info_envelope.open("u-2", blob)
+        assert False, "blob opened for another user"
+    except ValueError:
+        pass
+    print(f"Envelope: {len(blob)} bytes")
+    print("Envelope Roundtrip Test Passed")
+
+def test_sealed_mode_and_migration():
+    db = SessionLocal()
+    try:
+        # Seal legacy rows left by other test modules sharing the database, so the counts below are ours
+        after_id = 0
+        while (after_id := crud.migrate_user_info_batch(db, after_id=after_id)[0]) is not None:
+            pass
+
+        make_user(db, "legacy-1")
+        make_user(db, "legacy-2")
+
+        # Legacy rows
+        crud.USER_INFO_STORAGE_MODE = "columns"
+        crud.update_user_info(db, schemas.UserInfoUpdate(user_uuid="legacy-1", name="kim", password="pw1", age=20, address_lat=37.5))
+        crud.update_user_info(db, schemas.UserInfoUpdate(user_uuid="legacy-2", name="lee", password="pw2"))
+        legacy = db.query(models.UserInfo).filter(models.UserInfo.user_uuid == "legacy-1").first()
+        legacy_size = sum(len(getattr(legacy, n) or "") for n in crud.UserInfoEnvelope.FIELDS)
+
+        # Sealed mode reads legacy rows and seals them on the next write
+        crud.USER_INFO_STORAGE_MODE = "sealed"
+        crud.update_user_info(db, schemas.UserInfoUpdate(user_uuid="legacy-2", phone_number="010"))
+        row2 = db.query(models.UserInfo).filter(models.UserInfo.user_uuid == "legacy-2").first()
+        assert row2.sealed is not None and row2.name is None
+        fields2 = crud.user_info_fields(row2)
+        assert (fields2["name"], fields2["password"], fields2["phone_number"]) == ("lee", "pw2", "010")
+        assert crud.verify_user_password(db, "legacy-2", "pw2")
+
+        # Online migrator seals the remaining legacy row
+        last_id, sealed = crud.migrate_user_info_batch(db)
+        assert sealed == 1
+        db.expire_all()
+        row1 = db.query(models.UserInfo).filter(models.UserInfo.user_uuid == "legacy-1").first()
+        assert row1.name is None and row1.sealed is not None
+        response = crud.user_info_response(row1, None)
+        assert (response.name, response.age, response.address_lat) == ("kim", "20", "37.5")
+        assert crud.verify_user_password(db, "legacy-1", "pw1")
+        assert crud.migrate_user_info_batch(db) == (None, 0)
+        print(f"Row size: legacy {legacy_size} bytes -> sealed {len(row1.sealed)} bytes")
+    finally:
+        crud.USER_INFO_STORAGE_MODE = "columns"
+        db.close()
+    print("Sealed Mode / Migration Test Passed")
+
+def test_user_info_cache_lru_ttl():
+    cache = UserInfoCache(max_entries=2, ttl_s=60)
+    for uuid in ("a", "b", "c"):
+        _, generation = cache.get(uuid)
+        cache.put(uuid, schemas.UserInfoResponse(user_uuid=uuid), generation)
+    assert cache.get("a")[0] is None  # evicted (least recently used)
+    assert cache.get("c")[0].user_uuid == "c"
+
+    # A fill that started before an invalidation is dropped
+    _, generation = cache.get("d")
+    cache.invalidate("b")
+    cache.put("d", schemas.UserInfoResponse(user_uuid="d"), generation)
+    assert cache.get("d")[0] is None
+
+    expired = UserInfoCache(max_entries=10, ttl_s=0)
+    _, generation = expired.get("x")
+    expired.put("x", schemas.UserInfoResponse(user_uuid="x"), generation)
+    assert expired.get("x")[0] is None
+    print(f"Stats: {cache.stats()}")
+    print("Cache LRU/TTL Test Passed")
+
+def test_user_info_cached_endpoint():
+    with TestClient(app) as client:
+        client.post("/check-user", json={"uuid": "cached-1", "latitude": 0, "longitude": 0})
+        client.post("/update-info", json={"user_uuid": "cached-1", "name": "park"})
+
+        before = user_info_cache.stats()
+        assert client.get("/user-info", params={"uuid": "cached-1"}).json()["name"] == "park"
+        assert client.get("/user-info", params={"uuid": "cached-1"}).json()["name"] == "park"
+        after = user_info_cache.stats()
+        assert after["misses"] - before["misses"] == 1
+        assert after["hits"] - before["hits"] == 1
+
+        # Write-through invalidation
+        client.post("/update-info", json={"user_uuid": "cached-1", "name": "choi"})
+        assert client.get("/user-info", params={"uuid": "cached-1"}).json()["name"] == "choi"
+
+        stats = client.get("/dev/stats", params={"password": "pw3355"}).json()
+        assert stats["user_info_cache"]["invalidations"] >= 2
+    print("Cached Endpoint Test Passed")
+
+def test_key_rotation():
+    original_keys = [crud.KEY] + crud.OLD_KEYS
+    old_key, new_key = Fernet.generate_key().decode(), Fernet.generate_key().decode()
+    checkpoint = os.path.join(tempfile.mkdtemp(), "rotation.json")
+    db = SessionLocal()
+    try:
+        # Rows written under the old key, both formats
+        crud.set_encryption_keys([old_key])
+        for i in range(5):
+            make_user(db, f"rotate-{i}")
+            crud.USER_INFO_STORAGE_MODE = "sealed" if i % 2 else "columns"
+            crud.update_user_info(db, schemas.UserInfoUpdate(user_uuid=f"rotate-{i}", name=f"name-{i}", password="pw"))
+        crud.USER_INFO_STORAGE_MODE = "columns"
+
+        # New primary key, old one retired: job re-encrypts, resumes from its checkpoint
+        crud.set_encryption_keys([new_key, old_key] + original_keys)
+        first = ReencryptionJob(batch_size=2, workers=2, checkpoint_path=checkpoint)
+        first.run(report=lambda p: first.stop())
+        assert first.scanned == 2
+        second = ReencryptionJob(batch_size=2, workers=2, checkpoint_path=checkpoint)
+        result = second.run(report=print)
+        assert result["scanned"] == result["total"]
+        assert result["failed"] == 0 and result["conflicts"] == 0
+        assert result["rotated"] >= 5
+
+        # Readable with the new key alone
+        crud.set_encryption_keys([new_key])
+        db.expire_all()
+        for i in range(5):
+            row = db.query(models.UserInfo).filter(models.UserInfo.user_uuid == f"rotate-{i}").first()
+            assert crud.user_info_fields(row)["name"] == f"name-{i}"
+
+        # Nothing left to do
+        again = ReencryptionJob(batch_size=2, workers=2, checkpoint_path=checkpoint + ".2").run()
+        assert again["rotated"] == 0
+    finally:
+        crud.set_encryption_keys(original_keys)
+        crud.USER_INFO_STORAGE_MODE = "columns"
+        db.close()
+    print("Key Rotation Test Passed")
+
+def test_dev_tables_paging_and_export():
+    from app.dev import DEV_PASSWORD
+    db = SessionLocal()
+    try:
+        for i in range(5):
+            make_user(db, f"page-{i}")
+            crud.update_user_info(db, schemas.UserInfoUpdate(user_uuid=f"page-{i}", name=f"name-{i}"))
+    finally:
+        db.close()
+
+    with TestClient(app) as client:
+        params = {"password": DEV_PASSWORD, "limit": 2}
+        seen, pages = [], 0
+        while True:
+            response = client.get("/dev/tables/user_info", params=params)
+            assert response.status_code == 200
+            seen += [row["name"] for row in response.json()]
+            pages += 1
+            if "x-next-after" not in response.headers:
+                break
+            params["after"] = response.headers["x-next-after"]
+        assert [name for name in seen if name and name.startswith("name-")] == [f"name-{i}" for i in range(5)]
+        assert pages >= 3
+
+        export = client.get("/dev/tables/user_info", params={"password": DEV_PASSWORD, "format": "ndjson"})
+        rows = [json.loads(line) for line in export.text.splitlines()]
+        assert len(rows) == len(seen) and "sealed" not in rows[0]
+        assert client.get("/dev/tables/user_info", params={"password": DEV_PASSWORD, "after": "x"}).status_code == 400
+    print("Dev Tables Paging And Export Test Passed")
+
+def test_unreadable_user_info_is_not_overwritten():
+    db = SessionLocal()
+    try:
+        make_user(db, "corrupt-1")
+        make_user(db, "corrupt-2")
+        crud.USER_INFO_STORAGE_MODE = "sealed"
+        crud.update_user_info(db, schemas.UserInfoUpdate(user_uuid="corrupt-1", name="kim", phone_number="010", address="Seoul"))
+        row = db.query(models.UserInfo).filter(models.UserInfo.user_uuid == "corrupt-1").first()
+        # Flip a ciphertext byte: the blob no longer authenticates
+        corrupted = row.sealed[:-1] + bytes([row.sealed[-1] ^ 1])
+        row.sealed = corrupted
+        db.commit()
+
+        try:
+            crud.seal_user_info(row, {"age": "30"})
+            assert False, "sealed over an unreadable blob"
+        except crud.UnreadableUserInfo:
+            pass
+        db.rollback()
+        assert row.sealed == corrupted and row.age is None
+
+        with TestClient(app) as client:
+            response = client.post("/update-info", json={"user_uuid": "corrupt-1", "age": 30})
+            assert response.status_code == 409
+        db.expire_all()
+        assert db.query(models.UserInfo).filter(models.UserInfo.user_uuid == "corrupt-1").first().sealed == corrupted
+
+        # Migrator: a legacy token no key decrypts is skipped and counted, not nulled
+        crud.USER_INFO_STORAGE_MODE = "columns"
+        crud.update_user_info(db, schemas.UserInfoUpdate(user_uuid="corrupt-2", name="lee", password="pw"))
+        legacy = db.query(models.UserInfo).filter(models.UserInfo.user_uuid == "corrupt-2").first()
+        bad_token = Fernet(Fernet.generate_key()).encrypt(b"other key").decode()
+        legacy.name = bad_token
+        db.commit()
+        stats = {}
+        last_id, sealed = crud.migrate_user_info_batch(db, after_id=legacy.id - 1, batch_size=1, stats=stats)
+        assert (last_id, sealed, stats) == (legacy.id, 0, {"unreadable": 1})
+        db.expire_all()
+        legacy = db.query(models.UserInfo).filter(models.UserInfo.user_uuid == "corrupt-2").first()
+        assert legacy.name == bad_token and legacy.password is not None and legacy.sealed is None
+    finally:
+        crud.USER_INFO_STORAGE_MODE = "columns"
+        db.close()
+    print("Unreadable User Info Test Passed")
+
+if __name__ == "__main__":
+    test_envelope_roundtrip()
+    test_sealed_mode_and_migration()
+    test_unreadable_user_info_is_not_overwritten()
+    test_user_info_cache_lru_ttl()
+    test_user_info_cached_endpoint()
+    test_key_rotation()
+    test_dev_tables_paging_and_export()
@@ -0,0 +1,116 @@
+import sys
+import os
+import re
+import gzip
+import hmac
+import hashlib
+import base64
+import tempfile
+from pathlib import Path
+
+# Add the current directory to sys.path so we can import app modules
+sys.path.append(os.getcwd())
+
+# Throwaway SQLite DB unless DATABASE_URL points somewhere else (e.g. a test PostgreSQL)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test_wasm.db")
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app import wasm
+
+def use_temp_wasm_dir(module: bytes):
+    # Keep uploads away from the real wasm/ directory
+    wasm.WASM_DIR = Path(tempfile.mkdtemp())
+    wasm.ACTIVE_WASM_FILE = wasm.WASM_DIR / "advanced_v1.wasm"
+    wasm.VERSION_FILE = wasm.WASM_DIR / "version.txt"
+    wasm.ACTIVE_WASM_FILE.write_bytes(module)
+    wasm.wasm_cache.invalidate()
+
+def decrypt_json(body: dict) -> bytes:
+    iv = base64.b64decode(body["iv_b64"])
+    data = base64.b64decode(body["ciphertext_b64"]) + base64.b64decode(body["tag_b64"])
+    return wasm.AES_CIPHER.decrypt(iv, data, None)
+
+def test_wasm_etag_and_upload():
+    use_temp_wasm_dir(b"\0asm" + os.urandom(4000))
+    with TestClient(app) as client:
+        first = client.get("/wasm/advanced")
+        assert first.status_code == 200
+        assert decrypt_json(first.json()) == wasm.ACTIVE_WASM_FILE.read_bytes()
+        etag = first.headers["etag"]
+        # Same bytes every time, so the ETag is a strong one
+        assert client.get("/wasm/advanced").content == first.content
+
+        not_modified = client.get("/wasm/advanced", headers={"If-None-Match": etag})
+        assert not_modified.status_code == 304 and not_modified.content == b""
+        assert client.get("/wasm/advanced", headers={"If-None-Match": f'"other", W/{etag}'}).status_code == 304
+
+        # Upload activates the new version right away
+        module = b"\0asm" + os.urandom(5000)
+        response = client.post("/wasm/upload", data={"version": "v2"}, files={"file": ("m.wasm", module, "application/wasm")})
+        assert response.status_code == 200
+        assert client.get("/wasm/version").json() == {"version": "v2"}
+        updated = client.get("/wasm/advanced", headers={"If-None-Match": etag})
+        assert updated.status_code == 200 and updated.headers["etag"] != etag
+        assert decrypt_json(updated.json()) == module
+    print(f"ETag: {etag} -> {updated.headers['etag']}")
+    print("WASM ETag And Upload Test Passed")
+
+def test_wasm_etag_is_valid_for_any_version():
+    module = b"\0asm" + os.urandom(1000)
+    use_temp_wasm_dir(module)
+    with TestClient(app) as client:
+        version = 'v3 "beta", build 7'
+        response = client.post("/wasm/upload", data={"version": version}, files={"file": ("m.wasm", module, "application/wasm")})
+        assert response.status_code == 200
+        first = client.get("/wasm/advanced")
+        assert first.json()["version"] == version
+        etag = first.headers["etag"]
+        # One quoted string, no '"' or ',' inside
+        assert re.fullmatch(r'"[^",]+"', etag), etag
+        assert client.get("/wasm/advanced", headers={"If-None-Match": etag}).status_code == 304
+        assert re.fullmatch(r'"[^",]+"', client.get("/wasm/advanced?format=binary").headers["etag"])
+
+    # The IV is keyed with an HKDF subkey, not with the encryption key itself
+    iv = base64.b64decode(first.json()["iv_b64"])
+    assert iv == wasm.content_iv(module)
+    assert iv != hmac.new(wasm.AES_KEY, b"wasm-iv" + hashlib.sha256(module).digest(), hashlib.sha256).digest()[:12]
+    print(f"ETag: {etag}")
+    print("WASM ETag Version Test Passed")
+
+def test_wasm_binary_and_range():
+    module = b"\0asm" + bytes(range(256)) * 40
+    use_temp_wasm_dir(module)
+    with TestClient(app) as client:
+        binary = client.get("/wasm/advanced?format=binary")
+        assert binary.headers["content-type"] == "application/octet-stream"
+        body = binary.content
+        assert wasm.AES_CIPHER.decrypt(body[:12], body[12:], None) == module
+        assert client.get("/wasm/advanced", headers={"Accept": "application/octet-stream"}).content == body
+
+        # Compressed before encryption, so the ciphertext is actually smaller
+        packed = client.get("/wasm/advanced?format=binary&payload=gzip")
+        assert packed.headers["x-wasm-payload-encoding"] == "gzip" and len(packed.content) < len(body) // 4
+        assert gzip.decompress(wasm.AES_CIPHER.decrypt(packed.content[:12], packed.content[12:], None)) == module
+
+        # JSON is sent precompressed when the client accepts it
+        assert client.get("/wasm/advanced", headers={"Accept-Encoding": "gzip"}).headers["content-encoding"] == "gzip"
+        assert "content-encoding" not in client.get("/wasm/advanced", headers={"Accept-Encoding": "identity"}).headers
+
+        # Resume an interrupted download
+        etag = binary.headers["etag"]
+        part = client.get("/wasm/advanced?format=binary", headers={"Range": "bytes=1000-", "If-Range": etag})
+        assert part.status_code == 206 and body[:1000] + part.content == body
+        assert part.headers["content-range"] == f"bytes 1000-{len(body) - 1}/{len(body)}"
+        stale = client.get("/wasm/advanced?format=binary", headers={"Range": "bytes=1000-", "If-Range": '"old"'})
+        assert stale.status_code == 200 and stale.content == body
+        assert client.get("/wasm/advanced?format=binary", headers={"Range": f"bytes={len(body)}-"}).status_code == 416
+        assert client.get("/wasm/advanced?format=binary", headers={"If-None-Match": etag}).status_code == 304
+    print(f"Binary: {len(body)} bytes, gzip payload: {len(packed.content)} bytes")
+    print("WASM Binary And Range Test Passed")
+
+if __name__ == "__main__":
+    test_wasm_etag_and_upload()
+    test_wasm_etag_is_valid_for_any_version()
+    test_wasm_binary_and_range()